@@ -0,0 +1,183 @@
+"""Load test for the custom actions: N simulated conversations run concurrently against rasa_sdk's ActionExecutor,
+the part of the action server that runs actions, and the latency of every action call is reported as p50 and p99.
+With --legacy the previous synchronous actions are measured instead. Needs rasa_sdk."""
+
+import common  # noqa: F401  makes rasa_template/ importable
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-n", "--conversations", type=int, default=50, help="Conversations running at the same time")
+parser.add_argument("--turns", type=int, default=40, help="User messages per conversation")
+parser.add_argument("--legacy", action="store_true", help="Measure the synchronous actions the template used to have")
+parser.add_argument("--seed", type=int, default=0)
+
+
+def legacy_actions():
+    """The synchronous actions as they were before they were made async, without their print calls"""
+    from datetime import datetime, timedelta, timezone
+
+    from rasa_sdk import Action
+
+    class ActionSaveConversation(Action):
+        def name(self):
+            return "action_save_conversation"
+
+        def run(self, dispatcher, tracker, domain):
+            conversation_id = str(tracker.sender_id)
+            count_u = 0
+            count_b = 0
+            if not os.path.isfile("chats.csv"):
+                with open("chats.csv", "w") as file:
+                    file.write("input_time|conversation_id|count|intent|user_input| entity_name|entity_value|action|bot_reply|\n")
+            chat_data = ""
+            for i in tracker.events:
+                input_time = datetime.now().astimezone(timezone(timedelta(hours=-4))).strftime("%Y-%m-%d %H:%M:%S.%f")
+                if i["event"] == "user":
+                    chat_data += f"{input_time}|{conversation_id}|U{count_u}|{i['parse_data']['intent']['name']}|{i['text']}|\n"
+                    count_u += 1
+                elif i["event"] == "bot":
+                    try:
+                        chat_data += f"{input_time}|{conversation_id}|B{count_b}|||||{i['metadata']['utter_action']}|{i['text']}\n"
+                        count_b += 1
+                    except KeyError:
+                        pass
+            with open("chats.csv", "a") as file:
+                file.write(chat_data)
+            dispatcher.utter_message(text="")
+            return []
+
+    class ActionEmotion(Action):
+        def name(self):
+            return "action_emotion"
+
+        def run(self, dispatcher, tracker, domain):
+            text = str(tracker.latest_message["text"])
+            try:
+                from nrclex import NRCLex
+
+                emotion = NRCLex(text)
+                frequencies, top = emotion.affect_frequencies, emotion.top_emotions
+            except Exception:
+                # NRCLex needs textblob and the punkt corpus of nltk, without them the uncached lexicon lookup
+                # stands in for it, which makes the legacy numbers look better than they were
+                from actions.emotion import score_message
+
+                scores = score_message.__wrapped__(text)
+                frequencies, top = dict(scores.affect_frequencies), list(scores.top_emotions)
+            dispatcher.utter_message(text="The affect frequencies are: {}".format(frequencies))
+            dispatcher.utter_message(text="Top emotions detected are: {}".format(top))
+            return []
+
+    from actions.actions import ActionSessionId
+
+    return [ActionSaveConversation(), ActionEmotion(), ActionSessionId()]
+
+
+def action_call(action, sender_id, events):
+    latest_message = next((event for event in reversed(events) if event["event"] == "user"), {})
+    return {
+        "next_action": action,
+        "sender_id": sender_id,
+        "tracker": {
+            "sender_id": sender_id,
+            "slots": {},
+            "latest_message": {"text": latest_message.get("text"), **latest_message.get("parse_data", {})},
+            "events": events,
+            "paused": False,
+            "followup_action": None,
+            "active_loop": {},
+            "latest_action_name": None,
+        },
+        "domain": {},
+        "version": "3.2.10",
+    }
+
+
+async def run_conversation(executor, sender_id, turns, messages, rng, latencies):
+    """Plays one conversation: after every user message and bot reply the bot runs the custom actions.
+    Latency is counted from the moment a call is due, so time spent waiting for an event loop that is blocked
+    by another conversation's action is included."""
+    events = [{"event": "action", "name": "action_session_start", "timestamp": time.time()}]
+    for _ in range(turns):
+        # users take a moment to type, so conversations interleave on the event loop
+        think = rng.uniform(0, 0.01)
+        due = time.perf_counter() + think
+        await asyncio.sleep(think)
+
+        text = rng.choice(messages)
+        events.append({"event": "user", "timestamp": time.time(), "text": text,
+                       "parse_data": {"intent": {"name": "faq"}, "entities": []}})
+        events.append({"event": "bot", "timestamp": time.time(), "text": "An answer",
+                       "metadata": {"utter_action": "utter_faq"}})
+        for action in ("action_save_conversation", "action_emotion", "action_session_id"):
+            await executor.run(action_call(action, sender_id, events))
+            done = time.perf_counter()
+            latencies[action].append(done - due)
+            due = done
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+async def load_test(args):
+    from rasa_sdk.executor import ActionExecutor
+
+    from synthetic import synthetic_questions
+
+    executor = ActionExecutor()
+    if args.legacy:
+        for action in legacy_actions():
+            executor.register_action(action)
+    else:
+        executor.register_package("actions")
+
+    messages = synthetic_questions(500)
+    latencies = defaultdict(list)
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            run_conversation(executor, f"user-{i}", args.turns, messages, random.Random(rng.random()), latencies)
+            for i in range(args.conversations)
+        )
+    )
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    args = parser.parse_args()
+
+    # the actions log to the working directory
+    directory = tempfile.mkdtemp()
+    os.chdir(directory)
+    try:
+        latencies, seconds = asyncio.run(load_test(args))
+        if not args.legacy:
+            from actions.actions import conversation_log
+
+            conversation_log.flush()
+        rows = sum(1 for _ in open("chats.csv")) - 1
+    finally:
+        os.chdir(common.REPO_DIR)
+        shutil.rmtree(directory)
+
+    calls = sum(len(values) for values in latencies.values())
+    print(f"{'legacy' if args.legacy else 'current'} actions, {args.conversations} concurrent conversations, "
+          f"{args.turns} turns each: {calls} calls in {seconds:.2f}s, {rows} rows logged")
+    print(f"{'action':>26} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for action, values in latencies.items():
+        print(f"{action:>26} {percentile(values, 50) * 1e3:>8.2f} {percentile(values, 99) * 1e3:>8.2f} {max(values) * 1e3:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Requests per second of the Alexa connector's webhook through Sanic's test client, for the static replies,
+questions answered from the FAQ index or the reply cache, and questions that go to Rasa.
+The former webhook, which built and serialized every reply from scratch, is measured for comparison.
+Rasa is replaced by a stand-in that answers after --rasa-ms, roughly what NLU and the policies take.
+Needs rasa and sanic-testing, and uses orjson if it is installed."""
+
+import common  # noqa: F401  makes rasa_template/ importable
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-n", "--requests", type=int, default=2000, help="Requests per scenario")
+parser.add_argument("--rasa-ms", type=float, default=20, help="Time the Rasa stand-in takes to answer")
+
+FAQ_ANSWER = "Polling places are open from 7 a.m. to 7 p.m."
+FAQ_RESPONSE = f"[Source: Synthetic FAQ; Date: May 2024] {FAQ_ANSWER}"
+
+
+def legacy_blueprint(on_new_message):
+    """The webhook as it was before replies were cached and pre-serialized"""
+    from sanic import Blueprint, response
+    from rasa.core.channels.channel import CollectingOutputChannel, UserMessage
+
+    alexa_webhook = Blueprint("alexa_webhook", __name__)
+
+    @alexa_webhook.route("/webhook", methods=["POST"])
+    async def receive(request):
+        payload = request.json
+        intenttype = payload["request"]["type"]
+        if intenttype == "LaunchRequest":
+            message = "Hello! Welcome to this Rasa-powered Alexa skill. You can start by saying 'hi'."
+            session = "false"
+        else:
+            intent = payload["request"]["intent"]["name"]
+            if intent == "AMAZON.StopIntent":
+                session = "true"
+                message = "Talk to you later"
+            elif intent == "AMAZON.FallbackIntent":
+                session = "false"
+                message = "I'm sorry I did not understand what you said"
+            else:
+                text = payload["request"]["intent"]["slots"]["text"]["value"]
+                out = CollectingOutputChannel()
+                await on_new_message(UserMessage(text, out))
+                message = [m["text"] for m in out.messages][0]
+                session = "false"
+        r = {
+            "version": "1.0",
+            "sessionAttributes": {"status": "test"},
+            "response": {
+                "outputSpeech": {"type": "PlainText", "text": message, "playBehavior": "REPLACE_ENQUEUED"},
+                "reprompt": {
+                    "outputSpeech": {"type": "PlainText", "text": message, "playBehavior": "REPLACE_ENQUEUED"}
+                },
+                "shouldEndSession": session,
+            },
+        }
+        return response.json(r)
+
+    return alexa_webhook
+
+
+RASA_SECONDS = 0.02
+
+
+async def rasa_stand_in(message):
+    """Answers like the trained bot would: the FAQ response for the FAQ question, a fixed reply otherwise"""
+    await asyncio.sleep(RASA_SECONDS)
+    if "polling places" in message.text.lower():
+        reply = FAQ_RESPONSE
+    else:
+        reply = "I can answer questions about voting."
+    await message.output_channel.send_text_message(message.sender_id, reply)
+
+
+def alexa_request(request_type, intent=None, text=None):
+    request = {"type": request_type}
+    if intent is not None:
+        request["intent"] = {"name": intent, "slots": {"text": {"value": text}} if text is not None else {}}
+    return {"version": "1.0", "request": request}
+
+
+SCENARIOS = {
+    "launch": lambda i: alexa_request("LaunchRequest"),
+    "stop": lambda i: alexa_request("IntentRequest", "AMAZON.StopIntent"),
+    "faq index": lambda i: alexa_request("IntentRequest", "TextIntent", "When are polling places open?"),
+    "cached rasa reply": lambda i: alexa_request("IntentRequest", "TextIntent", "Polling places open hours"),
+    # a different text every time, never cached
+    "rasa": lambda i: alexa_request("IntentRequest", "TextIntent", f"Tell me something {i}"),
+}
+
+
+async def requests_per_second(app, make_request, count):
+    import httpx
+    from sanic_testing.testing import ASGI_HOST, ASGI_PORT
+
+    client = app.asgi_client
+    url = f"http://{ASGI_HOST}:{ASGI_PORT}/webhooks/alexa_assistant/webhook"
+    bodies = [json.dumps(make_request(i)) for i in range(count)]
+    # the test client starts the app for every request, which costs far more than the webhook,
+    # so the app is started once and the timed requests go straight through the client's asgi transport
+    await client.post(url, content=bodies[0])
+    start = time.perf_counter()
+    for body in bodies:
+        result = await httpx.AsyncClient.request(client, "POST", url, content=body)
+        assert result.status_code == 200
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    global RASA_SECONDS
+    args = parser.parse_args()
+    RASA_SECONDS = args.rasa_ms / 1000
+
+    from actions.knowledge_base import Entry, iter_knowledge_base_bytes
+    from faq_index import build_faq_index, iter_faq_index_json
+    from sanic import Sanic
+
+    from alexa_connector import AlexaConnector
+
+    directory = tempfile.mkdtemp()
+    index_path = os.path.join(directory, "faq_index.json")
+    index = build_faq_index([("polls_open", FAQ_RESPONSE, ["When are polling places open?"])])
+    with open(index_path, "w") as f:
+        f.write("".join(iter_faq_index_json(index)))
+    knowledge_base_path = os.path.join(directory, "knowledge_base.bin")
+    with open(knowledge_base_path, "wb") as f:
+        f.writelines(iter_knowledge_base_bytes([Entry("polls_open", FAQ_ANSWER, "", "Synthetic FAQ", "May 2024")]))
+
+    apps = {}
+    for name in ("legacy", "current"):
+        app = Sanic(f"bench_{name}")
+        if name == "legacy":
+            blueprint = legacy_blueprint(rasa_stand_in)
+        else:
+            connector = AlexaConnector(faq_index_path=index_path, knowledge_base_path=knowledge_base_path)
+            blueprint = connector.blueprint(rasa_stand_in)
+        app.blueprint(blueprint, url_prefix="/webhooks/alexa_assistant")
+        apps[name] = app
+
+    import alexa_connector
+
+    encoder = "orjson" if hasattr(alexa_connector, "orjson") else "json"
+    print(f"{args.requests} requests per scenario, Rasa answers in {args.rasa_ms:g}ms, {encoder} encoder")
+    print(f"{'scenario':>18} {'legacy req/s':>13} {'current req/s':>14}")
+    try:
+        for scenario, make_request in SCENARIOS.items():
+            rates = [asyncio.run(requests_per_second(apps[name], make_request, args.requests)) for name in ("legacy", "current")]
+            print(f"{scenario:>18} {rates[0]:>13.0f} {rates[1]:>14.0f}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
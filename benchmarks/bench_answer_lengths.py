@@ -0,0 +1,48 @@
+"""Compares computing URL-free answer lengths one call at a time with an uncompiled pattern,
+the compiled get_plain_text_length, and the batch get_plain_text_lengths"""
+
+import common  # noqa: F401  makes code/ importable
+
+import argparse
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-n", "--answers", type=int, nargs="+", default=[100_000, 1_000_000], help="answers per run")
+parser.add_argument(
+    "--url-fraction",
+    type=float,
+    default=0.3,
+    help="share of long answers, which are the ones likely to cite a URL",
+)
+
+LEGACY_URL_PATTERN = r"http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"
+
+
+def legacy_lengths(answers):
+    """The previous get_plain_text_length, which passed the pattern string to regex.sub on every call"""
+    import regex
+
+    return [len(regex.sub(LEGACY_URL_PATTERN, "", answer)) for answer in answers]
+
+
+def main():
+    args = parser.parse_args()
+
+    import pandas as pd
+    import configure_rasa as cr
+    from common import timed
+    from synthetic import synthetic_answers
+
+    print(f"{'answers':>9} {'method':>22} {'seconds':>9}")
+    for n in args.answers:
+        answers = pd.Series(synthetic_answers(n, long_fraction=args.url_fraction))
+        expected, seconds = timed(legacy_lengths, answers)
+        print(f"{n:>9} {'per call, uncompiled':>22} {seconds:>9.2f}")
+        _, seconds = timed(lambda: [cr.get_plain_text_length(answer) for answer in answers])
+        print(f"{n:>9} {'per call, compiled':>22} {seconds:>9.2f}")
+        lengths, seconds = timed(cr.get_plain_text_lengths, answers)
+        print(f"{n:>9} {'batch':>22} {seconds:>9.2f}")
+        assert lengths.tolist() == expected
+
+
+if __name__ == "__main__":
+    main()
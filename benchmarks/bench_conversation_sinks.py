@@ -0,0 +1,102 @@
+"""Writes a synthetic conversation log through every sink of the conversation log, then compares looking up
+one conversation and the last hour of turns in chats.csv, the SQLite database and the Parquet export"""
+
+import common  # noqa: F401  makes rasa_template/ importable
+
+import argparse
+import glob
+import os
+import shutil
+import sqlite3
+import tempfile
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-n", "--conversations", type=int, default=20_000, help="Conversations in the log")
+parser.add_argument("--turns", type=int, default=20, help="User messages and bot replies per conversation")
+parser.add_argument("--batch", type=int, default=256, help="Turns written together, as the writer thread does")
+
+
+def synthetic_turns(conversations: int, turns: int):
+    from actions.conversation_sinks import Turn
+    from synthetic import synthetic_answers, synthetic_questions
+
+    questions = synthetic_questions(1000)
+    answers = synthetic_answers(1000)
+    log = []
+    for i in range(conversations * turns // 2):
+        conversation_id = f"conversation-{i % conversations}"
+        n = i // conversations
+        # conversations are interleaved in time, like on a running server
+        timestamp = 1_700_000_000 + i * 0.5
+        log.append(Turn(conversation_id, f"U{n}", timestamp, intent=f"intent_{i % 500}", user_input=questions[i % 1000]))
+        log.append(Turn(conversation_id, f"B{n}", timestamp + 0.25, action=f"utter_intent_{i % 500}", bot_reply=answers[i % 1000]))
+    return log
+
+
+def write_all(sink, turns, batch):
+    for start in range(0, len(turns), batch):
+        sink.write(turns[start : start + batch])
+    sink.close()
+
+
+def main():
+    args = parser.parse_args()
+
+    import pandas as pd
+    from actions.conversation_sinks import CsvSink, ParquetSink, SqliteSink
+    from common import timed
+
+    turns = synthetic_turns(args.conversations, args.turns)
+    conversation_id = f"conversation-{args.conversations // 2}"
+    since = turns[-1].timestamp - 3600
+    directory = tempfile.mkdtemp()
+    sinks = {
+        "csv": CsvSink(os.path.join(directory, "chats.csv")),
+        "sqlite": SqliteSink(os.path.join(directory, "chats.sqlite")),
+    }
+    try:
+        sinks["parquet"] = ParquetSink(os.path.join(directory, "chats_parquet"))
+    except RuntimeError as e:
+        print(f"skipping parquet: {e}")
+
+    def query_csv():
+        # the csv has no index, every lookup reads and parses the whole file
+        log = pd.read_csv(sinks["csv"].path, sep="|", index_col=False, dtype=str)
+        times = (pd.to_datetime(log["input_time"]).dt.tz_localize("Etc/GMT+4") - pd.Timestamp(0, tz="UTC")) / pd.Timedelta(seconds=1)
+        return len(log[log["conversation_id"] == conversation_id]), int((times >= since).sum())
+
+    def query_sqlite():
+        with sqlite3.connect(sinks["sqlite"].path) as connection:
+            by_conversation = connection.execute(
+                "SELECT * FROM turns WHERE conversation_id = ? ORDER BY timestamp", (conversation_id,)
+            ).fetchall()
+            recent = connection.execute("SELECT * FROM turns WHERE timestamp >= ?", (since,)).fetchall()
+        return len(by_conversation), len(recent)
+
+    def query_parquet():
+        import pyarrow.parquet as pq
+
+        files = glob.glob(os.path.join(sinks["parquet"].directory, "*.parquet"))
+        by_conversation = pq.read_table(files, filters=[("conversation_id", "==", conversation_id)])
+        recent = pq.read_table(files, filters=[("timestamp", ">=", since)])
+        return by_conversation.num_rows, recent.num_rows
+
+    queries = {"csv": query_csv, "sqlite": query_sqlite, "parquet": query_parquet}
+    print(f"{len(turns)} turns in {args.conversations} conversations")
+    print(f"{'sink':>8} {'write s':>9} {'size MB':>9} {'query s':>9}")
+    expected = None
+    try:
+        for name, sink in sinks.items():
+            _, write_seconds = timed(write_all, sink, turns, args.batch)
+            paths = glob.glob(os.path.join(directory, f"chats.{name}*")) + glob.glob(os.path.join(directory, f"chats_{name}", "*"))
+            size = sum(os.path.getsize(path) for path in paths) / 1e6
+            counts, query_seconds = timed(queries[name])
+            expected = expected or counts
+            assert counts == expected, (name, counts, expected)
+            print(f"{name:>8} {write_seconds:>9.2f} {size:>9.1f} {query_seconds:>9.3f}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
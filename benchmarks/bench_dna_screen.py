@@ -0,0 +1,79 @@
+"""Measures the throughput of the DNA screen of actions/dna_screen.py on a large list of questions that should not be
+answered, against scanning the message for every question in turn. Messages are a mix of the questions themselves,
+questions inside longer messages and questions that may be answered. Also reports the size and load time of the screen."""
+
+import common  # noqa: F401  makes rasa_template/ importable
+
+import argparse
+import os
+import random
+import tempfile
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-n", "--questions", type=int, default=100_000, help="Questions that should not be answered")
+parser.add_argument("-m", "--messages", type=int, default=30_000, help="Messages screened")
+parser.add_argument("--scanned", type=int, default=300, help="Messages screened by scanning, it is much slower")
+parser.add_argument("--seed", type=int, default=0)
+
+FILLERS = ["hey", "so tell me", "quick question", "I was wondering", "thanks", "please answer", "right now"]
+
+
+def scan_screen(questions):
+    """Blocks a message if it is one of the questions or contains one, by looking for each question in turn"""
+    from actions.dna_screen import normalize_text
+
+    padded = [f" {normalize_text(question)} " for question in questions]
+
+    def match(text):
+        message = f" {normalize_text(text)} "
+        return any(question in message for question in padded)
+
+    return match
+
+
+def main():
+    args = parser.parse_args()
+
+    from actions.dna_screen import DnaScreen, build_dna_screen, iter_dna_screen_json
+    from common import timed
+    from synthetic import synthetic_questions
+
+    rng = random.Random(args.seed)
+    questions = synthetic_questions(args.questions, seed=args.seed)
+    # same vocabulary and shape, but other case numbers, so they share words with the questions without containing one
+    allowed = [question.replace("(case", "(item") for question in synthetic_questions(args.messages, seed=args.seed + 1)]
+    messages = []
+    for i in range(args.messages):
+        kind = i % 3
+        if kind == 0:
+            messages.append(rng.choice(questions))
+        elif kind == 1:
+            messages.append(f"{rng.choice(FILLERS)}, {rng.choice(questions).lower()} {rng.choice(FILLERS)}")
+        else:
+            messages.append(allowed[i])
+
+    screen, build_seconds = timed(build_dna_screen, questions, "Sorry, I am designed not to answer such a question.")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "dna_screen.json")
+        with open(path, "w", encoding="utf-8") as f:
+            for chunk in iter_dna_screen_json(screen):
+                f.write(chunk)
+        size = os.path.getsize(path)
+        dna_screen, load_seconds = timed(DnaScreen.load, path)
+
+    blocked, screen_seconds = timed(lambda: [dna_screen.match(message) for message in messages])
+    match = scan_screen(questions)
+    scanned = messages[: args.scanned]
+    scan_blocked, scan_seconds = timed(lambda: [match(message) for message in scanned])
+    assert scan_blocked == blocked[: len(scanned)], "the screen and the scan disagree"
+
+    print(f"{len(questions)} questions: {len(dna_screen.goto)} automaton states, build {build_seconds:.2f}s, "
+          f"file {size / 2**20:.1f} MiB, load {load_seconds:.2f}s")
+    print(f"{'':>8} {'messages':>9} {'per second':>12} {'us each':>9}")
+    for name, count, seconds in (("screen", len(messages), screen_seconds), ("scan", len(scanned), scan_seconds)):
+        print(f"{name:>8} {count:>9} {count / seconds:>12.0f} {seconds / count * 1e6:>9.1f}")
+    print(f"blocked {sum(blocked)} of {len(messages)} messages, {2 * len(messages) // 3} contain a question")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Compares scoring chat messages with a new NRCLex object per message, as action_emotion used to,
+with the shared lexicon of actions/emotion.py: one message at a time, from its cache, and in one batch"""
+
+import common  # noqa: F401  makes rasa_template/ importable
+
+import argparse
+import random
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-n", "--messages", type=int, default=20_000, help="Messages scored per run")
+parser.add_argument("--distinct", type=int, default=2_000, help="Distinct messages, chat users repeat themselves")
+
+
+def nrclex_scores(messages):
+    from nrclex import NRCLex
+
+    return [NRCLex(message).affect_frequencies for message in messages]
+
+
+def uncached_scores(messages):
+    from actions.emotion import score_message
+
+    return [score_message.__wrapped__(message) for message in messages]
+
+
+def cached_scores(messages):
+    from actions.emotion import score_message
+
+    score_message.cache_clear()
+    return [score_message(message) for message in messages]
+
+
+def main():
+    args = parser.parse_args()
+
+    import numpy as np
+    from actions.emotion import EMOTIONS, load_lexicon, score_messages
+    from common import timed
+    from synthetic import synthetic_questions
+
+    distinct = synthetic_questions(args.distinct)
+    rng = random.Random(0)
+    messages = [rng.choice(distinct) for _ in range(args.messages)]
+    _, lexicon_seconds = timed(load_lexicon)
+
+    print(f"{args.messages} messages, {args.distinct} distinct, lexicon loaded once in {lexicon_seconds:.3f}s")
+    print(f"{'method':>16} {'seconds':>9} {'us/message':>11}")
+    try:
+        _, seconds = timed(nrclex_scores, messages)
+        print(f"{'NRCLex':>16} {seconds:>9.2f} {seconds / args.messages * 1e6:>11.1f}")
+    except Exception as e:
+        # NRCLex needs textblob and the punkt corpus of nltk
+        print(f"{'NRCLex':>16} skipped: {type(e).__name__}")
+
+    single, single_seconds = timed(uncached_scores, messages)
+    cached, cached_seconds = timed(cached_scores, messages)
+    batch, batch_seconds = timed(score_messages, messages)
+    for name, seconds in [("single", single_seconds), ("single cached", cached_seconds), ("batch", batch_seconds)]:
+        print(f"{name:>16} {seconds:>9.2f} {seconds / args.messages * 1e6:>11.1f}")
+
+    expected = np.array([[dict(scores.affect_frequencies)[emotion] for emotion in EMOTIONS] for scores in single])
+    assert cached == single and np.allclose(batch, expected)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Compares the peak memory and wall time of extract_intent reading the whole QA file with its chunked mode (--chunksize),
+on a synthetic export with long answers, and checks that both write the same Chat_intent.csv.
+Each run is a fresh interpreter, peak memory is its maximum RSS minus the RSS after importing extract_intent."""
+
+import common
+
+import argparse
+import filecmp
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-n", "--rows", type=int, default=300_000, help="QA pairs in the input file")
+parser.add_argument("--chunksize", type=int, default=10_000, help="Rows per chunk in the chunked mode")
+parser.add_argument("--seed", type=int, default=0)
+
+RUN_SNIPPET = """
+import resource, sys, time
+sys.path.insert(0, {code_dir!r})
+import extract_intent
+
+def rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+extract_intent.ensure_nltk_data()
+extract_intent.get_lemmatizer()
+baseline = rss()
+start = time.perf_counter()
+extract_intent.main({argv!r})
+seconds = time.perf_counter() - start
+print(seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - baseline)
+"""
+
+
+def write_export(path, rows, seed):
+    """Writes a QA file shaped like a large FAQ export, with answers of several sentences and some missing sources"""
+    import pandas as pd
+
+    from synthetic import synthetic_answers, synthetic_questions
+
+    rng = random.Random(seed)
+    block = 100_000
+    for start in range(0, rows, block):
+        size = min(block, rows - start)
+        questions = synthetic_questions(start + size, seed=seed)[start:]
+        pd.DataFrame(
+            {
+                "Question": questions,
+                "Answer": synthetic_answers(size, seed=seed + start, long_fraction=0.5),
+                "Source": [f"https://scvotes.gov/{rng.randrange(10_000)}" if rng.random() < 0.8 else None for _ in range(size)],
+                "Timestamp": [1_700_000_000 + start + i for i in range(size)],
+            }
+        ).to_csv(path, mode="a", header=start == 0, index=False)
+
+
+def run(directory, argv):
+    code = RUN_SNIPPET.format(code_dir=common.CODE_DIR, argv=argv)
+    output = subprocess.run([sys.executable, "-c", code], cwd=directory, capture_output=True, text=True, check=True).stdout
+    seconds, peak = map(float, output.split()[-2:])
+    return seconds, peak
+
+
+def main():
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        input_dir = os.path.join(directory, "data", "input")
+        os.makedirs(input_dir)
+        write_export(os.path.join(input_dir, "Export.csv"), args.rows, args.seed)
+        size = os.path.getsize(os.path.join(input_dir, "Export.csv"))
+        output = os.path.join(input_dir, "Chat_intent.csv")
+
+        results = {}
+        for name, argv in (
+            ("whole file", ["-f", "Export.csv"]),
+            ("chunked", ["-f", "Export.csv", "--chunksize", str(args.chunksize)]),
+        ):
+            results[name] = run(directory, argv)
+            shutil.move(output, output + "." + name.replace(" ", "_"))
+        identical = filecmp.cmp(output + ".whole_file", output + ".chunked", shallow=False)
+    finally:
+        shutil.rmtree(directory)
+
+    print(f"{args.rows} rows, {size / 2**20:.0f} MiB input, chunks of {args.chunksize} rows")
+    print(f"{'':>11} {'seconds':>8} {'peak MiB':>9}")
+    for name, (seconds, peak) in results.items():
+        print(f"{name:>11} {seconds:>8.2f} {peak / 2**20:>9.1f}")
+    print("outputs identical" if identical else "OUTPUTS DIFFER")
+
+
+if __name__ == "__main__":
+    main()
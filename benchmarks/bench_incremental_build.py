@@ -0,0 +1,94 @@
+"""Measures configure_rasa on a synthetic FAQ: a full build, a rebuild without changes and a rebuild after editing one row"""
+
+import common  # noqa: F401  makes code/ importable
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-n", "--rows", type=int, default=10_000, help="QA pairs in the FAQ")
+parser.add_argument(
+    "--long-fraction",
+    type=float,
+    default=0.1,
+    help="share of answers long enough to be summarized",
+)
+
+
+def write_inputs(work_dir: str, rows: int, long_fraction: float):
+    """Writes Chat_intent.csv, DNA.csv and paraphrased.json of a synthetic FAQ and copies the rasa template"""
+    import pandas as pd
+    from synthetic import synthetic_answers, synthetic_questions
+
+    input_dir = os.path.join(work_dir, "data", "input")
+    os.makedirs(input_dir)
+    questions = synthetic_questions(rows)
+    QA_df = pd.DataFrame(
+        {
+            "Question": questions,
+            "Answer": synthetic_answers(rows, long_fraction=long_fraction),
+            "Source": "Synthetic FAQ",
+            "Timestamp": 1725000000,
+            "Intent": [f"intent_{i}" for i in range(rows)],
+        }
+    )
+    QA_df.to_csv(os.path.join(input_dir, "Chat_intent.csv"), index=False)
+    pd.DataFrame({"Questions": ["Who should I vote for?"]}).to_csv(
+        os.path.join(input_dir, "DNA.csv"), index=False
+    )
+    with open(os.path.join(input_dir, "paraphrased.json"), "w") as f:
+        json.dump({question: [question.lower()] for question in questions}, f)
+    shutil.copytree(
+        os.path.join(common.REPO_DIR, "rasa_template"),
+        os.path.join(work_dir, "rasa_template"),
+    )
+
+
+def main():
+    args = parser.parse_args()
+
+    import pandas as pd
+    import configure_rasa
+    from common import timed
+
+    work_dir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        write_inputs(work_dir, args.rows, args.long_fraction)
+        os.chdir(work_dir)
+        # configure_rasa parses its arguments from the command line
+        sys.argv = ["configure_rasa.py"]
+
+        results = []
+        _, seconds = timed(configure_rasa.main)
+        results.append(("full build", seconds))
+        _, seconds = timed(configure_rasa.main)
+        results.append(("no changes", seconds))
+
+        # edit the answer of a single row in the middle of the FAQ
+        path = "data/input/Chat_intent.csv"
+        QA_df = pd.read_csv(path)
+        QA_df.loc[len(QA_df) // 2, "Answer"] = "Edited answer for this benchmark."
+        QA_df.to_csv(path, index=False)
+        _, seconds = timed(configure_rasa.main)
+        results.append(("one row edited", seconds))
+
+        sys.argv = ["configure_rasa.py", "--clean"]
+        _, seconds = timed(configure_rasa.main)
+        results.append(("clean rebuild", seconds))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n{args.rows} rows")
+    print(f"{'run':>15} {'seconds':>9}")
+    for name, seconds in results:
+        print(f"{name:>15} {seconds:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Compares intent allocation with IntentAllocator against the old quadratic duplicate loop"""
+
+import common  # noqa: F401  makes code/ importable
+
+import pandas as pd
+
+from common import timed
+from synthetic import synthetic_questions
+from extract_intent import IntentAllocator, extract_intent, get_new_intent
+
+SIZES = [1_000, 10_000, 100_000]
+# the quadratic loop is only run up to this size, beyond it a single run takes hours
+LEGACY_MAX_SIZE = 1_000
+
+
+def allocate_legacy(questions):
+    """Old behaviour: a global counter of seen intents followed by an all pairs duplicate scan"""
+    intent_values = {}
+    QA_df = pd.DataFrame({"Question": questions})
+
+    def counted_intent(question):
+        intent_value = extract_intent(question)
+        return_intent = intent_value
+        if intent_value in intent_values:
+            return_intent += str(intent_values[intent_value])
+        intent_values[intent_value] = intent_values.get(intent_value, 0) + 1
+        return return_intent
+
+    QA_df["Intent"] = QA_df["Question"].apply(counted_intent)
+    for i in range(len(QA_df)):
+        for j in range(len(QA_df)):
+            if i == j:
+                continue
+            if QA_df["Intent"][i] == QA_df["Intent"][j]:
+                QA_df.loc[j, "Intent"] = get_new_intent(QA_df["Question"][j])
+                QA_df.loc[i, "Intent"] = get_new_intent(QA_df["Question"][i])
+    return QA_df["Intent"].to_list()
+
+
+def allocate(questions):
+    allocator = IntentAllocator()
+    return [allocator.allocate(question) for question in questions]
+
+
+def main():
+    print(f"{'questions':>10} {'allocator (s)':>14} {'legacy (s)':>11}")
+    for size in SIZES:
+        questions = synthetic_questions(size)
+        intents, seconds = timed(allocate, questions)
+        assert len(intents) == len(set(intents))
+
+        legacy = "skipped"
+        if size <= LEGACY_MAX_SIZE:
+            legacy_intents, legacy_seconds = timed(allocate_legacy, questions)
+            assert legacy_intents == intents
+            legacy = f"{legacy_seconds:.3f}"
+        print(f"{size:>10} {seconds:>14.3f} {legacy:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Compares the memory and load time of answers embedded in domain.yml, which every Rasa process parses and keeps,
+with the memory-mapped knowledge base of actions/knowledge_base.py, at 100k answers by default.
+Each variant is loaded in a fresh interpreter that reports its load time, lookup time and memory from /proc/self/smaps_rollup:
+RSS counts pages of the mapped file, which all processes share through the page cache, anonymous memory is private
+to the process. Needs Linux and ruamel.yaml, the yaml library of Rasa."""
+
+import common
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-n", "--answers", type=int, default=100_000, help="Intents with an answer")
+parser.add_argument("--lookups", type=int, default=10_000, help="Random intents looked up after loading")
+parser.add_argument("--seed", type=int, default=0)
+
+LOAD_SNIPPET = """
+import random, sys, time
+
+def memory():
+    fields = {{}}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return fields["Rss"], fields["Anonymous"]
+
+sys.path.insert(0, {template_dir!r})
+{imports}
+intents = ["intent_%d" % i for i in random.Random(0).sample(range({answers}), {lookups})]
+rss, anonymous = memory()
+start = time.perf_counter()
+{load}
+loaded = time.perf_counter()
+for intent in intents:
+    {lookup}
+looked_up = time.perf_counter()
+rss_after, anonymous_after = memory()
+print(loaded - start, looked_up - loaded, rss_after - rss, anonymous_after - anonymous)
+"""
+
+VARIANTS = {
+    "domain.yml": dict(
+        imports="from ruamel.yaml import YAML",
+        load="domain = YAML(typ='safe').load(open({path!r}, encoding='utf-8'))",
+        lookup="text = domain['responses']['utter_' + intent][0]['text']",
+    ),
+    "knowledge base": dict(
+        imports="from actions.knowledge_base import KnowledgeBase",
+        load="knowledge_base = KnowledgeBase({path!r})",
+        lookup="text = knowledge_base.response(intent)",
+    ),
+}
+
+
+def synthetic_entries(n, seed):
+    from actions.knowledge_base import Entry
+    from synthetic import synthetic_answers
+
+    rng = random.Random(seed)
+    for i, answer in enumerate(synthetic_answers(n, seed=seed)):
+        # stands in for the LSA summary of a long answer
+        summary = " ".join(answer.split(". ")[:3]) + "\nThis is a brief summary. For more details, please ask for the full answer."
+        yield Entry(
+            f"intent_{i}",
+            answer,
+            summary if len(answer) >= 140 else "",
+            f"https://scvotes.gov/page-{rng.randrange(1000)}",
+            rng.choice(["September 2024", "April 2022", ""]),
+        )
+
+
+def iter_domain_yaml(entries):
+    """Responses of domain.yml as configure_rasa writes them"""
+    from configure_rasa import get_domain_yaml_string
+
+    yield "version: \"3.1\"\n\nresponses:"
+    for entry in entries:
+        if entry.summary:
+            yield get_domain_yaml_string(f"summary_{entry.intent}", entry.summary)
+        yield get_domain_yaml_string(entry.intent, entry.response())
+    yield "\n"
+
+
+def measure(variant, path, args):
+    code = LOAD_SNIPPET.format(
+        template_dir=common.TEMPLATE_DIR,
+        imports=VARIANTS[variant]["imports"],
+        load=VARIANTS[variant]["load"].format(path=path),
+        lookup=VARIANTS[variant]["lookup"],
+        answers=args.answers,
+        lookups=args.lookups,
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    load_seconds, lookup_seconds, rss, anonymous = map(float, output.split())
+    return load_seconds, lookup_seconds, rss, anonymous
+
+
+def main():
+    args = parser.parse_args()
+
+    from actions.knowledge_base import iter_knowledge_base_bytes
+
+    entries = list(synthetic_entries(args.answers, args.seed))
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {
+            "domain.yml": os.path.join(directory, "domain.yml"),
+            "knowledge base": os.path.join(directory, "knowledge_base.bin"),
+        }
+        with open(paths["domain.yml"], "w", encoding="utf-8") as f:
+            f.writelines(iter_domain_yaml(entries))
+        with open(paths["knowledge base"], "wb") as f:
+            f.writelines(iter_knowledge_base_bytes(entries))
+
+        print(f"{args.answers} answers, {args.lookups} lookups")
+        print(f"{'':>15} {'file MiB':>9} {'load s':>8} {'lookup us':>10} {'RSS MiB':>8} {'anon MiB':>9}")
+        for variant, path in paths.items():
+            load_seconds, lookup_seconds, rss, anonymous = measure(variant, path, args)
+            print(f"{variant:>15} {os.path.getsize(path) / 2**20:>9.1f} {load_seconds:>8.3f} "
+                  f"{lookup_seconds / args.lookups * 1e6:>10.1f} {rss / 2**20:>8.1f} {anonymous / 2**20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
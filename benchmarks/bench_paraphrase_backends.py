@@ -0,0 +1,91 @@
+"""Compares the paraphrasing backends: load time, latency, peak RSS and paraphrase overlap with fp32.
+Every backend runs in its own interpreter so that peak RSS is not shared between them."""
+
+import common
+
+import argparse
+import json
+import subprocess
+import sys
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-n", "--questions", type=int, default=16, help="questions to paraphrase")
+parser.add_argument("-b", "--batch-size", type=int, default=8)
+parser.add_argument("--backends", nargs="+", default=["fp32", "int8"])
+parser.add_argument("--child", help=argparse.SUPPRESS)
+
+
+def run_backend(backend: str, num_questions: int, batch_size: int):
+    """Paraphrases in the current process and prints the measurements as JSON"""
+    import resource
+
+    import paraphraser
+    from common import timed
+    from synthetic import synthetic_questions
+
+    questions = synthetic_questions(num_questions)
+    _, load_seconds = timed(paraphraser.load_model, backend)
+    paraphrases, seconds = timed(
+        paraphraser.paraphrase_question_list, questions, batch_size, backend
+    )
+    print(
+        json.dumps(
+            {
+                "load_seconds": load_seconds,
+                "seconds_per_question": seconds / num_questions,
+                # kilobytes on Linux
+                "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                "paraphrases": paraphrases,
+            }
+        )
+    )
+
+
+def overlap(paraphrases, reference):
+    """Mean Jaccard similarity between the paraphrase sets of each question"""
+    scores = []
+    for own, expected in zip(paraphrases, reference):
+        own, expected = set(own), set(expected)
+        scores.append(len(own & expected) / max(len(own | expected), 1))
+    return sum(scores) / max(len(scores), 1)
+
+
+def main():
+    args = parser.parse_args()
+    if args.child:
+        run_backend(args.child, args.questions, args.batch_size)
+        return
+
+    results = {}
+    for backend in args.backends:
+        output = subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--child",
+                backend,
+                "-n",
+                str(args.questions),
+                "-b",
+                str(args.batch_size),
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        results[backend] = json.loads(output.strip().splitlines()[-1])
+
+    reference = results[args.backends[0]]["paraphrases"]
+    print(
+        f"{'backend':>8} {'load (s)':>9} {'s/question':>11} {'peak RSS (MB)':>14} "
+        f"{'overlap with ' + args.backends[0]:>18}"
+    )
+    for backend, result in results.items():
+        print(
+            f"{backend:>8} {result['load_seconds']:>9.2f} {result['seconds_per_question']:>11.3f} "
+            f"{result['peak_rss_mb']:>14.0f} {overlap(result['paraphrases'], reference):>18.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
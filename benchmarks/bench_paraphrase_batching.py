@@ -0,0 +1,41 @@
+"""Measures paraphrasing throughput (questions/second) on CPU at several batch sizes"""
+
+import common  # noqa: F401  makes code/ importable
+
+import argparse
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-n", "--questions", type=int, default=32, help="questions per run")
+parser.add_argument(
+    "--batch-sizes",
+    type=int,
+    nargs="+",
+    default=[1, 4, 8, 16],
+    help="batch sizes to measure",
+)
+parser.add_argument("--threads", type=int, help="torch intra-op threads, defaults to torch's choice")
+
+
+def main():
+    args = parser.parse_args()
+
+    import torch
+    import paraphraser
+    from common import timed
+    from synthetic import synthetic_questions
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    questions = synthetic_questions(args.questions)
+    # warm up so that one-time initialization is not attributed to the first batch size
+    paraphraser.paraphrase_question_list(questions[:2], batch_size=2)
+
+    print(f"{'batch size':>10} {'seconds':>9} {'questions/s':>12}")
+    for batch_size in args.batch_sizes:
+        _, seconds = timed(paraphraser.paraphrase_question_list, questions, batch_size)
+        print(f"{batch_size:>10} {seconds:>9.2f} {len(questions) / seconds:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
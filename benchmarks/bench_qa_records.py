@@ -0,0 +1,75 @@
+"""Compares preparing the QA pairs for the yaml files row by row, as configure_rasa used to,
+with the columnar get_qa_records on 50k rows"""
+
+import common  # noqa: F401  makes code/ importable
+
+import argparse
+from datetime import datetime
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-n", "--rows", type=int, default=50_000, help="QA pairs per run")
+
+
+def legacy_rows(QA_df):
+    """The previous main loop of configure_rasa without the yaml output: a .loc write and
+    per-row column lookups, date formatting and URL stripping for every row"""
+    import configure_rasa as cr
+
+    rows = []
+    for i in range(len(QA_df)):
+        # replace all double quotes with single quotes
+        QA_df.loc[i, "Answer"] = QA_df.loc[i, "Answer"].replace('"', "'")
+
+        intent = QA_df["Intent"][i]
+        question = QA_df["Question"][i]
+        answer = QA_df["Answer"][i]
+
+        try:
+            timestamp = QA_df["Timestamp"][i]
+            date = datetime.fromtimestamp(timestamp).strftime("%B %Y")
+        except:
+            date = ""
+
+        if "Source" in QA_df.columns:
+            source = QA_df["Source"][i]
+        else:
+            source = ""
+
+        long_answer = cr.get_plain_text_length(answer) >= cr.SUMMARY_THRESHOLD
+        rows.append((intent, question, answer, source, date, long_answer))
+    return rows
+
+
+def main():
+    args = parser.parse_args()
+
+    import pandas as pd
+    import configure_rasa as cr
+    from common import timed
+    from synthetic import synthetic_answers, synthetic_questions
+
+    timestamps = [1_600_000_000 + 86_400 * (i % 1500) for i in range(args.rows)]
+    QA_df = pd.DataFrame(
+        {
+            "Question": synthetic_questions(args.rows),
+            "Answer": synthetic_answers(args.rows),
+            "Source": "Synthetic FAQ",
+            "Timestamp": timestamps,
+            "Intent": [f"intent_{i}" for i in range(args.rows)],
+        }
+    )
+
+    records, records_seconds = timed(cr.get_qa_records, QA_df)
+    rows, legacy_seconds = timed(legacy_rows, QA_df.copy())
+    # synthetic answers have no double quotes, so both give the same fields
+    assert [tuple(record) for record in records] == rows
+
+    print(f"{args.rows} rows")
+    print(f"{'method':>14} {'seconds':>9}")
+    print(f"{'row loop':>14} {legacy_seconds:>9.2f}")
+    print(f"{'records':>14} {records_seconds:>9.2f}")
+    print(f"speedup {legacy_seconds / records_seconds:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Builds the retrieval index of action_retrieval_fallback over synthetic questions and measures the size of the file,
+its load time and the latency of single queries, which must stay low because the action answers a waiting user.
+Queries are known questions with two typos each, so the share they are answered correctly is reported as well."""
+
+import common  # noqa: F401  makes rasa_template/ importable
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-n", "--examples", type=int, default=100_000, help="Questions and paraphrases in the index")
+parser.add_argument("--per-intent", type=int, default=5, help="Examples of every intent")
+parser.add_argument("-q", "--queries", type=int, default=2_000, help="Messages searched one at a time")
+parser.add_argument("--threshold", type=float, default=0.7, help="Similarity needed to answer, as RETRIEVAL_THRESHOLD")
+parser.add_argument("--seed", type=int, default=0)
+
+
+def with_typos(text, rng, typos=2):
+    characters = list(text)
+    for _ in range(typos):
+        characters[rng.randrange(len(characters))] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    return "".join(characters)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def main():
+    args = parser.parse_args()
+
+    from actions.retrieval_index import RetrievalIndex, build_retrieval_index, iter_retrieval_index_npz
+    from common import timed
+    from synthetic import synthetic_questions
+
+    questions = synthetic_questions(args.examples, seed=args.seed)
+    intents = [f"intent_{i // args.per_intent}" for i in range(len(questions))]
+    entries = [
+        (intents[start], questions[start:start + args.per_intent])
+        for start in range(0, len(questions), args.per_intent)
+    ]
+
+    index, build_seconds = timed(build_retrieval_index, entries)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "retrieval_index.npz")
+        with open(path, "wb") as f:
+            for chunk in iter_retrieval_index_npz(index):
+                f.write(chunk)
+        size = os.path.getsize(path)
+        retrieval_index, load_seconds = timed(RetrievalIndex.load, path)
+
+    rng = random.Random(args.seed)
+    targets = [rng.randrange(len(questions)) for _ in range(args.queries)]
+    messages = [with_typos(questions[target], rng) for target in targets]
+    latencies = []
+    exact_latencies = []
+    answered = correct = agreed = 0
+    for target, message in zip(targets, messages):
+        start = time.perf_counter()
+        matches = retrieval_index.search(message, 1)
+        latencies.append(time.perf_counter() - start)
+        if matches and matches[0].score >= args.threshold:
+            answered += 1
+            correct += matches[0].intent == intents[target]
+
+        # every question scored through all postings of the message's n-grams
+        start = time.perf_counter()
+        scores = retrieval_index.scores(message)
+        exact_latencies.append(time.perf_counter() - start)
+        best = int(scores.argmax())
+        agreed += bool(matches) and matches[0].intent == retrieval_index.intents[retrieval_index.doc_intents[best]]
+
+    postings = len(index["postings_doc"])
+    print(f"{len(questions)} examples, {len(entries)} intents, {postings} postings")
+    print(f"build {build_seconds:.2f}s, file {size / 2**20:.1f} MiB, load {load_seconds * 1e3:.0f}ms")
+    for name, values in (("search", latencies), ("all postings", exact_latencies)):
+        print(f"{name:>12}: p50 {percentile(values, 50) * 1e3:.2f}ms, p99 {percentile(values, 99) * 1e3:.2f}ms, "
+              f"max {max(values) * 1e3:.2f}ms over {len(messages)} messages")
+    print(f"search found the best intent of all postings for {agreed / len(messages):.1%} of the messages")
+    print(f"answered {answered / len(messages):.1%} at threshold {args.threshold}, "
+          f"{correct / max(answered, 1):.1%} of them with the right intent")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Chooses RETRIEVAL_THRESHOLD of action_retrieval_fallback on real questions and paraphrases, data/input by default.
+Two held-out evaluations are run for every threshold:
+   held-out texts: every question and paraphrase is searched in an index built without it, the share answered with
+      its own intent is the coverage, answers with another intent are wrong answers
+   held-out intents: every intent is left out of the index and its texts are searched, any answer is a wrong one,
+      as for a message about something the bot was never given an answer for
+Below the threshold the action asks the user to rephrase, so the threshold trades coverage for wrong answers."""
+
+import common
+
+import argparse
+import json
+import os
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--intents", default=os.path.join(common.REPO_DIR, "data", "input", "Chat_intent.csv"),
+                    help="QA file with intents, written by extract_intent")
+parser.add_argument("--paraphrases", default=os.path.join(common.REPO_DIR, "data", "input", "paraphrased.json"),
+                    help="Paraphrases of the questions, written by paraphraser")
+parser.add_argument("--thresholds", type=float, nargs="+", default=[0.4, 0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.9])
+
+
+def top_match(entries, text):
+    from actions.retrieval_index import RetrievalIndex, build_retrieval_index
+
+    matches = RetrievalIndex(build_retrieval_index(entries)).search(text, 1)
+    return matches[0] if matches else None
+
+
+def main():
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    from faq_index import normalize_text
+
+    QA_df = pd.read_csv(args.intents)
+    with open(args.paraphrases) as f:
+        paraphrased = json.load(f)
+    texts = {
+        intent: [question] + paraphrased.get(question, [])
+        for intent, question in zip(QA_df["Intent"], QA_df["Question"])
+    }
+
+    # (score, answered with the right intent) of every held-out text, and the score of every text of a held-out intent
+    held_out_texts = []
+    held_out_intents = []
+    for intent, intent_texts in texts.items():
+        for text in intent_texts:
+            key = normalize_text(text)
+            entries = [(other, [t for t in others if normalize_text(t) != key]) for other, others in texts.items()]
+            match = top_match([(other, others) for other, others in entries if others], text)
+            if match is not None:
+                held_out_texts.append((match.score, match.intent == intent))
+        entries = [(other, others) for other, others in texts.items() if other != intent]
+        for text in intent_texts:
+            match = top_match(entries, text)
+            if match is not None:
+                held_out_intents.append(match.score)
+
+    print(f"{len(texts)} intents, {len(held_out_texts)} held-out texts")
+    print(f"{'threshold':>9} {'right':>7} {'wrong':>7} {'held-out intents answered':>26}")
+    for threshold in args.thresholds:
+        right = sum(correct for score, correct in held_out_texts if score >= threshold)
+        wrong = sum(not correct for score, correct in held_out_texts if score >= threshold)
+        answered = sum(score >= threshold for score in held_out_intents)
+        print(f"{threshold:>9.2f} {right / len(held_out_texts):>7.1%} {wrong / len(held_out_texts):>7.1%} "
+              f"{answered / len(held_out_intents):>26.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Measures the cold import cost of extract_intent and the cost of its first call in fresh interpreters"""
+
+import common
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument(
+    "--compare",
+    metavar="REV",
+    help="git revision whose extract_intent.py is measured as well, e.g. the commit before a change",
+)
+parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement")
+
+IMPORT_SNIPPET = """
+import sys, time
+sys.argv = sys.argv[:1]
+start = time.perf_counter()
+import extract_intent
+imported = time.perf_counter()
+{first_call}
+print(imported - start, time.perf_counter() - imported)
+"""
+FIRST_CALL = 'extract_intent.get_clean_text("How do I register to vote?")'
+
+
+def measure(code_dir: str, runs: int):
+    """Runs the import snippet in fresh interpreters
+    Returns:
+       (import_seconds, first_call_seconds): medians over all runs
+    """
+    import_times, call_times = [], []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET.format(first_call=FIRST_CALL)],
+            cwd=code_dir,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        import_seconds, call_seconds = map(float, output.split()[-2:])
+        import_times.append(import_seconds)
+        call_times.append(call_seconds)
+    return statistics.median(import_times), statistics.median(call_times)
+
+
+def main():
+    args = parser.parse_args()
+    targets = [("working tree", common.CODE_DIR)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.compare:
+            source = subprocess.run(
+                ["git", "show", f"{args.compare}:code/extract_intent.py"],
+                cwd=common.REPO_DIR,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            with open(os.path.join(tmp_dir, "extract_intent.py"), "w") as f:
+                f.write(source)
+            targets.insert(0, (args.compare, tmp_dir))
+
+        print(f"{'version':>14} {'import (s)':>11} {'first call (s)':>15}")
+        for label, code_dir in targets:
+            import_seconds, call_seconds = measure(code_dir, args.runs)
+            print(f"{label:>14} {import_seconds:>11.3f} {call_seconds:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
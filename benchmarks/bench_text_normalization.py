@@ -0,0 +1,50 @@
+"""Compares per-question text cleaning against the batched, memoized get_clean_texts"""
+
+import common  # noqa: F401  makes code/ importable
+
+import pandas as pd
+
+from common import timed
+from synthetic import synthetic_questions
+import extract_intent
+from extract_intent import get_clean_texts, lemmatize_word
+
+SIZES = [10_000, 100_000]
+
+
+def clean_legacy(texts):
+    """Old behaviour: character by character punctuation filter and an uncached lemmatizer call per word"""
+    punctuation = set(extract_intent.string.punctuation)
+    stop = extract_intent.get_stopwords()
+    lemma = extract_intent.get_lemmatizer()
+    cleaned = []
+    for text in texts:
+        words = text.lower().split()
+        text = " ".join([word for word in words if word not in stop])
+        text = "".join(ch for ch in text if ch not in punctuation)
+        cleaned.append([lemma.lemmatize(word) for word in text.split()])
+    return cleaned
+
+
+def main():
+    print(
+        f"{'questions':>10} {'legacy (s)':>11} {'batch (s)':>10} {'words':>9} {'lemmatized':>11}"
+    )
+    for size in SIZES:
+        questions = synthetic_questions(size)
+        legacy, legacy_seconds = timed(clean_legacy, questions)
+
+        lemmatize_word.cache_clear()
+        batch, batch_seconds = timed(get_clean_texts, pd.Series(questions))
+        assert batch == legacy
+
+        # legacy calls the lemmatizer once per word, the batch once per distinct word
+        words = sum(len(base_words) for base_words in legacy)
+        lemmatized = lemmatize_word.cache_info().misses
+        print(
+            f"{size:>10} {legacy_seconds:>11.3f} {batch_seconds:>10.3f} {words:>9} {lemmatized:>11}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Compares writing the rasa yaml files by joining in-memory lists and rewriting domain.yml twice
+with the streaming single pass emitter, wall time and peak memory at 100k intents.
+The point of streaming is peak memory, which no longer grows with the number of intents; wall time is about the same"""
+
+import common  # noqa: F401  makes code/ importable
+
+import argparse
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-n", "--intents", type=int, nargs="+", default=[10_000, 100_000], help="intents per run")
+
+
+def synthetic_inputs(n: int):
+    import pandas as pd
+    from synthetic import synthetic_answers, synthetic_questions
+
+    questions = synthetic_questions(n)
+    QA_df = pd.DataFrame(
+        {
+            "Question": questions,
+            "Answer": synthetic_answers(n),
+            "Source": "Synthetic FAQ",
+            "Timestamp": 1725000000,
+            "Intent": [f"intent_{i}" for i in range(n)],
+        }
+    )
+    paraphrased_dict = {question: [question.lower(), question.upper()] for question in questions}
+    return QA_df, paraphrased_dict
+
+
+def legacy_build(template_dir: str, chatbot_dir: str, records, paraphrased_dict, summaries):
+    """The previous approach: every yaml block is collected in lists, the lists are appended to the files
+    and domain.yml is read and rewritten once for the responses and once for the intents"""
+    import configure_rasa as cr
+
+    nlu_list = [cr.FULL_ANSWER_NLU_STRING, cr.get_nlu_yaml_string("Do not answer", ["Who should I vote for?"])]
+    intent_list = [cr.get_intent_yaml_string("full_answer"), cr.get_intent_yaml_string("Do not answer")]
+    domain_list = [cr.get_domain_yaml_string("Do not answer", "Sorry, I am designed not to answer such a question.")]
+    rules_list = [cr.get_rules_yaml_string("Do not answer")]
+    stories_list = []
+    for intent, question, answer, source, date, long_answer in records:
+        nlu_list.append(cr.get_nlu_yaml_string(intent, [question] + paraphrased_dict[question]))
+        if long_answer:
+            stories_list.append(cr.get_stories_yaml_string(intent))
+            domain_list.append(cr.get_domain_yaml_string(f"summary_{intent}", summaries[answer]))
+        else:
+            rules_list.append(cr.get_rules_yaml_string(intent))
+        domain_list.append(cr.get_domain_yaml_string(intent, f"[Source: {source}; Date: {date}] {answer}"))
+        intent_list.append(cr.get_intent_yaml_string(intent))
+
+    for yaml_list, relative_path in [(nlu_list, cr.NLU_FILE), (rules_list, cr.RULES_FILE), (stories_list, cr.STORIES_FILE)]:
+        with open(os.path.join(chatbot_dir, relative_path), "a", encoding="utf-8") as f:
+            f.write("\n")
+            for item in yaml_list:
+                f.write(item)
+
+    domain_path = os.path.join(chatbot_dir, cr.DOMAIN_FILE)
+    for key, yaml_list in [("actions:", domain_list), ("responses:", intent_list)]:
+        with open(domain_path, "r", encoding="utf-8") as f:
+            domain_data = f.read().replace(key, "".join(yaml_list) + "\n\n" + key)
+        with open(domain_path, "w", encoding="utf-8") as f:
+            f.write(domain_data)
+
+
+def streaming_build(template_dir: str, chatbot_dir: str, records, paraphrased_dict, summaries):
+    import configure_rasa as cr
+    from build_manifest import write_stream_if_changed
+
+    # only the yaml files, the indexes and the knowledge base configure_rasa also generates are not compared here
+    yaml_files = [cr.NLU_FILE, cr.RULES_FILE, cr.STORIES_FILE, cr.DOMAIN_FILE]
+    for relative_path, chunks in cr.iter_output_files(
+        template_dir, yaml_files, records, ["Who should I vote for?"], paraphrased_dict, summaries
+    ):
+        write_stream_if_changed(os.path.join(chatbot_dir, relative_path), chunks)
+
+
+def measure(build, template_dir, work_dir, *inputs):
+    """Runs build on a fresh copy of the template twice, once timed and once under tracemalloc
+    Returns:
+       (seconds, peak_mb): wall time and peak memory allocated by the build
+    """
+    results = []
+    for trace in (False, True):
+        chatbot_dir = os.path.join(work_dir, "Chatbot")
+        shutil.rmtree(chatbot_dir, ignore_errors=True)
+        shutil.copytree(template_dir, chatbot_dir)
+        if trace:
+            tracemalloc.start()
+            build(template_dir, chatbot_dir, *inputs)
+            results.append(tracemalloc.get_traced_memory()[1] / 2**20)
+            tracemalloc.stop()
+        else:
+            from common import timed
+
+            _, seconds = timed(build, template_dir, chatbot_dir, *inputs)
+            results.append(seconds)
+    return results
+
+
+def main():
+    args = parser.parse_args()
+
+    import configure_rasa as cr
+
+    template_dir = os.path.join(common.REPO_DIR, "rasa_template")
+    work_dir = tempfile.mkdtemp()
+    try:
+        print(f"{'intents':>8} {'emitter':>10} {'seconds':>9} {'peak MB':>9}")
+        for n in args.intents:
+            QA_df, paraphrased_dict = synthetic_inputs(n)
+            records = cr.get_qa_records(QA_df)
+            # summaries are not what is measured here, a placeholder stands in for each
+            summaries = {record.answer: "Summary." for record in records if record.long_answer}
+            inputs = (records, paraphrased_dict, summaries)
+            for name, build in [("lists", legacy_build), ("streaming", streaming_build)]:
+                seconds, peak_mb = measure(build, template_dir, work_dir, *inputs)
+                print(f"{n:>8} {name:>10} {seconds:>9.2f} {peak_mb:>9.1f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""Shared helpers for the benchmark scripts. Makes the modules in code/ and the actions in rasa_template/ importable and times calls."""
+
+import os
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+CODE_DIR = os.path.join(REPO_DIR, "code")
+TEMPLATE_DIR = os.path.join(REPO_DIR, "rasa_template")
+
+for path in (TEMPLATE_DIR, CODE_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def timed(func, *args, **kwargs):
+    """Calls func with the given arguments and measures the wall time
+    Returns:
+       (result, seconds): return value of func and the elapsed wall time in seconds
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
@@ -0,0 +1,114 @@
+"""Synthetic input data for the end-to-end benchmarks: Chat.csv, DNA.csv and paraphrased.json in the layout of data/input,
+at any size. paraphrased.json holds what a stand-in for the paraphrasing model generates, so nothing is downloaded."""
+
+import common  # noqa: F401  makes code/ importable
+
+import argparse
+import json
+import os
+import random
+from typing import List
+
+import pandas as pd
+
+from synthetic import synthetic_answers, synthetic_questions
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-n", "--questions", type=int, default=1_000, help="QA pairs in Chat.csv")
+parser.add_argument("--dna", type=int, default=100, help="Questions that should not be answered in DNA.csv")
+parser.add_argument("--paraphrases", type=int, default=6, help="Paraphrases per question, as many as the model returns")
+parser.add_argument("--long-fraction", type=float, default=0.1, help="Share of answers long enough to be summarized")
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("-o", "--output", default="data/input", help="Directory the files are written to")
+
+# rewrites the stand-in model picks from, like the model some of them give the same text for different questions
+REWRITES = [
+    ("How do I", "How can I"),
+    ("How do I", "What is the way to"),
+    ("Where can I", "Where do I"),
+    ("When should I", "When do I need to"),
+    ("Can I", "Am I able to"),
+    ("Why do I need to", "Why must I"),
+    ("What happens if I", "What if I"),
+    ("Who helps me", "Who can help me"),
+    (" my ", " the "),
+    ("?", ""),
+    ("?", " please?"),
+]
+DNA_TOPICS = ["the elections", "the primary", "the senate race", "the governor race", "the referendum"]
+DNA_OPENERS = ["Who will win", "Which party is going to win", "Who should I vote for in", "Who do you think will win"]
+
+
+def stub_paraphrases(question: str, count: int, rng: random.Random):
+    """Stands in for the paraphrasing model: up to count rewrites of the question, with repeats like the model's"""
+    paraphrases: List[str] = []
+    for _ in range(count):
+        text = question
+        for old, new in rng.sample(REWRITES, 3):
+            text = text.replace(old, new, 1)
+        # the model often lowercases or drops the case number
+        if rng.random() < 0.3:
+            text = text.lower()
+        if rng.random() < 0.2:
+            text = text.split(" (case")[0] + "?"
+        paraphrases.append(text)
+    return paraphrases
+
+
+def write_corpus(
+    directory: str,
+    questions: int = 1_000,
+    dna: int = 100,
+    paraphrases: int = 6,
+    long_fraction: float = 0.1,
+    seed: int = 0,
+):
+    """Writes Chat.csv, DNA.csv and paraphrased.json to directory
+    Args:
+       directory: usually data/input of a working copy
+       questions: QA pairs in Chat.csv, with answers, sources and timestamps
+       dna: questions that should not be answered
+       paraphrases: paraphrases per question in paraphrased.json
+       long_fraction: share of answers long enough to be summarized
+       seed: seed of every random choice, the same arguments always write the same files
+    Returns:
+       paths: dictionary with the paths of chat, dna and paraphrased
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    question_list = synthetic_questions(questions, seed=seed)
+    chat = pd.DataFrame(
+        {
+            "Question": question_list,
+            "Answer": synthetic_answers(questions, seed=seed, long_fraction=long_fraction),
+            # like the real data, a few timestamps and sources are missing
+            "Timestamp": [float(1_700_000_000 + 86_400 * rng.randrange(700)) if rng.random() < 0.9 else None for _ in range(questions)],
+            "Source": [f"https://scvotes.gov/page-{rng.randrange(500)}" if rng.random() < 0.8 else None for _ in range(questions)],
+        }
+    )
+    dna_questions = [
+        f"{rng.choice(DNA_OPENERS)} {rng.choice(DNA_TOPICS)} (case {i})?" for i in range(dna)
+    ]
+    paraphrased = {question: stub_paraphrases(question, paraphrases, rng) for question in question_list}
+
+    paths = {
+        "chat": os.path.join(directory, "Chat.csv"),
+        "dna": os.path.join(directory, "DNA.csv"),
+        "paraphrased": os.path.join(directory, "paraphrased.json"),
+    }
+    chat.to_csv(paths["chat"], index=False)
+    pd.DataFrame({"Questions": dna_questions}).to_csv(paths["dna"], index=False)
+    with open(paths["paraphrased"], "w") as f:
+        json.dump(paraphrased, f, indent=4)
+    return paths
+
+
+def main():
+    args = parser.parse_args()
+    paths = write_corpus(args.output, args.questions, args.dna, args.paraphrases, args.long_fraction, args.seed)
+    print(f"Wrote {args.questions} QA pairs, {args.dna} DNA questions and {args.paraphrases} paraphrases each to "
+          f"{', '.join(paths.values())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""End-to-end benchmark of the pipeline on synthetic corpora of the given sizes (see corpus.py), from Chat.csv to the
+running bot, with nothing downloaded. For every size the stages run in order in a scratch copy of the repo:
+   intents: extract_intent on Chat.csv
+   paraphrase: removing duplicates from the stand-in model's paraphrases and saving paraphrased.json
+   summarize: summarizing the long answers into an empty summary cache
+   configure: configure_rasa --clean, with the summaries cached by the previous stage
+   configure_incremental: configure_rasa again, with nothing changed
+   save_conversation: action_save_conversation through rasa_sdk's ActionExecutor in the built Chatbot directory
+   alexa_webhook: the Alexa connector's webhook answering questions, paraphrases and unknown messages, Rasa replaced
+      by the stand-in of bench_alexa_webhook.py
+Each stage runs in a fresh interpreter, which reports its wall time, items per second and peak RSS.
+Results are printed and written as JSON with the commit they were measured on, --compare reads the JSON of an earlier run
+and shows the change of every number. The summarizer needs the punkt and the other nltk data of extract_intent installed,
+save_conversation needs rasa_sdk and alexa_webhook rasa and sanic-testing; a stage that cannot run is reported as an error."""
+
+import common
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime, timezone
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("-n", "--sizes", type=int, nargs="+", default=[1_000, 10_000], help="QA pairs in Chat.csv, one run per size")
+parser.add_argument("--dna", type=float, default=0.1, help="Questions that should not be answered, per QA pair")
+parser.add_argument("--paraphrases", type=int, default=6, help="Paraphrases the stand-in model returns per question")
+parser.add_argument("--stages", nargs="+", help="Stages to run, all by default; later stages need the files of earlier ones")
+parser.add_argument("--conversations", type=int, default=50, help="Conversations logged by save_conversation")
+parser.add_argument("--turns", type=int, default=20, help="User messages per conversation")
+parser.add_argument("--requests", type=int, default=2_000, help="Requests sent to the Alexa webhook")
+parser.add_argument("--rasa-ms", type=float, default=0, help="Time the Rasa stand-in takes to answer the webhook")
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("-o", "--output", default="benchmark_results.json", help="JSON file the results are written to")
+parser.add_argument("--compare", help="JSON file of an earlier run to compare the results with")
+parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change above which a number is flagged")
+parser.add_argument("--keep", action="store_true", help="Keep the scratch directories and print where they are")
+# runs a single stage in the current directory, used by the suite for every stage
+parser.add_argument("--child", help=argparse.SUPPRESS)
+
+
+def count_rows(path):
+    import pandas as pd
+
+    return len(pd.read_csv(path, usecols=[0]))
+
+
+def check_nltk_data():
+    """Raises if nltk data the stages use is missing, extract_intent would otherwise download it"""
+    import nltk
+
+    from extract_intent import NLTK_RESOURCES
+
+    missing = []
+    for resource_path, package in NLTK_RESOURCES:
+        try:
+            nltk.data.find(resource_path)
+        except LookupError:
+            missing.append(package)
+    if missing:
+        raise RuntimeError(f"nltk data {', '.join(missing)} is not installed, run python -m nltk.downloader {' '.join(missing)}")
+
+
+def stage_intents(args):
+    import extract_intent
+
+    check_nltk_data()
+    extract_intent.main(["-f", "Chat.csv"])
+    return count_rows(extract_intent.OUTPUT_FILE), "questions"
+
+
+def stage_paraphrase(args):
+    import pandas as pd
+
+    import paraphraser
+    from dedup import deduplicate_paraphrases
+
+    questions = pd.read_csv(paraphraser.INTENT_FILE)["Question"].tolist()
+    with open(paraphraser.PARAPHRASED_FILE) as f:
+        generated = json.load(f)
+    paraphrased_list = [generated.get(question, []) for question in questions]
+    dna_questions = pd.read_csv("data/input/DNA.csv")["Questions"].tolist()
+    paraphrased_list = deduplicate_paraphrases(questions, paraphrased_list, dna_questions, 0.8)
+    paraphraser.save_paraphrases(questions, paraphrased_list)
+    return sum(len(paraphrases) for paraphrases in generated.values()), "paraphrases"
+
+
+def stage_summarize(args):
+    import pandas as pd
+
+    import configure_rasa
+
+    check_nltk_data()
+    records = configure_rasa.get_qa_records(pd.read_csv(configure_rasa.INTENT_FILE))
+    summaries = configure_rasa.summarize_long_answers(records, cache_path=configure_rasa.SUMMARY_CACHE)
+    return len(summaries), "answers"
+
+
+def stage_configure(args):
+    import configure_rasa
+
+    configure_rasa.main(["--clean"])
+    return count_rows(configure_rasa.INTENT_FILE), "intents"
+
+
+def stage_configure_incremental(args):
+    import configure_rasa
+
+    configure_rasa.main([])
+    return count_rows(configure_rasa.INTENT_FILE), "intents"
+
+
+def stage_save_conversation(args):
+    import asyncio
+    import random
+
+    import pandas as pd
+    from rasa_sdk.executor import ActionExecutor
+
+    from bench_action_server import action_call
+
+    questions = pd.read_csv("../data/input/Chat_intent.csv")["Question"].tolist()
+    rng = random.Random(args.seed)
+
+    async def conversation(executor, sender_id):
+        events = [{"event": "action", "name": "action_session_start", "timestamp": time.time()}]
+        for _ in range(args.turns):
+            events.append({"event": "user", "timestamp": time.time(), "text": rng.choice(questions),
+                           "parse_data": {"intent": {"name": "faq"}, "entities": []}})
+            events.append({"event": "bot", "timestamp": time.time(), "text": "An answer",
+                           "metadata": {"utter_action": "utter_faq"}})
+            await executor.run(action_call("action_save_conversation", sender_id, events))
+
+    async def run():
+        executor = ActionExecutor()
+        executor.register_package("actions")
+        await asyncio.gather(*(conversation(executor, f"user-{i}") for i in range(args.conversations)))
+
+    asyncio.run(run())
+    from actions.actions import conversation_log
+
+    conversation_log.flush()
+    return args.conversations * args.turns, "calls"
+
+
+def stage_alexa_webhook(args):
+    import asyncio
+    import random
+
+    from sanic import Sanic
+
+    import bench_alexa_webhook
+    from alexa_connector import AlexaConnector
+    from bench_alexa_webhook import alexa_request, rasa_stand_in, requests_per_second
+
+    bench_alexa_webhook.RASA_SECONDS = args.rasa_ms / 1000
+    with open("../data/input/paraphrased.json") as f:
+        paraphrased = json.load(f)
+    questions = list(paraphrased)
+    rng = random.Random(args.seed)
+    texts = []
+    for i in range(args.requests):
+        # a third each of questions, paraphrases and messages the bot has never seen
+        question = rng.choice(questions)
+        if i % 3 == 0:
+            texts.append(question)
+        elif i % 3 == 1 and paraphrased[question]:
+            texts.append(rng.choice(paraphrased[question]))
+        else:
+            texts.append(f"Tell me something about {question.lower()} {i}")
+
+    app = Sanic("bench_suite")
+    app.blueprint(AlexaConnector().blueprint(rasa_stand_in), url_prefix="/webhooks/alexa_assistant")
+    rate = asyncio.run(
+        requests_per_second(app, lambda i: alexa_request("IntentRequest", "TextIntent", texts[i]), args.requests)
+    )
+    # requests_per_second times the requests only, the reported time is the time they took
+    return args.requests, "requests", args.requests / rate
+
+
+# stage name: (function, directory it runs in relative to the scratch copy)
+STAGES = {
+    "intents": (stage_intents, "."),
+    "paraphrase": (stage_paraphrase, "."),
+    "summarize": (stage_summarize, "."),
+    "configure": (stage_configure, "."),
+    "configure_incremental": (stage_configure_incremental, "."),
+    "save_conversation": (stage_save_conversation, "Chatbot"),
+    "alexa_webhook": (stage_alexa_webhook, "Chatbot"),
+}
+
+
+def run_child(args):
+    """Runs one stage in the current directory and prints its measurements as a line of JSON"""
+    function, _ = STAGES[args.child]
+    try:
+        start = time.perf_counter()
+        result = function(args)
+        seconds = time.perf_counter() - start
+        items, unit = result[:2]
+        if len(result) > 2:
+            seconds = result[2]
+        measurement = {
+            "seconds": seconds,
+            "items": items,
+            "unit": unit,
+            "throughput": items / seconds if seconds > 0 else None,
+            # ru_maxrss is in KiB on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+    except Exception as e:
+        traceback.print_exc()
+        measurement = {"error": f"{type(e).__name__}: {e}"}
+    print(json.dumps(measurement))
+
+
+def run_stage(stage, directory, args):
+    """Runs a stage in a fresh interpreter and returns its measurements"""
+    _, relative_dir = STAGES[stage]
+    argv = [
+        sys.executable, os.path.abspath(__file__), "--child", stage,
+        "--conversations", str(args.conversations), "--turns", str(args.turns),
+        "--requests", str(args.requests), "--rasa-ms", str(args.rasa_ms), "--seed", str(args.seed),
+    ]
+    cwd = os.path.join(directory, relative_dir)
+    if not os.path.isdir(cwd):
+        return {"error": f"{relative_dir} does not exist, the stage that builds it failed or did not run"}
+    try:
+        process = subprocess.run(argv, cwd=cwd, capture_output=True, text=True)
+    except OSError as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    lines = process.stdout.strip().splitlines()
+    try:
+        return json.loads(lines[-1])
+    except (IndexError, json.JSONDecodeError):
+        stderr = process.stderr.strip().splitlines()
+        return {"error": stderr[-1] if stderr else f"exit code {process.returncode}"}
+
+
+def run_size(size, stages, args, results):
+    """Generates a corpus of size QA pairs in a scratch directory, runs the stages on it and appends their results"""
+    from corpus import write_corpus
+
+    directory = tempfile.mkdtemp(prefix=f"bench_suite_{size}_")
+    try:
+        shutil.copytree(common.TEMPLATE_DIR, os.path.join(directory, "rasa_template"),
+                        ignore=shutil.ignore_patterns("__pycache__", ".rasa", "models"))
+        write_corpus(os.path.join(directory, "data", "input"), size, max(1, round(size * args.dna)),
+                     args.paraphrases, seed=args.seed)
+        for stage in stages:
+            measurement = run_stage(stage, directory, args)
+            results.append({"size": size, "stage": stage, **measurement})
+            print_result(results[-1])
+    finally:
+        if args.keep:
+            print(f"scratch directory of {size} QA pairs: {directory}")
+        else:
+            shutil.rmtree(directory)
+
+
+def print_result(result, previous=None, tolerance=0.1):
+    if "error" in result:
+        print(f"{result['size']:>8} {result['stage']:>22}  error: {result['error']}")
+        return
+    line = (f"{result['size']:>8} {result['stage']:>22} {result['seconds']:>9.3f} "
+            f"{result['throughput']:>12.1f} {result['unit']:<12} {result['peak_rss_mb']:>9.1f}")
+    if previous is not None and "error" not in previous:
+        changes = []
+        for key, name in (("seconds", "time"), ("peak_rss_mb", "rss")):
+            change = result[key] / previous[key] - 1 if previous[key] else 0
+            flag = " !" if change > tolerance else ""
+            changes.append(f"{name} {change:+.0%}{flag}")
+        line += "  " + ", ".join(changes)
+    print(line)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=common.REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    args = parser.parse_args()
+    if args.child:
+        run_child(args)
+        return
+
+    stages = args.stages or list(STAGES)
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages {unknown}, choose from {list(STAGES)}")
+
+    print(f"{'size':>8} {'stage':>22} {'seconds':>9} {'per second':>12} {'':<12} {'peak MiB':>9}")
+    results = []
+    report = {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "arguments": {key: value for key, value in vars(args).items() if key not in ("child", "output", "compare", "keep")},
+        "results": results,
+    }
+    try:
+        for size in args.sizes:
+            run_size(size, stages, args, results)
+    finally:
+        # the results measured so far are written even if the suite stops early
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            earlier = json.load(f)
+        previous = {(result["size"], result["stage"]): result for result in earlier["results"]}
+        print(f"\ncompared with {args.compare} (commit {earlier.get('commit')}), ! marks changes above {args.tolerance:.0%}")
+        for result in results:
+            print_result(result, previous.get((result["size"], result["stage"])), args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
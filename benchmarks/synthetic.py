@@ -0,0 +1,101 @@
+"""Generators for synthetic QA data used by the benchmarks"""
+
+import random
+from typing import List
+
+OPENERS = [
+    "How do I",
+    "Where can I",
+    "When should I",
+    "Can I",
+    "Why do I need to",
+    "What happens if I",
+    "Who helps me",
+]
+VERBS = [
+    "register",
+    "vote",
+    "apply",
+    "update",
+    "return",
+    "request",
+    "check",
+    "change",
+    "find",
+    "submit",
+]
+NOUNS = [
+    "ballot",
+    "registration",
+    "polling place",
+    "absentee ballot",
+    "photo ID",
+    "address",
+    "election office",
+    "deadline",
+    "party affiliation",
+    "provisional ballot",
+    "voter card",
+    "precinct",
+]
+QUALIFIERS = [
+    "before the election",
+    "by mail",
+    "in person",
+    "after moving",
+    "on election day",
+    "as a student",
+    "from overseas",
+    "in my county",
+]
+
+
+def synthetic_questions(n: int, seed: int = 0):
+    """Generates questions drawn from a small vocabulary, so that many of them share keywords
+    Args:
+       n: number of questions to generate
+       seed: seed for the random generator, the same seed always gives the same questions
+    Returns:
+       questions: list of n question strings, all distinct
+    """
+    rng = random.Random(seed)
+    questions: List[str] = []
+    for i in range(n):
+        question = "{} {} my {} {}".format(
+            rng.choice(OPENERS),
+            rng.choice(VERBS),
+            rng.choice(NOUNS),
+            rng.choice(QUALIFIERS),
+        )
+        # numbered suffix keeps questions distinct while leading keywords keep colliding
+        questions.append(f"{question} (case {i})?")
+    return questions
+
+
+SENTENCES = [
+    "Contact your county election office for details.",
+    "You can check your status online at https://vote.example.gov/status.",
+    "Bring a valid photo ID to your polling place.",
+    "Absentee ballots must be returned by 7 p.m. on election day.",
+    "Registration closes 30 days before the election.",
+    "Students may register at their campus address.",
+    "Provisional ballots are counted once eligibility is confirmed.",
+    "Polling places are open from 7 a.m. to 7 p.m.",
+]
+
+
+def synthetic_answers(n: int, seed: int = 0, long_fraction: float = 0.1):
+    """Generates answers of one or two sentences, a share of them long enough to be summarized
+    Args:
+       n: number of answers to generate
+       seed: seed for the random generator
+       long_fraction: share of answers made of six sentences instead
+    Returns:
+       answers: list of n answer strings
+    """
+    rng = random.Random(seed)
+    answers: List[str] = []
+    for _ in range(n):
+        num_sentences = 6 if rng.random() < long_fraction else rng.randint(1, 2)
+        answers.append(" ".join(rng.choice(SENTENCES) for _ in range(num_sentences)))
+    return answers
@@ -0,0 +1,117 @@
+"""Bookkeeping for incremental chatbot builds: content hashes of the template and the generated files, stored in a manifest"""
+
+import hashlib
+import json
+import os
+import shutil
+from typing import Any, Dict, Iterable, List, Union
+
+MANIFEST_FILE = ".build_manifest.json"
+# characters of generated text encoded and written at once
+WRITE_BLOCK_SIZE = 1 << 16
+
+
+def text_hash(text: str):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_hash(path: str):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(build_dir: str):
+    """Returns the manifest of the previous build, or None if the directory was not built incrementally"""
+    path = os.path.join(build_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(build_dir: str, manifest: Dict[str, Any]):
+    with open(os.path.join(build_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, sort_keys=True)
+
+
+def hash_template(template_dir: str):
+    """Returns a dictionary mapping the relative path of every template file to its content hash"""
+    hashes = {}
+    for root, _, files in os.walk(template_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            relative_path = os.path.relpath(path, template_dir).replace(os.sep, "/")
+            hashes[relative_path] = file_hash(path)
+    return hashes
+
+
+def sync_template(
+    template_dir: str,
+    build_dir: str,
+    template_hashes: Dict[str, str],
+    previous_hashes: Dict[str, str],
+):
+    """Copies template files that are new or changed since the previous build, and removes files dropped from the template.
+    Files changed by the running bot, such as the conversation log, are left alone while their template is unchanged.
+    Returns:
+       changed: relative paths of the template files that were added, changed or removed
+    """
+    changed: List[str] = []
+    for relative_path, digest in template_hashes.items():
+        target = os.path.join(build_dir, relative_path)
+        if previous_hashes.get(relative_path) == digest and os.path.exists(target):
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copy2(os.path.join(template_dir, relative_path), target)
+        changed.append(relative_path)
+
+    for relative_path in previous_hashes.keys() - template_hashes.keys():
+        target = os.path.join(build_dir, relative_path)
+        if os.path.exists(target):
+            os.remove(target)
+        changed.append(relative_path)
+    return changed
+
+
+def write_stream_if_changed(path: str, chunks: Iterable[Union[str, bytes]]):
+    """Streams chunks of text into a temporary file while hashing them, and replaces the file at path
+    only if its content differs, so an unchanged file keeps its modification time
+    Args:
+       path: file to write
+       chunks: pieces of the content in order, they are never joined in memory. Text is written as utf-8,
+          chunks of a binary file are bytes
+    Returns:
+       (written, digest): True if the file was replaced, and the sha256 hex digest of the content
+    """
+    digest = hashlib.sha256()
+    temp_path = path + ".tmp"
+
+    def flush(buffer):
+        if buffer and isinstance(buffer[0], bytes):
+            data = b"".join(buffer)
+        else:
+            data = "".join(buffer).encode("utf-8")
+        digest.update(data)
+        f.write(data)
+        buffer.clear()
+
+    with open(temp_path, "wb") as f:
+        # small chunks are gathered into blocks of about WRITE_BLOCK_SIZE characters
+        buffer: List[Union[str, bytes]] = []
+        buffered = 0
+        for chunk in chunks:
+            buffer.append(chunk)
+            buffered += len(chunk)
+            if buffered >= WRITE_BLOCK_SIZE:
+                flush(buffer)
+                buffered = 0
+        flush(buffer)
+
+    if os.path.exists(path) and file_hash(path) == digest.hexdigest():
+        os.remove(temp_path)
+        return False, digest.hexdigest()
+    os.replace(temp_path, path)
+    return True, digest.hexdigest()
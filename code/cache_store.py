@@ -0,0 +1,86 @@
+"""Persistent key/value cache in a SQLite file, shared by the pipeline stages that want to skip repeated work"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterable
+
+# SQLite limits the number of bound parameters per statement
+BATCH_SIZE = 500
+
+
+def content_key(*parts: Any):
+    """Hashes the given JSON serializable parts into a cache key
+    Args:
+       parts: everything that influences the cached value, e.g. the input text and the model parameters
+    Returns:
+       key: hex digest identifying the content
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CacheStore:
+    """Maps content keys to JSON values, stored in a table of a SQLite database"""
+
+    def __init__(self, path: str, table: str):
+        """
+        Args:
+           path: path of the SQLite file, created with its parent directories if missing
+           table: name of the table holding this cache, several caches can share one file
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.table = table
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self.connection.commit()
+
+    def get_many(self, keys: Iterable[str]):
+        """Looks up several keys at once
+        Returns:
+           found: dictionary with the cached value of every key that is present
+        """
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, Any] = {}
+        for start in range(0, len(keys), BATCH_SIZE):
+            batch = keys[start : start + BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.connection.execute(
+                f"SELECT key, value FROM {self.table} WHERE key IN ({placeholders})",
+                batch,
+            )
+            found.update((key, json.loads(value)) for key, value in rows)
+        return found
+
+    def put_many(self, items: Dict[str, Any]):
+        """Stores several values and commits them, so they survive an interrupted run"""
+        self.connection.executemany(
+            f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)",
+            ((key, json.dumps(value, ensure_ascii=False)) for key, value in items.items()),
+        )
+        self.connection.commit()
+
+    def retain(self, keys: Iterable[str]):
+        """Evicts every entry whose key is not in keys
+        Returns:
+           evicted: number of removed entries
+        """
+        self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS retained (key TEXT PRIMARY KEY)")
+        self.connection.execute("DELETE FROM retained")
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO retained (key) VALUES (?)", ((key,) for key in keys)
+        )
+        evicted = self.connection.execute(
+            f"DELETE FROM {self.table} WHERE key NOT IN (SELECT key FROM retained)"
+        ).rowcount
+        self.connection.commit()
+        return evicted
+
+    def close(self):
+        self.connection.close()
@@ -1,16 +1,97 @@
+import numpy as np
 import pandas as pd
 import os
 import shutil
+import sys
 import json
-import textwrap
+import argparse
+import multiprocessing
 import regex as re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from sumy.parsers.plaintext import PlaintextParser
 from sumy.summarizers.luhn import LuhnSummarizer
 from sumy.summarizers.lsa import LsaSummarizer
 from sumy.nlp.tokenizers import Tokenizer
-from typing import List
+from typing import Dict, List, NamedTuple, Optional
 from datetime import datetime
 
+from build_manifest import (
+    file_hash,
+    hash_template,
+    load_manifest,
+    save_manifest,
+    sync_template,
+    text_hash,
+    write_stream_if_changed,
+)
+from cache_store import CacheStore, content_key
+from yaml_emitter import (
+    iter_appended,
+    iter_template_with_inserts,
+    literal_block,
+    scalar,
+    single_line,
+)
+
+# modules of the template that the running chatbot shares with this script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rasa_template"))
+from faq_index import FAQ_INDEX_FILE, build_faq_index, iter_faq_index_json  # noqa: E402
+from actions.dna_screen import DNA_SCREEN_FILE, build_dna_screen, iter_dna_screen_json  # noqa: E402
+from actions.knowledge_base import (  # noqa: E402
+    KNOWLEDGE_BASE_FILE,
+    Entry,
+    get_response_text,
+    iter_knowledge_base_bytes,
+)
+from actions.retrieval_index import (  # noqa: E402
+    RETRIEVAL_INDEX_FILE,
+    build_retrieval_index,
+    iter_retrieval_index_npz,
+)
+
+INTENT_FILE = "data/input/Chat_intent.csv"
+DNA_FILE = "data/input/DNA.csv"
+PARAPHRASED_FILE = "data/input/paraphrased.json"
+SUMMARY_CACHE = "data/cache/summaries.sqlite"
+TEMPLATE_DIR = "rasa_template"
+CHATBOT_DIR = "Chatbot"
+
+parser = argparse.ArgumentParser(
+    description="""Creates the Chatbot directory for RASA Open Source from Chat_intent.csv, DNA.csv and paraphrased.json"""
+)
+parser.add_argument(
+    "-w",
+    "--workers",
+    type=int,
+    default=1,
+    help="Number of processes summarizing long answers",
+)
+parser.add_argument(
+    "--summary-cache",
+    default=SUMMARY_CACHE,
+    help="SQLite file caching answer summaries between runs",
+)
+parser.add_argument(
+    "--no-cache",
+    action="store_true",
+    help="Summarize every long answer again without reading or writing the cache",
+)
+parser.add_argument(
+    "--clean",
+    action="store_true",
+    help="Delete the existing Chatbot directory and build it from scratch instead of updating only what changed",
+)
+
+# answers with at least this many characters, not counting URLs, are summarized
+SUMMARY_THRESHOLD = 140
+
+# Regular expression pattern to match URLs, compiled once for every answer
+# it matches the same text as the former alternation
+# (?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+ since every branch is a single
+# allowed character (% is inside $-_), but a single character class avoids backtracking through the branches
+URL_PATTERN = re.compile(r"http[s]?://[a-zA-Z0-9$-_@.&+!*\\(),]+")
+
 
 def get_plain_text_length(answer: str):
     """Calculates the length of the text in characters after removing all links that may appear in the text
@@ -20,26 +101,37 @@ def get_plain_text_length(answer: str):
     Returns:
        answer_len: length of the answer with any URLs removed
     """
-    # Regular expression pattern to match URLs
-    url_pattern = r"http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"
-
     # Remove all URLs from the text
-    text_without_links = re.sub(url_pattern, "", answer)
+    text_without_links = URL_PATTERN.sub("", answer)
 
     # Calculate the length of the text without URLs
     answer_len = len(text_without_links)
     return answer_len
 
 
-def summarize(answer: str, length: int = 3):
-    """Summarizes a given answer to a user query to 3 sentences
+def get_plain_text_lengths(answers: pd.Series):
+    """Batch version of get_plain_text_length for a whole column of answers
     Args:
-       answer: an answer to a given user query
-       length: desired maximum length of the summary, defaults to 3 sentences
+       answers: series of answers to user queries
     Returns:
-       summary_text: summary of an answer with specified number of sentences, including a disclaimer
+       lengths: numpy array with the length of each answer with any URLs removed
     """
+    answer_list = answers.tolist()
+    lengths = np.fromiter(map(len, answer_list), dtype=np.int64, count=len(answer_list))
 
+    # every URL contains ://, answers without it are never scanned by the pattern
+    for row, answer in enumerate(answer_list):
+        if "://" in answer:
+            lengths[row] -= sum(map(len, URL_PATTERN.findall(answer)))
+    return lengths
+
+
+@lru_cache(maxsize=None)
+def get_summarizer():
+    """Creates the summarizer and tokenizer once per process, they are reused for every answer
+    Returns:
+       (summarizer, tokenizer): Latent Semantic Analysis summarizer and english sentence tokenizer
+    """
     # Initialize a Latent Semantic Analysis summarizer
     # alternatively could use a LuhnSummarizer()
     summarizer = LsaSummarizer()
@@ -49,9 +141,22 @@ def summarize(answer: str, length: int = 3):
     # instead of filtering out any
     summarizer.stop_words = [" "]
 
+    return summarizer, Tokenizer("english")
+
+
+def summarize(answer: str, length: int = 3):
+    """Summarizes a given answer to a user query to 3 sentences
+    Args:
+       answer: an answer to a given user query
+       length: desired maximum length of the summary, defaults to 3 sentences
+    Returns:
+       summary_text: summary of an answer with specified number of sentences, including a disclaimer
+    """
+    summarizer, tokenizer = get_summarizer()
+
     # Creates a parser object using an english tokenizer
     # and summarizes it to 3 sentences
-    parser = PlaintextParser.from_string(answer, Tokenizer("english"))
+    parser = PlaintextParser.from_string(answer, tokenizer)
     summary = summarizer(parser.document, length)
 
     # joins sentences with newlines and returns
@@ -62,6 +167,52 @@ def summarize(answer: str, length: int = 3):
     )
 
 
+def summarize_answers(
+    answers: List[str],
+    length: int = 3,
+    workers: int = 1,
+    cache: Optional[CacheStore] = None,
+):
+    """Summarizes many answers at once, skipping answers whose summary is cached
+    Args:
+       answers: answers to user queries that are long enough to be summarized
+       length: desired maximum length of each summary in sentences
+       workers: number of processes summarizing answers that are not cached
+       cache: store holding the summaries of previous runs, None to summarize everything
+    Returns:
+       summaries: dictionary mapping each answer to its summary
+    """
+    answers = list(dict.fromkeys(answers))
+    keys = {answer: content_key(answer, length) for answer in answers}
+
+    cached = cache.get_many(keys.values()) if cache is not None else {}
+    summaries: Dict[str, str] = {
+        answer: cached[key] for answer, key in keys.items() if key in cached
+    }
+    missing = [answer for answer in answers if answer not in summaries]
+
+    if workers > 1 and len(missing) > 1:
+        # every worker builds its summarizer once and summarizes a chunk of answers
+        # spawn instead of fork, the pipeline summarizes while torch threads paraphrase
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            chunksize = max(1, len(missing) // (workers * 4))
+            generated = list(
+                pool.map(summarize, missing, [length] * len(missing), chunksize=chunksize)
+            )
+    else:
+        generated = [summarize(answer, length) for answer in missing]
+    summaries.update(zip(missing, generated))
+
+    if cache is not None:
+        cache.put_many({keys[answer]: summary for answer, summary in zip(missing, generated)})
+        print(
+            f"Summary cache: {len(answers) - len(missing)}/{len(answers)} hits, summarized {len(missing)}"
+        )
+    return summaries
+
+
 def get_nlu_yaml_string(intent: str, questions: List[str]):
     """Packages intent with question and its paraphrased equivalents in yaml block
     Args:
@@ -70,11 +221,9 @@ def get_nlu_yaml_string(intent: str, questions: List[str]):
     Returns:
        yaml_str: formatted yaml string with intent and paraphrased questions
     """
-    yaml_str = f"\n- intent: {intent}\n  examples: |"
-
-    for question in questions:
-        yaml_str += f"\n    - {question}"
-    return yaml_str
+    # each example is one line of the block, so line breaks inside a question are replaced
+    examples = "".join(f"\n    - {single_line(question)}" for question in questions)
+    return f"\n- intent: {scalar(intent)}\n  examples: |{examples}"
 
 
 def get_rules_yaml_string(intent: str):
@@ -84,7 +233,7 @@ def get_rules_yaml_string(intent: str):
     Returns:
        yaml_str: formatted rules yaml string with intent and corresponding utter action
     """
-    yaml_str = f"\n- rule: Answer {intent}\n  steps:\n  - intent: {intent}\n  - action: utter_{intent}\n    "
+    yaml_str = f"\n- rule: {scalar('Answer ' + intent)}\n  steps:\n  - intent: {scalar(intent)}\n  - action: {scalar('utter_' + intent)}\n    "
     return yaml_str
 
 
@@ -96,7 +245,7 @@ def get_stories_yaml_string(intent: str):
     Returns:
        yaml_str: formatted stories yaml string with intent and corresponding utter action
     """
-    yaml_str = f"\n- story: {intent} path\n  steps:\n  - intent: {intent}\n  - action: utter_summary_{intent}\n  - intent: full_answer\n  - action: utter_{intent}\n    "
+    yaml_str = f"\n- story: {scalar(intent + ' path')}\n  steps:\n  - intent: {scalar(intent)}\n  - action: {scalar('utter_summary_' + intent)}\n  - intent: full_answer\n  - action: {scalar('utter_' + intent)}\n    "
     return yaml_str
 
 
@@ -104,13 +253,11 @@ def get_domain_yaml_string(intent: str, answer: str):
     """Packages intent and a corresponding answer in yaml block for domain.yaml
     Args:
        intent: string representing the user's intent in query
-       answer: string represent answer to user's query
+       answer: string represent answer to user's query, quotes and other special characters are kept
     Returns:
        yaml_str: formatted domain yaml string with intent and corresponding answer
     """
-    yaml_str = (
-        f"\n  utter_{intent}:\n  - text: |\n{textwrap.indent(answer, '      ')}\n    "
-    )
+    yaml_str = f"\n  {scalar('utter_' + intent)}:\n  - text: {literal_block(answer, '      ')}\n    "
     return yaml_str
 
 
@@ -121,33 +268,27 @@ def get_intent_yaml_string(intent: str):
     Returns:
        yaml_str: formatted yaml string with intent
     """
-    domain_data = f"\n  - {intent}"
+    domain_data = f"\n  - {scalar(intent)}"
     return domain_data
 
 
-def write_list_to_file(yaml_list: List[str], yaml_file: str):
-    with open(yaml_file, "a", encoding="utf-8") as f:
-        f.write("\n")
-        for item in yaml_list:
-            f.write(item)
-
-
-def main():
-    # Removes exisiting chatbot by default
-    if os.path.exists("Chatbot"):
-        shutil.rmtree("Chatbot", ignore_errors=True, onerror=None)
-
-    # copy template to new chatbot directory
-    shutil.copytree("rasa_template", "Chatbot")
-
-    # questions, answers, sources, dates, etc.
-    QA_df = pd.read_csv("data/input/Chat_intent.csv")
-    # do not answer questions
-    DNA_questions = pd.read_csv("data/input/DNA.csv")
-    # paraphrased equivalents for each question
-    paraphrased_dict = json.load(open("data/input/paraphrased.json", "r"))
-
-    full_answer_nlu_string = """
+# files of the template that receive generated yaml, relative to the chatbot directory
+NLU_FILE = "data/nlu.yml"
+RULES_FILE = "data/rules.yml"
+STORIES_FILE = "data/stories.yml"
+DOMAIN_FILE = "domain.yml"
+GENERATED_FILES = [
+    NLU_FILE,
+    RULES_FILE,
+    STORIES_FILE,
+    DOMAIN_FILE,
+    FAQ_INDEX_FILE,
+    RETRIEVAL_INDEX_FILE,
+    DNA_SCREEN_FILE,
+    KNOWLEDGE_BASE_FILE,
+]
+
+FULL_ANSWER_NLU_STRING = """
 - intent: full_answer
   examples: |
     - Tell me the full answer.
@@ -172,137 +313,392 @@ def main():
     - Can you explain the full answer to me?
     """
 
+
+class QARecord(NamedTuple):
+    """Fields of a QA pair used by the yaml files, computed once for all pairs by get_qa_records"""
+
+    intent: str
+    question: str
+    answer: str
+    # where the answer comes from, "" if the Source is missing
+    source: str
+    # month and year of the answer such as "September 2024", "" if it has no valid timestamp
+    date: str
+    # answers this long are summarized, and the full answer is given on request
+    long_answer: bool
+
+
+def format_date(timestamp):
+    """Formats a unix timestamp as month and year in local time, returns "" for missing or invalid timestamps"""
+    try:
+        return datetime.fromtimestamp(timestamp).strftime("%B %Y")
+    except (TypeError, ValueError, OverflowError, OSError):
+        return ""
+
+
+def get_qa_records(QA_df: pd.DataFrame):
+    """Turns the QA dataframe into typed records, computing every derived field column by column
+    Args:
+       QA_df: questions, answers, sources, dates and intents
+    Returns:
+       records: one QARecord per row, in the order of QA_df
     """
-      nlu_list: will contains strings that package multiple questions under the same intent
-      rules_list: will contain strings that map an intent to a corresponding action from chatbot (e.g. intent: ask_for_time, action: provide_time)
-      domain_list: will contain strings that map a RASA action to a corresponding answer
-      intent_list: will contain intent strings in yaml format
-      stories_list: will contain strings that package user intents, answer summaries, full answer intents, and full answers to provide users opportunity to ask for larger answer
-    """
-    full_answer_intent_string = get_intent_yaml_string("full_answer")
+    num_rows = len(QA_df)
+    answers = QA_df["Answer"]
+
+    # length of each answer without its URLs decides whether it is summarized
+    url_free_lengths = get_plain_text_lengths(answers)
+    long_answers = (url_free_lengths >= SUMMARY_THRESHOLD).tolist()
+
+    if "Timestamp" in QA_df.columns:
+        # every distinct timestamp is formatted once, missing ones get code -1 which selects ""
+        codes, uniques = pd.factorize(QA_df["Timestamp"])
+        formatted = np.array([format_date(timestamp) for timestamp in uniques] + [""], dtype=object)
+        dates = formatted[codes].tolist()
+    else:
+        dates = [""] * num_rows
+
+    # missing sources are left empty rather than shown as nan
+    sources = np.full(num_rows, "", dtype=object)
+    if "Source" in QA_df.columns:
+        given = QA_df["Source"].notna().to_numpy()
+        sources[given] = QA_df["Source"][given].map(str).to_numpy()
+    sources = sources.tolist()
+
+    return [
+        QARecord(*fields)
+        for fields in zip(
+            QA_df["Intent"].tolist(),
+            QA_df["Question"].tolist(),
+            answers.tolist(),
+            sources,
+            dates,
+            long_answers,
+        )
+    ]
 
-    dna_nlu_string = get_nlu_yaml_string("Do not answer", DNA_questions["Questions"])
-    dna_rule_string = get_rules_yaml_string("Do not answer")
-    dna_intent_string = get_intent_yaml_string("Do not answer")
-    dna_domain_string = get_domain_yaml_string(
-        "Do not answer", "Sorry, I am designed not to answer such a question."
-    )
 
-    # include intents for asking for the full answer as well as intents for questions that should not be answered
-    nlu_list = [full_answer_nlu_string, dna_nlu_string]
-    intent_list = [full_answer_intent_string, dna_intent_string]
+def summarize_long_answers(
+    records: List[QARecord], workers: int = 1, cache_path: Optional[str] = SUMMARY_CACHE
+):
+    """Summarizes the answers of all records that are long enough, see summarize_answers
+    Args:
+       records: QA pairs returned by get_qa_records
+       workers: number of processes summarizing answers that are not cached
+       cache_path: SQLite file caching summaries between runs, None to summarize everything
+    Returns:
+       summaries: dictionary mapping each long answer to its summary
+    """
+    summary_cache = CacheStore(cache_path, "summaries") if cache_path else None
+    try:
+        return summarize_answers(
+            [record.answer for record in records if record.long_answer],
+            workers=workers,
+            cache=summary_cache,
+        )
+    finally:
+        if summary_cache is not None:
+            summary_cache.close()
 
-    # include a rule for dna which maps a user dna intent to corresponding action
-    # also map that action to a dna answer in domain
-    # rules(stories) and domain strings for dna full answers are handled for each question individually
-    domain_list = [dna_domain_string]
-    rules_list = [dna_rule_string]
-
-    stories_list = []
-
-    # iterate over all QA pairs in the dataframe
-    # and populate the lists with corresponding yaml strings
-    for i in range(len(QA_df)):
-        # replace all double quotes with single quotes
-        QA_df.loc[i, "Answer"] = QA_df.loc[i, "Answer"].replace('"', "'")
-
-        intent = QA_df["Intent"][i]
-        question = QA_df["Question"][i]
-        answer = QA_df["Answer"][i]
-
-        try:
-            timestamp = QA_df["Timestamp"][i]
-            # convert date to format
-            date = datetime.fromtimestamp(timestamp).strftime("%B %Y")
-        except:
-            date = ""
-
-        if "Source" in QA_df.columns:
-            source = QA_df["Source"][i]
-        else:
-            source = ""
 
-        # year = QA_df["Year"][i]
+# Each file is generated from the QA pairs in a single pass, one yaml block at a time:
+#   nlu: strings that package multiple questions under the same intent
+#   rules: strings that map an intent to a corresponding action from chatbot (e.g. intent: ask_for_time, action: provide_time)
+#   stories: strings that package user intents, answer summaries, full answer intents, and full answers to provide users
+#     opportunity to ask for larger answer
+#   domain responses: strings that map a RASA action to a corresponding answer
+#   domain intents: intent strings in yaml format
 
-        # get parphrases and calculate answer length
-        paraphrased_questions = paraphrased_dict[question]
-        plain_text_length = get_plain_text_length(answer)
 
+def iter_nlu_yaml(records: List[QARecord], dna_questions: List[str], paraphrased_dict: Dict[str, List[str]]):
+    # include intents for asking for the full answer as well as intents for questions that should not be answered
+    yield FULL_ANSWER_NLU_STRING
+    yield get_nlu_yaml_string("Do not answer", dna_questions)
+
+    for record in records:
         # combines question with its paraphrases under same intent
-        nlu_string = get_nlu_yaml_string(intent, [question] + paraphrased_questions)
-        nlu_list.append(nlu_string)
+        yield get_nlu_yaml_string(
+            record.intent, [record.question] + paraphrased_dict[record.question]
+        )
 
-        if plain_text_length < 140:
-            # Short enough to not summarize
 
+def iter_rules_yaml(records: List[QARecord]):
+    # include a rule for dna which maps a user dna intent to corresponding action
+    # rules(stories) for dna full answers are handled for each question individually
+    yield get_rules_yaml_string("Do not answer")
+
+    for record in records:
+        if not record.long_answer:
+            # Short enough to not summarize
             # maps user intent to corresponding chatbot action
             # each intent's corresponding action is named f'utter_{intent}'
             # this action will be linked to the answer string in domain.yml
-            rule_string = get_rules_yaml_string(intent)
-            rules_list.append(rule_string)
+            yield get_rules_yaml_string(record.intent)
 
-            domain_string = get_domain_yaml_string(
-                intent, f"[Source: {source}; Date: {date}] {answer}"
-            )
-            domain_list.append(domain_string)
-            # if year == 2024:
-            #     domain_list.append(get_domain_yaml_string(intent, f"[Source: {source}; Date: Sept, 2024] {answer}"))
-            # elif year == 2022:
-            #     domain_list.append(get_domain_yaml_string(intent, f"[Source: {source}; Date: Apr, 2022] {answer}"))
-        else:
+
+def iter_stories_yaml(records: List[QARecord]):
+    for record in records:
+        if record.long_answer:
             # length >= 140, so we do summarize our answer
             # instead of adding the answer to rules, we add it to stories
             # providing the user the option of asking for the fuller answer
-            story_string = get_stories_yaml_string(intent)
-            stories_list.append(story_string)
+            yield get_stories_yaml_string(record.intent)
 
+
+# reply of the bot to questions that should not be answered
+DNA_RESPONSE = "Sorry, I am designed not to answer such a question."
+
+
+def iter_domain_responses(records: List[QARecord], summaries: Dict[str, str]):
+    # map the dna action to a dna answer in domain
+    yield get_domain_yaml_string("Do not answer", DNA_RESPONSE)
+
+    for intent, _, answer, source, date, long_answer in records:
+        if long_answer:
             # maps the providing summary RASA action to answer's summary
-            answer_summary = summarize(answer)
-            domain_string_summary = get_domain_yaml_string(
-                f"summary_{intent}", answer_summary
+            yield get_domain_yaml_string(f"summary_{intent}", summaries[answer])
+
+        # maps the providing answer RASA action to answer
+        yield get_domain_yaml_string(intent, get_response_text(source, date, answer))
+        # if year == 2024:
+        #     yield get_domain_yaml_string(intent, f"[Source: {source}; Date: Sept, 2024] {answer}")
+        # elif year == 2022:
+        #     yield get_domain_yaml_string(intent, f"[Source: {source}; Date: Apr, 2022] {answer}")
+
+
+def get_faq_index(records: List[QARecord], dna_questions: List[str], paraphrased_dict: Dict[str, List[str]]):
+    """Builds the index the Alexa connector answers known questions from without running Rasa.
+    Only intents answered by a rule are included, a long answer starts a story whose follow up needs Rasa's tracker
+    """
+    entries = (
+        (
+            record.intent,
+            get_response_text(record.source, record.date, record.answer),
+            [record.question] + paraphrased_dict[record.question],
+        )
+        for record in records
+        if not record.long_answer
+    )
+    return build_faq_index(entries, excluded=dna_questions)
+
+
+def get_retrieval_index(records: List[QARecord], dna_questions: List[str], paraphrased_dict: Dict[str, List[str]]):
+    """Builds the index action_retrieval_fallback answers low confidence messages from.
+    Every intent is included, the action replies with its utter_ response, and messages closest to a
+    question that should not be answered get the response of "Do not answer"
+    """
+    entries = [("Do not answer", dna_questions)] + [
+        (record.intent, [record.question] + paraphrased_dict[record.question]) for record in records
+    ]
+    return build_retrieval_index(entries)
+
+
+def iter_knowledge_base_entries(records: List[QARecord], summaries: Dict[str, str]):
+    """Yields the answer, summary and provenance of every intent for the knowledge base"""
+    for intent, _, answer, source, date, long_answer in records:
+        yield Entry(intent, answer, summaries[answer] if long_answer else "", source, date)
+
+
+def iter_domain_intents(records: List[QARecord]):
+    yield get_intent_yaml_string("full_answer")
+    yield get_intent_yaml_string("Do not answer")
+
+    for record in records:
+        # store user intent
+        yield get_intent_yaml_string(record.intent)
+
+
+def read_template_file(template_dir: str, relative_path: str):
+    with open(os.path.join(template_dir, relative_path), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def iter_output_files(
+    template_dir: str,
+    outputs: List[str],
+    records: List[QARecord],
+    dna_questions: List[str],
+    paraphrased_dict: Dict[str, List[str]],
+    summaries: Optional[Dict[str, str]],
+):
+    """Streams the content of the requested generated files
+    Args:
+       template_dir: directory holding the rasa template
+       outputs: paths of the generated files, relative to the chatbot directory
+       records: QA pairs returned by get_qa_records
+       dna_questions: questions that should not be answered
+       paraphrased_dict: paraphrased equivalents for each question
+       summaries: summary of every long answer, only needed for domain.yml and the knowledge base
+    Yields:
+       (relative_path, chunks): path of a generated file and a generator of its content
+    """
+    for relative_path in outputs:
+        if relative_path == FAQ_INDEX_FILE:
+            # not part of the template
+            yield relative_path, iter_faq_index_json(get_faq_index(records, dna_questions, paraphrased_dict))
+            continue
+        if relative_path == DNA_SCREEN_FILE:
+            yield relative_path, iter_dna_screen_json(build_dna_screen(dna_questions, DNA_RESPONSE))
+            continue
+        if relative_path == KNOWLEDGE_BASE_FILE:
+            yield relative_path, iter_knowledge_base_bytes(iter_knowledge_base_entries(records, summaries))
+            continue
+        if relative_path == RETRIEVAL_INDEX_FILE:
+            yield relative_path, iter_retrieval_index_npz(
+                get_retrieval_index(records, dna_questions, paraphrased_dict)
             )
-            domain_list.append(domain_string_summary)
+            continue
 
-            # maps the providing answer RASA action to answer
-            domain_string_answer = get_domain_yaml_string(
-                intent, f"[Source: {source}; Date: {date}] {answer}"
+        template_text = read_template_file(template_dir, relative_path)
+        if relative_path == NLU_FILE:
+            chunks = iter_appended(
+                template_text, iter_nlu_yaml(records, dna_questions, paraphrased_dict)
+            )
+        elif relative_path == RULES_FILE:
+            chunks = iter_appended(template_text, iter_rules_yaml(records))
+        elif relative_path == STORIES_FILE:
+            chunks = iter_appended(template_text, iter_stories_yaml(records))
+        else:
+            # intents are listed right before responses, and responses right before actions
+            chunks = iter_template_with_inserts(
+                template_text,
+                {
+                    "responses:": lambda: iter_domain_intents(records),
+                    "actions:": lambda: iter_domain_responses(records, summaries),
+                },
             )
-            domain_list.append(domain_string_answer)
-            # if year == 2024:
-            #     domain_list.append(get_domain_yaml_string(intent, f"[Source: {source}; Date: Sept, 2024] {answer}"))
-            # elif year == 2022:
-            #     domain_list.append(get_domain_yaml_string(intent, f"[Source: {source}; Date: Apr, 2022] {answer}"))
+        yield relative_path, chunks
 
-        # store user intent
-        intent_list.append(get_intent_yaml_string(intent))
 
-    domain_path = "Chatbot/domain.yml"
+def get_intent_fingerprints(records: List[QARecord], paraphrased_dict: Dict[str, List[str]]):
+    """Hashes the content of every intent, in the order of the records
+    Args:
+       records: QA pairs returned by get_qa_records
+       paraphrased_dict: paraphrased equivalents for each question
+    Returns:
+       fingerprints: list of [intent, hash of the nlu examples, hash of the response, long answer flag]
+    """
+    return [
+        [
+            record.intent,
+            # repr of a tuple of strings is unambiguous and much cheaper than a json encoding per row
+            text_hash(repr((record.intent, record.question, paraphrased_dict[record.question]))),
+            text_hash(repr((record.intent, record.answer, record.source, record.date))),
+            record.long_answer,
+        ]
+        for record in records
+    ]
+
+
+def get_output_keys(fingerprints: List[list], dna_questions: List[str], template_hashes: Dict[str, str]):
+    """Hashes everything each generated file is rendered from, a file needs rewriting only if its key changes
+    Returns:
+       keys: dictionary mapping the path of each generated file to its key
+    """
+    nlu = [(intent, nlu_hash) for intent, nlu_hash, _, _ in fingerprints]
+    # which intents get a rule and which get a story only depends on the answer length
+    routing = [(intent, long_answer) for intent, _, _, long_answer in fingerprints]
+    responses = [
+        (intent, response_hash, long_answer)
+        for intent, _, response_hash, long_answer in fingerprints
+    ]
+    return {
+        NLU_FILE: content_key(template_hashes.get(NLU_FILE), dna_questions, nlu),
+        RULES_FILE: content_key(template_hashes.get(RULES_FILE), routing),
+        STORIES_FILE: content_key(template_hashes.get(STORIES_FILE), routing),
+        DOMAIN_FILE: content_key(template_hashes.get(DOMAIN_FILE), responses),
+        # the index is built by faq_index.py of the template
+        FAQ_INDEX_FILE: content_key(template_hashes.get("faq_index.py"), dna_questions, nlu, responses),
+        RETRIEVAL_INDEX_FILE: content_key(template_hashes.get("actions/retrieval_index.py"), dna_questions, nlu),
+        DNA_SCREEN_FILE: content_key(template_hashes.get("actions/dna_screen.py"), dna_questions, DNA_RESPONSE),
+        KNOWLEDGE_BASE_FILE: content_key(template_hashes.get("actions/knowledge_base.py"), responses),
+    }
+
+
+def count_changed_intents(previous: List[list], current: List[list]):
+    """Counts the intents that were added, removed or whose content changed since the previous build"""
+    previous_by_intent = {fingerprint[0]: fingerprint for fingerprint in previous}
+    current_by_intent = {fingerprint[0]: fingerprint for fingerprint in current}
+    added = len(current_by_intent.keys() - previous_by_intent.keys())
+    removed = len(previous_by_intent.keys() - current_by_intent.keys())
+    changed = sum(
+        previous_by_intent[intent] != fingerprint
+        for intent, fingerprint in current_by_intent.items()
+        if intent in previous_by_intent
+    )
+    return added, removed, changed
 
-    write_list_to_file(nlu_list, "Chatbot/data/nlu.yml")
-    write_list_to_file(rules_list, "Chatbot/data/rules.yml")
-    write_list_to_file(stories_list, "Chatbot/data/stories.yml")
 
-    # add domain_list content to domain.yml,
-    # it is defined right before actions
-    with open(domain_path, "r", encoding="utf-8") as f:
-        domain_data = f.read()
-        domain_data = domain_data.replace(
-            "actions:", "".join(domain_list) + "\n\nactions:"
-        )
+def main(argv: Optional[List[str]] = None):
+    args = parser.parse_args(argv)
+    template_dir = TEMPLATE_DIR
+    chatbot_dir = CHATBOT_DIR
 
-    with open(domain_path, "w", encoding="utf-8") as f:
-        f.write(domain_data)
+    # questions, answers, sources, dates, etc.
+    QA_df = pd.read_csv(INTENT_FILE)
+    # do not answer questions
+    DNA_questions = pd.read_csv(DNA_FILE)
+    # paraphrased equivalents for each question
+    paraphrased_dict = json.load(open(PARAPHRASED_FILE, "r"))
+
+    # answers are written as yaml literal blocks, so quotes in them are kept as they are
+    records = get_qa_records(QA_df)
+    dna_questions = DNA_questions["Questions"].tolist()
+
+    template_hashes = hash_template(template_dir)
+    fingerprints = get_intent_fingerprints(records, paraphrased_dict)
+    output_keys = get_output_keys(fingerprints, dna_questions, template_hashes)
+
+    manifest = None
+    if not args.clean and os.path.exists(chatbot_dir):
+        manifest = load_manifest(chatbot_dir)
+
+    if manifest is None:
+        # Removes exisiting chatbot and builds it from scratch
+        if os.path.exists(chatbot_dir):
+            shutil.rmtree(chatbot_dir, ignore_errors=True, onerror=None)
+
+        # copy template to new chatbot directory
+        shutil.copytree(template_dir, chatbot_dir)
+        outputs = list(GENERATED_FILES)
+    else:
+        # only template files that changed are copied again, files written by the running bot are kept
+        sync_template(template_dir, chatbot_dir, template_hashes, manifest["template"])
+
+        # a generated file is rendered again if anything it is built from changed, or it was edited or removed
+        outputs = [
+            relative_path
+            for relative_path in GENERATED_FILES
+            if manifest["outputs"].get(relative_path, {}).get("key") != output_keys[relative_path]
+            or not os.path.exists(os.path.join(chatbot_dir, relative_path))
+            or file_hash(os.path.join(chatbot_dir, relative_path))
+            != manifest["outputs"][relative_path]["hash"]
+        ]
+        added, removed, changed = count_changed_intents(manifest["intents"], fingerprints)
+        print(
+            f"Incremental build: {added} intents added, {removed} removed, {changed} changed, "
+            f"regenerating {outputs if outputs else 'nothing'}"
+        )
 
-    # add intent_list content to domain.yml
-    # it is defined right before responses
-    with open(domain_path, "r", encoding="utf-8") as f:
-        domain_data = f.read()
-        domain_data = domain_data.replace(
-            "responses:", "".join(intent_list) + "\n\nresponses:"
+    # summarize all long answers in one batch, only needed when domain.yml or the knowledge base is rendered
+    summaries = None
+    if DOMAIN_FILE in outputs or KNOWLEDGE_BASE_FILE in outputs:
+        summaries = summarize_long_answers(
+            records, args.workers, None if args.no_cache else args.summary_cache
         )
 
-    with open(domain_path, "w", encoding="utf-8") as f:
-        f.write(domain_data)
+    output_manifest = manifest["outputs"] if manifest is not None else {}
+    for relative_path, chunks in iter_output_files(
+        template_dir, outputs, records, dna_questions, paraphrased_dict, summaries
+    ):
+        # unchanged bytes are not written, so rasa sees the same file and skips retraining for it
+        _, digest = write_stream_if_changed(os.path.join(chatbot_dir, relative_path), chunks)
+        output_manifest[relative_path] = {"key": output_keys[relative_path], "hash": digest}
+
+    save_manifest(
+        chatbot_dir,
+        {"template": template_hashes, "outputs": output_manifest, "intents": fingerprints},
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,171 @@
+"""Removes paraphrases that duplicate a question, another intent's paraphrase or an earlier paraphrase, across the whole corpus"""
+
+import string
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+# translation table that deletes all ASCII punctuation
+punctuation_table = str.maketrans("", "", string.punctuation)
+
+# MinHash parameters, 128 permutations estimate Jaccard similarity within a few percent
+NUM_PERMUTATIONS = 128
+SHINGLE_SIZE = 3
+# Mersenne prime larger than any 32 bit shingle hash, with 32 bit coefficients a * x + b stays below 2 ** 64
+MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_text(text: str):
+    """Lowercases text, removes punctuation and collapses whitespace, so trivially different strings compare equal"""
+    return " ".join(text.lower().translate(punctuation_table).split())
+
+
+def shingle_set(text: str, size: int = SHINGLE_SIZE):
+    """Returns the set of character n-grams of normalized text"""
+    if len(text) <= size:
+        return {text}
+    return {text[i : i + size] for i in range(len(text) - size + 1)}
+
+
+class MinHashIndex:
+    """Locality sensitive hashing index over character shingles.
+
+    Each text gets a MinHash signature which is cut into bands. Texts sharing any band are
+    candidate near duplicates, and the share of equal signature values estimates their Jaccard similarity.
+    """
+
+    def __init__(self, threshold: float, num_permutations: int = NUM_PERMUTATIONS, seed: int = 1):
+        """
+        Args:
+           threshold: minimum Jaccard similarity of shingle sets for two texts to be near duplicates
+           num_permutations: length of the MinHash signatures
+           seed: seed of the hash permutations, fixed so results are reproducible
+        """
+        self.threshold = threshold
+        self.rows = self.rows_per_band(threshold, num_permutations)
+        self.bands = num_permutations // self.rows
+
+        rng = np.random.RandomState(seed)
+        shape = (self.bands * self.rows, 1)
+        self.a = rng.randint(1, 1 << 32, size=shape, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 32, size=shape, dtype=np.uint64)
+
+        self.buckets = defaultdict(list)
+        # signatures of all indexed texts, grown by doubling
+        self.signatures = np.empty((1024, self.bands * self.rows), dtype=np.uint64)
+        self.owners: List[int] = []
+
+    @staticmethod
+    def rows_per_band(threshold: float, num_permutations: int):
+        """Picks the band size whose LSH threshold (1 / bands) ** (1 / rows) is closest to the similarity threshold"""
+        candidates = [r for r in range(1, num_permutations + 1) if num_permutations % r == 0]
+        return min(
+            candidates,
+            key=lambda r: abs((1 / (num_permutations // r)) ** (1 / r) - threshold),
+        )
+
+    def signature(self, text: str):
+        """MinHash signature of the shingles of a text, one universal hash (a * x + b) mod p per permutation"""
+        shingles = shingle_set(text)
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        permuted = (self.a * hashes + self.b) % MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    def find(self, text: str):
+        """Finds an indexed near duplicate of text
+        Returns:
+           owner: owner of an indexed text at least as similar as the threshold, None if there is none
+           signature: signature of the text, to pass to add if it is kept
+        """
+        signature = self.signature(text)
+        candidates = set()
+        for band in range(self.bands):
+            key = (band, signature[band * self.rows : (band + 1) * self.rows].tobytes())
+            candidates.update(self.buckets.get(key, ()))
+        if not candidates:
+            return None, signature
+
+        items = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarity = (self.signatures[items] == signature).mean(axis=1)
+        matches = items[similarity >= self.threshold]
+        if len(matches):
+            return self.owners[matches.min()], signature
+        return None, signature
+
+    def add(self, owner: int, signature: np.ndarray):
+        item = len(self.owners)
+        if item == len(self.signatures):
+            self.signatures = np.concatenate([self.signatures, np.empty_like(self.signatures)])
+        self.signatures[item] = signature
+        self.owners.append(owner)
+        for band in range(self.bands):
+            key = (band, signature[band * self.rows : (band + 1) * self.rows].tobytes())
+            self.buckets[key].append(item)
+
+
+def deduplicate_paraphrases(
+    questions: List[str],
+    paraphrased_list: List[List[str]],
+    reserved: Iterable[str] = (),
+    near_duplicate_threshold: Optional[float] = None,
+):
+    """Filters the paraphrases of all questions at once, keeping their order.
+    A paraphrase is dropped if after normalization it
+      - equals any question or reserved text, e.g. a do-not-answer question,
+      - was also generated for another question, which would train two intents on the same example,
+      - repeats an earlier paraphrase of the same question.
+    With a near duplicate threshold, paraphrases whose character shingles are estimated to be that similar
+    to a kept question or paraphrase are dropped too; questions are indexed first, so they are always kept.
+    Args:
+       questions: list of strings which are user queries
+       paraphrased_list: nested list with the paraphrases of each question
+       reserved: texts no paraphrase may duplicate, they don't belong to any question
+       near_duplicate_threshold: Jaccard similarity in (0, 1] above which texts are near duplicates, None disables it
+    Returns:
+       deduplicated_list: nested list with the remaining paraphrases of each question
+    """
+    question_keys = {normalize_text(question) for question in questions}
+    question_keys.update(normalize_text(text) for text in reserved)
+
+    # questions that generated each normalized paraphrase
+    generated_by: Dict[str, Set[int]] = defaultdict(set)
+    normalized_list = [
+        [normalize_text(paraphrase) for paraphrase in paraphrases]
+        for paraphrases in paraphrased_list
+    ]
+    for i, normalized in enumerate(normalized_list):
+        for key in normalized:
+            generated_by[key].add(i)
+
+    index = None
+    if near_duplicate_threshold is not None:
+        index = MinHashIndex(near_duplicate_threshold)
+        # reserved texts are owned by -1, which matches no question
+        for owner, text in [(-1, text) for text in reserved] + list(enumerate(questions)):
+            index.add(owner, index.signature(normalize_text(text)))
+
+    deduplicated_list = []
+    for i, (paraphrases, normalized) in enumerate(zip(paraphrased_list, normalized_list)):
+        kept = []
+        seen = set()
+        for paraphrase, key in zip(paraphrases, normalized):
+            if key in question_keys or key in seen or len(generated_by[key]) > 1:
+                continue
+            seen.add(key)
+
+            if index is not None:
+                owner, signature = index.find(key)
+                if owner is not None:
+                    continue
+                index.add(i, signature)
+
+            kept.append(paraphrase)
+        deduplicated_list.append(kept)
+
+    return deduplicated_list
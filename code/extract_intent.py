@@ -1,15 +1,14 @@
 """Takes Chat.csv with QA pairs, and creates a new column consisting of unique user intents for each query. Saves to Chat_intent.csv"""
 
-import nltk
-from nltk import ngrams
-from nltk.corpus import stopwords
 import string
-from nltk.stem.wordnet import WordNetLemmatizer
 import warnings
 import json
+import numpy as np
 import pandas as pd
 import os
 import argparse
+from functools import lru_cache
+from typing import Dict, List, Optional
 
 parser = argparse.ArgumentParser(
     description="""Takes input csv with QA pairs (defaults to CSV), and creates a new column consisting of unique user intents for each query. Saves to Chat_intent.csv"""
@@ -17,24 +16,66 @@ parser = argparse.ArgumentParser(
 
 # define kwarg for file
 parser.add_argument("-f", "--file", help="Path to the input CSV file")
+parser.add_argument(
+    "--chunksize",
+    type=int,
+    help="Rows read and written at a time. The file is streamed with flat memory instead of being loaded whole, "
+    "for very large exports, and the output is the same",
+)
+
+OUTPUT_FILE = "data/input/Chat_intent.csv"
+
+
+# NLTK data used by the pipeline as (resource path, package name)
+# punkt is not used here, but the summarizer in configure_rasa relies on it being installed
+NLTK_RESOURCES = [
+    ("tokenizers/punkt", "punkt"),
+    ("corpora/stopwords", "stopwords"),
+    ("corpora/wordnet", "wordnet"),
+]
+
+# translation table that deletes all ASCII punctuation
+punctuation_table = str.maketrans("", "", string.punctuation)
+
+
+@lru_cache(maxsize=None)
+def ensure_nltk_data():
+    """Downloads the NLTK resources that are not installed locally, checked once per process"""
+    import nltk
+
+    for resource_path, package in NLTK_RESOURCES:
+        try:
+            nltk.data.find(resource_path)
+        except LookupError:
+            nltk.download(package)
+
+
+@lru_cache(maxsize=None)
+def get_stopwords():
+    """Returns the set of all filler words that don't contribute to meaning (at, is, the, etc.), loaded on first use"""
+    ensure_nltk_data()
+    from nltk.corpus import stopwords
+
+    return frozenset(stopwords.words("english"))
+
 
+@lru_cache(maxsize=None)
+def get_lemmatizer():
+    """Returns a lemmatizer that converts words to their base form (runs to run, apples to apple, etc.), loaded on first use"""
+    ensure_nltk_data()
+    from nltk.stem.wordnet import WordNetLemmatizer
 
-args = parser.parse_args()
+    return WordNetLemmatizer()
 
 
-nltk.download("punkt")
-nltk.download("stopwords")
-nltk.download("wordnet")
-warnings.simplefilter("ignore")
+# questions share most of their vocabulary, so lemmas are memoized up to this many words
+LEMMA_CACHE_SIZE = 2**16
 
-# set of all filler words that don't contribute to meaning (at, is, the, etc.)
-stop = set(stopwords.words("english"))
-# set of all ASCII punctuation
-punctuation = set(string.punctuation)
-# converts words to their base form (runs to run, apples to apple, etc.)
-lemma = WordNetLemmatizer()
 
-intent_values = {}  # keeps track of all extracted intents
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize_word(word: str):
+    """Converts a single word to its base form, results are cached"""
+    return get_lemmatizer().lemmatize(word)
 
 
 def get_clean_text(text: str, remove_stop=True):
@@ -48,45 +89,77 @@ def get_clean_text(text: str, remove_stop=True):
 
     # remove stop words if desired
     if remove_stop:
+        stop = get_stopwords()
         words = text.lower().split()
         text = " ".join([word for word in words if word not in stop])
 
     # remove punctuation
-    text = "".join(ch for ch in text if ch not in punctuation)
+    text = text.translate(punctuation_table)
 
     # return the list of words converted to their base form
-    base_words = [lemma.lemmatize(word) for word in text.split()]
+    base_words = [lemmatize_word(word) for word in text.split()]
     return base_words
 
 
-def extract_intent(question: str):
+def get_clean_texts(texts: pd.Series, remove_stop=True):
+    """Batch version of get_clean_text for a whole column of questions
+    Args:
+      texts: series of strings to be cleaned
+      remove_stop: flag that controls if stop words like at, is, the, etc. are removed
+    Returns:
+      base_words_list: list with the base words of each text, in the order of the series
+    """
+    # a single pass over the column, chaining .str accessors would build an intermediate series per step
+    if remove_stop:
+        stop = get_stopwords()
+        words_list = [
+            " ".join([word for word in text.lower().split() if word not in stop])
+            .translate(punctuation_table)
+            .split()
+            for text in texts
+        ]
+    else:
+        words_list = [text.translate(punctuation_table).split() for text in texts]
+
+    # resolve each distinct word once, then map every question through plain dict lookups
+    lemmas = {word: lemmatize_word(word) for word in set().union(*words_list)}
+    return [[lemmas[word] for word in words] for words in words_list]
+
+
+def extract_intent(
+    question: str,
+    clean_text: Optional[List[str]] = None,
+    full_text: Optional[List[str]] = None,
+):
     """Given a user question, extracts the intent by removing all stop words and punctuation and converting all words to base words
     Args:
        question: User question string
+       clean_text: base words of the question without stop words, computed if not given
+       full_text: base words of the question including stop words, computed if needed and not given
     Returns:
-       intent_value: a string with underscores seperating the keywords of the question
+       intent_value: a string with underscores seperating the keywords of the question, not guaranteed to be unique
     """
+    from nltk import ngrams
+
     if not question:
         raise RuntimeError("Empty question passed into extract_intent method")
 
     # get a list of all base words in the question excluding stop words and punctuation
-    clean_text = get_clean_text(question, True)
+    if clean_text is None:
+        clean_text = get_clean_text(question, True)
 
     # if we can't create bigrams after removing stop words, we try it without removing
     bigrams = list(ngrams(clean_text, 2))
     if not bigrams:
-        clean_text = get_clean_text(question, False)
+        clean_text = full_text if full_text is not None else get_clean_text(question, False)
 
     # get bigrams, trigrams, and fourgrams
     bigrams = list(ngrams(clean_text, 2))
     trigrams = list(ngrams(clean_text, 3))
     fourgrams = list(ngrams(clean_text, 4))
 
-    # Return the most detailed and unique string possible representing intent of query
-    # key assumption here is that no two questions will have the first four same keywords
-    # TODO, try to do away with this assumption
-    # maybe keep a set that keeps track of previous intent values
-    # and generate a longer intent if already seen
+    # Return the most detailed string possible representing intent of query
+    # uniqueness across questions is handled by IntentAllocator
     if not fourgrams:
         if not trigrams:
             intent_value = "_".join(bigrams[0])
@@ -95,21 +168,20 @@ def extract_intent(question: str):
     else:
         intent_value = "_".join(fourgrams[0])
 
-    return_intent = intent_value
-    if intent_value in intent_values:
-        return_intent += str(intent_values[intent_value])
-    intent_values[intent_value] = intent_values.get(intent_value, 0) + 1
-    return return_intent
+    return intent_value
 
 
-def get_new_intent(text: str):
+def get_new_intent(text: str, full_text: Optional[List[str]] = None):
     """Creating new intent for a given text
     Args:
        text: string for which we are generating new intent
+       full_text: base words of the text including stop words, computed if not given
     Returns:
        intent_value: a string with underscores seperating the keywords of the question
     """
-    clean_text = get_clean_text(text, False)
+    from nltk import ngrams
+
+    clean_text = full_text if full_text is not None else get_clean_text(text, False)
 
     # get ngrams from n = 2 to n = 5
     bigram = list(ngrams(clean_text, 2))
@@ -133,7 +205,125 @@ def get_new_intent(text: str):
     return intent_value
 
 
-def main():
+class IntentAllocator:
+    """Hands out a unique intent for every question in a single pass.
+
+    Repeated base intents get a numeric suffix counting how often the base was seen before
+    (vote_mail, vote_mail1, vote_mail2, ...). If that name is already taken, the longer
+    n-gram from get_new_intent is used instead, suffixed until it is free.
+    """
+
+    def __init__(self):
+        # number of times each base intent has been extracted
+        self.base_counts = {}
+        # every intent handed out so far
+        self.allocated = set()
+
+    def allocate(
+        self,
+        question: str,
+        clean_text: Optional[List[str]] = None,
+        full_text: Optional[List[str]] = None,
+    ):
+        """Extracts the intent for a question and makes it unique among all allocated intents
+        Args:
+           question: User question string
+           clean_text: base words of the question without stop words, computed if not given
+           full_text: base words of the question including stop words, computed if needed and not given
+        Returns:
+           intent: intent string that has not been handed out before
+        """
+        base_intent = extract_intent(question, clean_text, full_text)
+        count = self.base_counts.get(base_intent, 0)
+        self.base_counts[base_intent] = count + 1
+
+        intent = base_intent + str(count) if count else base_intent
+        if intent in self.allocated:
+            # suffixed intent clashes with another question's intent, use a longer n-gram
+            longer_intent = get_new_intent(question, full_text)
+            intent = longer_intent
+            suffix = 1
+            while intent in self.allocated:
+                intent = longer_intent + str(suffix)
+                suffix += 1
+
+        self.allocated.add(intent)
+        return intent
+
+    def allocate_all(self, questions: pd.Series):
+        """Allocates intents for a whole column of questions, normalizing the text in batches
+        Args:
+           questions: series of user question strings
+        Returns:
+           intents: list of unique intents in the order of the questions
+        """
+        clean_texts = get_clean_texts(questions, True)
+
+        # the text with stop words is only needed when too few keywords are left without them
+        short_rows = [i for i, clean_text in enumerate(clean_texts) if len(clean_text) < 2]
+        full_texts = dict(
+            zip(short_rows, get_clean_texts(questions.iloc[short_rows], False))
+        )
+
+        return [
+            self.allocate(question, clean_text, full_texts.get(i))
+            for i, (question, clean_text) in enumerate(zip(questions, clean_texts))
+        ]
+
+
+def merge_dtypes(first: np.dtype, second: np.dtype):
+    """Returns the dtype pandas infers for a column whose parts were inferred as first and second"""
+    if first == second:
+        return first
+    if first.kind in "iuf" and second.kind in "iuf":
+        # a chunk of integers next to a chunk with floats or missing values
+        return np.dtype("float64")
+    return np.dtype(object)
+
+
+def infer_dtypes(csv_file: str, chunksize: int):
+    """Infers the dtype of every column of a csv file chunk by chunk, the same dtypes as reading it whole.
+    A chunk on its own may look different, a column of integers with a missing value in another chunk is a float column
+    Returns:
+       dtypes: dictionary mapping every column to its dtype
+    """
+    dtypes: Dict[str, np.dtype] = {}
+    for chunk in pd.read_csv(csv_file, chunksize=chunksize):
+        for column, dtype in chunk.dtypes.items():
+            dtypes[column] = merge_dtypes(dtypes[column], dtype) if column in dtypes else dtype
+    return dtypes
+
+
+def write_intents_in_chunks(csv_file: str, output_file: str, chunksize: int):
+    """Streaming version of adding the Intent column and saving the file, for files that don't fit in memory.
+    The file is read twice, once to infer the dtypes and once to allocate intents and write the chunks,
+    only the allocator with the intents handed out so far grows with the file
+    Args:
+       csv_file: csv file with a Question column
+       output_file: csv file written with the columns of csv_file and Intent
+       chunksize: rows read and written at a time
+    Returns:
+       rows: number of questions written
+    """
+    dtypes = infer_dtypes(csv_file, chunksize)
+    allocator = IntentAllocator()
+    rows = 0
+    with open(output_file, "w", newline="") as f:
+        for chunk in pd.read_csv(csv_file, chunksize=chunksize, dtype=dtypes):
+            chunk["Intent"] = allocator.allocate_all(chunk["Question"])
+            chunk.to_csv(f, index=False, header=rows == 0)
+            rows += len(chunk)
+    if not rows:
+        # a file with a header only gives no chunks
+        pd.read_csv(csv_file).assign(Intent=[]).to_csv(output_file, index=False)
+    return rows
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parser.parse_args(argv)
+    ensure_nltk_data()
+    warnings.simplefilter("ignore")
+
     csv_file = args.file
     if not csv_file:
         csv_file = "Chat.csv"
@@ -144,27 +334,25 @@ def main():
     csv_file = os.path.join("data", "input", csv_file)
     # read question answer pairs and create intent for each question
 
+    if args.chunksize:
+        try:
+            write_intents_in_chunks(csv_file, OUTPUT_FILE, args.chunksize)
+        except (OSError, pd.errors.ParserError) as e:
+            raise RuntimeError(f"There was an error opening file {csv_file}, {e}")
+        return
+
     try:
         QA_df = pd.read_csv(csv_file)
     except Exception as e:
         raise RuntimeError(f"There was an error opening file {csv_file}, {e.msg}")
-    QA_df["Intent"] = QA_df["Question"].apply(extract_intent)
+    allocator = IntentAllocator()
+    QA_df["Intent"] = allocator.allocate_all(QA_df["Question"])
 
     intents = QA_df["Intent"].to_list()
     assert len(intents) == len(set(intents))
 
-    for i in range(len(QA_df)):
-        for j in range(len(QA_df)):
-            if i == j:
-                continue
-
-            # handle duplicate intents for questions
-            if QA_df["Intent"][i] == QA_df["Intent"][j]:
-                QA_df["Intent"][j] = get_new_intent(QA_df["Question"][j])
-                QA_df["Intent"][i] = get_new_intent(QA_df["Question"][i])
-
     # saves to new csv file with a new file representing intents
-    QA_df.to_csv("data/input/Chat_intent.csv", index=False)
+    QA_df.to_csv(OUTPUT_FILE, index=False)
 
 
 if __name__ == "__main__":
@@ -1,73 +1,291 @@
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 import pandas as pd
 import json
 import warnings
-from typing import List
+import argparse
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from typing import List, Optional
 
-# tokenizer will tokenize text and model will paraphrase
-tokenizer = AutoTokenizer.from_pretrained("prithivida/parrot_paraphraser_on_T5")
-model = AutoModelForSeq2SeqLM.from_pretrained("prithivida/parrot_paraphraser_on_T5")
+from cache_store import CacheStore, content_key
+from dedup import deduplicate_paraphrases
+
+MODEL_NAME = "prithivida/parrot_paraphraser_on_T5"
+INTENT_FILE = "data/input/Chat_intent.csv"
+PARAPHRASED_FILE = "data/input/paraphrased.json"
+
+# fp32: the model as published, int8: linear layers dynamically quantized for faster CPU inference
+BACKENDS = ["fp32", "int8"]
+
+parser = argparse.ArgumentParser(
+    description="""Generates paraphrases for every question in Chat_intent.csv. Saves to paraphrased.json"""
+)
+parser.add_argument(
+    "-b",
+    "--batch-size",
+    type=int,
+    default=8,
+    help="Number of questions paraphrased together in one model call",
+)
+parser.add_argument(
+    "--cache",
+    default="data/cache/paraphrases.sqlite",
+    help="SQLite file caching generated paraphrases between runs",
+)
+parser.add_argument(
+    "--no-cache",
+    action="store_true",
+    help="Paraphrase every question again without reading or writing the cache",
+)
+parser.add_argument(
+    "-w",
+    "--workers",
+    type=int,
+    default=1,
+    help="Number of worker processes, each loads its own copy of the model",
+)
+parser.add_argument(
+    "--shard-size",
+    type=int,
+    default=64,
+    help="Number of questions per unit of work, every finished shard is checkpointed to the cache",
+)
+parser.add_argument(
+    "--backend",
+    choices=BACKENDS,
+    default="fp32",
+    help="Inference backend, int8 is faster on CPU with slightly different paraphrases",
+)
+parser.add_argument(
+    "--near-duplicate-threshold",
+    type=float,
+    help="Also drop paraphrases whose character shingles are at least this similar (0-1) to another question or paraphrase",
+)
 
 
 warnings.filterwarnings("ignore")
 
 
+@lru_cache(maxsize=None)
+def load_model(backend: str = "fp32"):
+    """Loads the tokenizer and model on first use, so importing this module stays cheap
+    Args:
+       backend: one of BACKENDS
+    Returns:
+       (tokenizer, model): tokenizer will tokenize text and model will paraphrase
+    """
+    if backend not in BACKENDS:
+        raise RuntimeError(f"Unknown paraphrasing backend {backend}, expected one of {BACKENDS}")
+
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    model = AutoModelForSeq2SeqLM.from_pretrained(MODEL_NAME).eval()
+
+    if backend == "int8":
+        # weights of every linear layer are stored as int8, activations are quantized on the fly
+        model = torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return tokenizer, model
+
+
 # Init models (make sure you init ONLY once if you integrate this to your code)
 # parrot = Parrot()
 
+# arguments passed to model.generate for every batch of questions
+GENERATION_KWARGS = {
+    "max_length": 100,  # Maximum length of output sequence
+    "num_beams": 10,  # beam search width
+    "early_stopping": True,  # stops when no better sequences are found
+    "top_p": 0.99,
+    "top_k": 30,
+    "num_return_sequences": 6,  # returns 6 different paraphrases
+}
+
 
-def paraphrase_question_list(questions: List[str]):
+def paraphrase_question_list(
+    questions: List[str], batch_size: int = 8, backend: str = "fp32"
+):
     """Generates paraphrases for each question in the inputted list
     Args:
        question: list of strings which are user queries
+       batch_size: number of questions passed to the model in a single generate call
+       backend: one of BACKENDS
     Returns:
        all_paraphrases: nested list with each element being a list of paraphrases corresponding to a question
     """
-    all_paraphrases = []
-
-    # generate paraphrases for each question
-    for question in questions:
-        paraphrases = []
-
-        # tokenizes the question
-        input_tokens = tokenizer(question, return_tensors="pt").input_ids
-
-        generated_tokens = model.generate(
-            input_tokens,
-            max_length=100,  # Maximum length of output sequence
-            num_beams=10,  # beam search width
-            early_stopping=True,  # stops when no better sequences are found
-            top_p=0.99,
-            top_k=30,
-            num_return_sequences=6,  # returns 6 different paraphrases
-        )
+    all_paraphrases = [[] for _ in questions]
+    if not all_paraphrases:
+        return all_paraphrases
 
-        # decodes all tokens into english
-        paraphrases = [
-            tokenizer.decode(paraphrase_tokens, skip_special_tokens=True)
-            for paraphrase_tokens in generated_tokens
-        ]
+    import torch
 
-        # stores result
-        all_paraphrases.append(paraphrases)
+    tokenizer, model = load_model(backend)
+    num_returns = GENERATION_KWARGS["num_return_sequences"]
+
+    # tokenizes all questions once, unpadded
+    input_ids = tokenizer(list(questions)).input_ids
+
+    # questions of similar length are batched together so little compute is spent on padding
+    order = sorted(range(len(questions)), key=lambda i: len(input_ids[i]))
+
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            batch = order[start : start + batch_size]
+
+            # pads the batch to its longest question, the attention mask hides the padding
+            inputs = tokenizer.pad(
+                {"input_ids": [input_ids[i] for i in batch]}, return_tensors="pt"
+            )
+            generated_tokens = model.generate(**inputs, **GENERATION_KWARGS)
+
+            # decodes all tokens into english
+            paraphrases = tokenizer.batch_decode(
+                generated_tokens, skip_special_tokens=True
+            )
+
+            # generate returns num_returns consecutive sequences per question of the batch
+            for position, question_index in enumerate(batch):
+                all_paraphrases[question_index] = paraphrases[
+                    position * num_returns : (position + 1) * num_returns
+                ]
 
     return all_paraphrases
 
 
-def main():
-    # read questions and generate paraphrases for each questions
-    QA_df = pd.read_csv("data/input/Chat_intent.csv")
-    questions = QA_df["Question"].tolist()
-    question_set = set(questions)
-    paraphrased_list = paraphrase_question_list(questions)
+def init_worker(num_threads: int, backend: str):
+    """Runs once in every worker process, pins torch to its share of the cores so workers don't oversubscribe them
+    and loads the model before the first shard arrives"""
+    import torch
+
+    torch.set_num_threads(num_threads)
+    warnings.filterwarnings("ignore")
+    load_model(backend)
+
+
+def iter_paraphrase_shards(
+    questions: List[str],
+    batch_size: int = 8,
+    workers: int = 1,
+    shard_size: int = 64,
+    backend: str = "fp32",
+):
+    """Splits questions into shards and paraphrases them, in worker processes if more than one worker is requested
+    Args:
+       questions: list of strings which are user queries
+       batch_size: number of questions passed to the model in a single generate call
+       workers: number of worker processes, 1 paraphrases in the current process
+       shard_size: number of questions per shard
+       backend: one of BACKENDS
+    Yields:
+       (shard, paraphrases): questions of a finished shard and their paraphrases, in order of completion
+    """
+    shards = [
+        questions[start : start + shard_size]
+        for start in range(0, len(questions), shard_size)
+    ]
+
+    if workers <= 1 or len(shards) <= 1:
+        for shard in shards:
+            yield shard, paraphrase_question_list(shard, batch_size, backend)
+        return
 
-    # iterate over list of all paraphrases and remove all duplicates
-    for i in range(len(paraphrased_list)):
-        for paraphrase in paraphrased_list[i]:
-            if paraphrase in question_set:
-                paraphrased_list[i].remove(paraphrase)
-                paraphrased_list[i] = list(set(paraphrased_list[i]))
+    # workers split the cores between them, torch would otherwise start a thread per core in each
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
 
+    # spawn instead of fork, torch's thread pools are not fork safe
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(num_threads, backend),
+    ) as pool:
+        futures = {
+            pool.submit(paraphrase_question_list, shard, batch_size, backend): shard
+            for shard in shards
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def paraphrase_questions(
+    questions: List[str],
+    batch_size: int = 8,
+    workers: int = 1,
+    shard_size: int = 64,
+    backend: str = "fp32",
+):
+    """Paraphrases questions in shards without a cache, see iter_paraphrase_shards for the arguments
+    Returns:
+       all_paraphrases: nested list with each element being a list of paraphrases corresponding to a question
+    """
+    paraphrases_by_question = {}
+    for shard, paraphrases in iter_paraphrase_shards(
+        questions, batch_size, workers, shard_size, backend
+    ):
+        paraphrases_by_question.update(zip(shard, paraphrases))
+    return [list(paraphrases_by_question[question]) for question in questions]
+
+
+def paraphrase_cache_key(question: str, backend: str = "fp32"):
+    """Cache key of a question, any change to the model, backend or generation parameters invalidates it"""
+    return content_key(question, MODEL_NAME, backend, GENERATION_KWARGS)
+
+
+def paraphrase_with_cache(
+    questions: List[str],
+    cache: CacheStore,
+    batch_size: int = 8,
+    workers: int = 1,
+    shard_size: int = 64,
+    backend: str = "fp32",
+):
+    """Generates paraphrases only for questions missing from the cache and evicts entries of removed questions.
+    Every finished shard is written to the cache right away, so an interrupted run resumes where it stopped.
+    Args:
+       questions: list of strings which are user queries
+       cache: store holding the paraphrases of previous runs
+       batch_size: number of questions passed to the model in a single generate call
+       workers: number of worker processes, 1 paraphrases in the current process
+       shard_size: number of questions per shard
+       backend: one of BACKENDS
+    Returns:
+       all_paraphrases: nested list with each element being a list of paraphrases corresponding to a question
+    """
+    keys = [paraphrase_cache_key(question, backend) for question in questions]
+    cached = cache.get_many(keys)
+
+    # each distinct question that is not cached is generated once
+    missing = {key: question for key, question in zip(keys, questions) if key not in cached}
+    done = 0
+    for shard, paraphrases in iter_paraphrase_shards(
+        list(missing.values()), batch_size, workers, shard_size, backend
+    ):
+        checkpoint = {
+            paraphrase_cache_key(question, backend): shard_paraphrases
+            for question, shard_paraphrases in zip(shard, paraphrases)
+        }
+        cache.put_many(checkpoint)
+        cached.update(checkpoint)
+        done += len(shard)
+        print(f"Paraphrased {done}/{len(missing)} questions")
+
+    evicted = cache.retain(keys)
+    hits = len(questions) - sum(key in missing for key in keys)
+    print(
+        f"Paraphrase cache: {hits}/{len(questions)} hits ({hits / max(len(questions), 1):.0%}), "
+        f"generated {len(missing)}, evicted {evicted}"
+    )
+
+    # copies, so that removing duplicates later does not alter the cached lists
+    return [list(cached[key]) for key in keys]
+
+
+def save_paraphrases(questions: List[str], paraphrased_list: List[List[str]]):
+    """Saves the paraphrases of every question to PARAPHRASED_FILE, which configure_rasa reads"""
     # zip corresponding question and its paraphrases and package into a dictionary
     dict_paraphrased = {
         question: paraphrases
@@ -75,9 +293,44 @@ def main():
     }
 
     # save to json file
-    with open("data/input/paraphrased.json", "w") as f:
+    with open(PARAPHRASED_FILE, "w") as f:
         json.dump(obj=dict_paraphrased, fp=f, indent=4)
 
 
+def main(argv: Optional[List[str]] = None):
+    args = parser.parse_args(argv)
+
+    # read questions and generate paraphrases for each questions
+    QA_df = pd.read_csv(INTENT_FILE)
+    questions = QA_df["Question"].tolist()
+    if args.no_cache:
+        paraphrased_list = paraphrase_questions(
+            questions, args.batch_size, args.workers, args.shard_size, args.backend
+        )
+    else:
+        cache = CacheStore(args.cache, "paraphrases")
+        paraphrased_list = paraphrase_with_cache(
+            questions,
+            cache,
+            args.batch_size,
+            args.workers,
+            args.shard_size,
+            args.backend,
+        )
+        cache.close()
+
+    # paraphrases may not duplicate any question, including the ones that should not be answered
+    dna_questions = []
+    if os.path.exists("data/input/DNA.csv"):
+        dna_questions = pd.read_csv("data/input/DNA.csv")["Questions"].tolist()
+
+    # remove paraphrases that duplicate questions or paraphrases of other intents
+    paraphrased_list = deduplicate_paraphrases(
+        questions, paraphrased_list, dna_questions, args.near_duplicate_threshold
+    )
+
+    save_paraphrases(questions, paraphrased_list)
+
+
 if __name__ == "__main__":
     main()
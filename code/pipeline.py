@@ -0,0 +1,280 @@
+"""Runs extract_intent, paraphraser and configure_rasa as one pipeline, skipping stages whose inputs did not change"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import pandas as pd
+
+import configure_rasa
+import extract_intent
+import paraphraser
+from build_manifest import MANIFEST_FILE, file_hash, hash_template
+from cache_store import content_key
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILE = "data/input/config.json"
+# fingerprints of the last successful run of every stage
+STATE_FILE = "data/cache/pipeline.json"
+
+parser = argparse.ArgumentParser(
+    description="""Builds the Chatbot directory from a QA csv in one command. Stages whose inputs are unchanged since the last run are skipped"""
+)
+parser.add_argument("-f", "--file", default="Chat.csv", help="Name of the input CSV file in data/input")
+parser.add_argument(
+    "-w",
+    "--workers",
+    type=int,
+    default=1,
+    help="Number of processes used for paraphrasing and for summarizing",
+)
+parser.add_argument(
+    "-b",
+    "--batch-size",
+    type=int,
+    default=8,
+    help="Number of questions paraphrased together in one model call",
+)
+parser.add_argument("--backend", choices=paraphraser.BACKENDS, default="fp32", help="Paraphrasing backend")
+parser.add_argument(
+    "--near-duplicate-threshold",
+    type=float,
+    help="Also drop paraphrases at least this similar (0-1) to another question or paraphrase",
+)
+parser.add_argument(
+    "--force",
+    nargs="+",
+    default=[],
+    metavar="STAGE",
+    help="Run these stages even if their inputs did not change, or all to run every stage",
+)
+parser.add_argument(
+    "--clean",
+    action="store_true",
+    help="Build the Chatbot directory from scratch instead of updating only what changed",
+)
+
+
+class Stage(NamedTuple):
+    """A step of the pipeline and the artifacts it depends on"""
+
+    name: str
+    # stages whose outputs this stage reads
+    after: List[str]
+    # returns values that change whenever the output of the stage would, computed once the stages before it ran
+    fingerprint: Callable[[], list]
+    # files written by the stage, a stage is run again if one of them is missing or was changed
+    outputs: List[str]
+    run: Callable[[], None]
+
+
+class StageResult(NamedTuple):
+    """Outcome of a stage, the fingerprint and output hashes are saved for the next run"""
+
+    name: str
+    skipped: bool
+    seconds: float
+    fingerprint: str
+    output_hashes: Dict[str, str]
+
+
+def source_hashes(*modules: str):
+    """Hashes of source files in code/, so that changing the code of a stage runs it again"""
+    return [file_hash(os.path.join(CODE_DIR, module)) for module in modules]
+
+
+def optional_file_hash(path: str):
+    return file_hash(path) if os.path.exists(path) else None
+
+
+def load_config():
+    """Reads config.json, a missing file or key means the defaults"""
+    if not os.path.exists(CONFIG_FILE):
+        return {}
+    with open(CONFIG_FILE, "r") as f:
+        return json.load(f)
+
+
+def build_stages(args: argparse.Namespace, config: dict):
+    """Creates the stages of the pipeline
+    Args:
+       args: parsed command line arguments of this script
+       config: content of config.json, "Paraphrasing": "OFF" skips the paraphrasing model
+    Returns:
+       stages: list of Stage, each listed after the stages it depends on
+    """
+    csv_file = os.path.join("data", "input", args.file)
+    paraphrasing = str(config.get("Paraphrasing", "ON")).upper() != "OFF"
+
+    def read_intent_file():
+        return pd.read_csv(configure_rasa.INTENT_FILE)
+
+    def paraphrase():
+        if paraphrasing:
+            argv = ["--batch-size", str(args.batch_size), "--workers", str(args.workers), "--backend", args.backend]
+            if args.near_duplicate_threshold is not None:
+                argv += ["--near-duplicate-threshold", str(args.near_duplicate_threshold)]
+            paraphraser.main(argv)
+        else:
+            # every question is still listed, configure_rasa looks up the paraphrases of each
+            questions = read_intent_file()["Question"].tolist()
+            paraphraser.save_paraphrases(questions, [[] for _ in questions])
+
+    def summarize():
+        records = configure_rasa.get_qa_records(read_intent_file())
+        configure_rasa.summarize_long_answers(records, args.workers)
+
+    def configure():
+        argv = ["--workers", str(args.workers)] + (["--clean"] if args.clean else [])
+        configure_rasa.main(argv)
+
+    return [
+        Stage(
+            name="intents",
+            after=[],
+            fingerprint=lambda: [optional_file_hash(csv_file), source_hashes("extract_intent.py")],
+            outputs=[configure_rasa.INTENT_FILE],
+            run=lambda: extract_intent.main(["--file", args.file]),
+        ),
+        # only the questions are paraphrased, so edits to answers, sources or dates don't run this again
+        Stage(
+            name="paraphrase",
+            after=["intents"],
+            fingerprint=lambda: [
+                read_intent_file()["Question"].tolist(),
+                optional_file_hash(configure_rasa.DNA_FILE),
+                paraphrasing,
+                args.backend,
+                args.near_duplicate_threshold,
+                source_hashes("paraphraser.py", "dedup.py"),
+            ],
+            outputs=[paraphraser.PARAPHRASED_FILE],
+            run=paraphrase,
+        ),
+        # fills the summary cache while the paraphrases are generated, configure then finds every summary cached,
+        # if the cache was deleted since, configure summarizes the answers itself
+        Stage(
+            name="summarize",
+            after=["intents"],
+            fingerprint=lambda: [
+                read_intent_file()["Answer"].tolist(),
+                source_hashes("configure_rasa.py"),
+            ],
+            outputs=[],
+            run=summarize,
+        ),
+        Stage(
+            name="configure",
+            after=["paraphrase", "summarize"],
+            fingerprint=lambda: [
+                file_hash(configure_rasa.INTENT_FILE),
+                optional_file_hash(configure_rasa.DNA_FILE),
+                file_hash(paraphraser.PARAPHRASED_FILE),
+                hash_template(configure_rasa.TEMPLATE_DIR),
+                args.clean,
+                source_hashes("configure_rasa.py", "yaml_emitter.py", "build_manifest.py"),
+            ],
+            outputs=[os.path.join(configure_rasa.CHATBOT_DIR, MANIFEST_FILE)],
+            run=configure,
+        ),
+    ]
+
+
+def run_stage(stage: Stage, previous: Optional[dict], force: bool):
+    """Runs a stage unless its fingerprint and outputs match the previous run
+    Args:
+       stage: stage to run
+       previous: state saved by the last successful run of the stage, None if it never ran
+       force: run the stage even if nothing changed
+    Returns:
+       result: StageResult with the new fingerprint and output hashes
+    """
+    start = time.perf_counter()
+    fingerprint = content_key(stage.fingerprint())
+
+    skipped = (
+        not force
+        and previous is not None
+        and previous["fingerprint"] == fingerprint
+        and all(previous["outputs"].get(path) == optional_file_hash(path) for path in stage.outputs)
+    )
+    if not skipped:
+        stage.run()
+
+    output_hashes = {path: optional_file_hash(path) for path in stage.outputs}
+    return StageResult(stage.name, skipped, time.perf_counter() - start, fingerprint, output_hashes)
+
+
+def run_pipeline(stages: List[Stage], state: Dict[str, dict], force: List[str]):
+    """Runs the stages in dependency order, stages whose dependencies are done run concurrently.
+    The state is saved after every stage, so a failed run keeps the stages that finished.
+    Args:
+       stages: stages returned by build_stages
+       state: fingerprints and output hashes of the last successful run of each stage, updated in place
+       force: names of stages to run even if nothing changed, all forces every stage
+    Returns:
+       results: StageResult of every stage in order of completion
+    """
+    pending = {stage.name: stage for stage in stages}
+    done = set()
+    results = []
+    # threads are enough, the heavy work of every stage runs in torch, numpy or worker processes
+    with ThreadPoolExecutor(max_workers=len(stages)) as pool:
+        running = {}
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(dependency in done for dependency in stage.after):
+                    forced = "all" in force or name in force
+                    running[pool.submit(run_stage, stage, state.get(name), forced)] = name
+                    del pending[name]
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                del running[future]
+                result = future.result()
+                state[result.name] = {"fingerprint": result.fingerprint, "outputs": result.output_hashes}
+                save_state(state)
+                results.append(result)
+                done.add(result.name)
+    return results
+
+
+def load_state():
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE, "r") as f:
+        return json.load(f)
+
+
+def save_state(state: Dict[str, dict]):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    with open(STATE_FILE, "w") as f:
+        json.dump(state, f, indent=1)
+
+
+def print_report(results: List[StageResult], wall_seconds: float):
+    print(f"\n{'stage':<12} {'status':<8} {'seconds':>8}")
+    for result in results:
+        status = "skipped" if result.skipped else "ran"
+        print(f"{result.name:<12} {status:<8} {result.seconds:>8.2f}")
+    print(f"{'total':<12} {'':<8} {wall_seconds:>8.2f}")
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parser.parse_args(argv)
+    stage_names = {"intents", "paraphrase", "summarize", "configure", "all"}
+    unknown = set(args.force) - stage_names
+    if unknown:
+        raise RuntimeError(f"Unknown stages {sorted(unknown)} passed to --force, expected some of {sorted(stage_names)}")
+
+    start = time.perf_counter()
+    stages = build_stages(args, load_config())
+    results = run_pipeline(stages, load_state(), args.force)
+    print_report(results, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
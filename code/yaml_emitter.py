@@ -0,0 +1,107 @@
+"""Escaping and streaming helpers for writing the rasa yaml files without holding them in memory"""
+
+import re
+from typing import Callable, Dict, Iterable, Iterator
+
+# scalars made of these characters are written without quotes, anything else is double quoted
+PLAIN_SCALAR_PATTERN = re.compile(r"[A-Za-z0-9_][\w.'()/-]*(?: [\w.'()/-]+)*")
+# plain scalars that a yaml parser would read back as booleans, nulls, numbers or dates instead of strings
+RESERVED_WORDS = {"null", "true", "false", "yes", "no", "y", "n", "on", "off"}
+NON_STRING_PATTERN = re.compile(
+    "(?i:~|" + "|".join(sorted(RESERVED_WORDS)) + ")"
+    + r"|[-+]?(?:[0-9][0-9_]*)?(?:\.[0-9_]*)?(?:[eE][-+]?[0-9]+)?"
+    # binary, octal and hexadecimal integers, sexagesimal numbers such as 1:30, infinity and not a number
+    + r"|[-+]?0(?:[bB][01_]*|[oO][0-7_]*|[xX][0-9a-fA-F_]*)"
+    + r"|[-+]?[0-9][0-9_]*(?::[0-5]?[0-9])+(?:\.[0-9_]*)?"
+    + r"|(?i:[-+]?\.inf|\.nan)"
+    + r"|[0-9]{4}-[0-9]{1,2}-[0-9]{1,2}.*"
+)
+# characters that may not appear unescaped in yaml, or that a parser would fold into a line break
+UNPRINTABLE_PATTERN = re.compile(
+    "[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x84\x86-\x9f\u2028\u2029\ufeff\ufffe\uffff]"
+)
+YAML_ESCAPES = {
+    "\\": "\\\\",
+    '"': '\\"',
+    "\n": "\\n",
+    "\t": "\\t",
+    "\r": "\\r",
+    "\x00": "\\0",
+    "\x85": "\\N",
+    "\u2028": "\\L",
+    "\u2029": "\\P",
+}
+ESCAPE_PATTERN = re.compile(
+    "[\\\\\"\n\t\r\x85\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x84\x86-\x9f\u2028\u2029\ufeff\ufffe\uffff]"
+)
+
+
+def double_quoted(text: str):
+    """Returns text as a double quoted yaml scalar, escaping backslashes, quotes and control characters"""
+
+    def escape(match):
+        char = match.group()
+        return YAML_ESCAPES.get(char) or f"\\u{ord(char):04x}"
+
+    return '"' + ESCAPE_PATTERN.sub(escape, text) + '"'
+
+
+def scalar(text: str):
+    """Returns text as a yaml scalar, unquoted if it reads back as the same string and double quoted otherwise"""
+    # fast path for identifiers such as vote_mail, which is what most intents look like
+    if text.isascii() and text.isidentifier() and text.lower() not in RESERVED_WORDS:
+        return text
+    if PLAIN_SCALAR_PATTERN.fullmatch(text) and not NON_STRING_PATTERN.fullmatch(text):
+        return text
+    return double_quoted(text)
+
+
+def literal_block(text: str, indent: str):
+    """Returns text as a yaml literal block (|) with every line indented,
+    or as a double quoted scalar if a literal block can't represent it
+    Args:
+       text: multi line text, quotes and other special characters are kept as they are
+       indent: indentation of the content lines, deeper than the key that owns the block
+    Returns:
+       yaml_str: block indicator followed by the indented lines, without a trailing newline
+    """
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    # the block's indentation is taken from its first non-empty line, so that line may not start with whitespace
+    first_line = text.lstrip("\n")
+    if UNPRINTABLE_PATTERN.search(text) or first_line[:1] in ("", " ", "\t"):
+        return double_quoted(text)
+    # whitespace only lines are indented too, unindented they would end the block or, with a tab, not be valid yaml
+    lines = [indent + line if line else line for line in text.split("\n")]
+    return "|\n" + "\n".join(lines)
+
+
+def single_line(text: str):
+    """Joins the lines of text with spaces, for list items of rasa's nlu examples which are one per line"""
+    return " ".join(text.splitlines())
+
+
+def iter_template_with_inserts(
+    template_text: str, inserts: Dict[str, Callable[[], Iterable[str]]]
+):
+    """Streams a template, emitting generated content in front of top level keys, in a single pass
+    Args:
+       template_text: content of the template file
+       inserts: maps a top level key such as "actions:" to a function returning the chunks written before it,
+          followed by an empty line
+    Yields:
+       chunks: pieces of the output file in order
+    """
+    pending = dict(inserts)
+    for line in template_text.splitlines(keepends=True):
+        for key in list(pending):
+            if line.startswith(key):
+                yield from pending.pop(key)()
+                yield "\n\n"
+        yield line
+
+
+def iter_appended(template_text: str, chunks: Iterable[str]) -> Iterator[str]:
+    """Streams a template followed by an empty line and the generated chunks"""
+    yield template_text
+    yield "\n"
+    yield from chunks
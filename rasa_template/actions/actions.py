@@ -1,15 +1,37 @@
 # revised g0
 
+import gc
+import os
 from typing import Any, Text, Dict, List, Union, Optional
 
-import rasa.core.tracker_store
-from rasa.shared.core.trackers import DialogueStateTracker
 from rasa_sdk import Action, Tracker
 from rasa_sdk.executor import CollectingDispatcher
 # from rasa_sdk.forms import FormAction
-from datetime import datetime, timezone, timedelta
 #import panda as pd
-from nrclex import NRCLex
+
+from .conversation_log import ConversationLog
+from .conversation_sinks import make_sinks
+from .dna_screen import DNA_SCREEN_FILE, DnaScreen
+from .emotion import load_lexicon, score_message
+from .retrieval_index import RETRIEVAL_INDEX_FILE, RetrievalIndex
+from .worker_pool import run_blocking
+
+# shared by every call of action_save_conversation, writes to the working directory of the action server.
+# CHAT_LOG_SINKS lists where turns are logged, any of csv (chats.csv), sqlite (chats.sqlite) and parquet (chats_parquet/)
+conversation_log = ConversationLog(make_sinks(os.environ.get("CHAT_LOG_SINKS", "csv")))
+# questions and paraphrases written by configure_rasa, None if the chatbot was built without it.
+# A message is answered with the intent of its closest question if their similarity is at least RETRIEVAL_THRESHOLD.
+# 0.7 was chosen with benchmarks/bench_retrieval_threshold.py on the bundled questions and paraphrases: it answers 88% of
+# held-out paraphrases with their own intent, and 7% of the texts of an intent left out of the index with another one (23% at 0.5)
+retrieval_index = RetrievalIndex.load(RETRIEVAL_INDEX_FILE)
+RETRIEVAL_THRESHOLD = float(os.environ.get("RETRIEVAL_THRESHOLD", "0.7"))
+# questions that should not be answered, a message the screen blocks is never answered from the retrieval index
+dna_screen = DnaScreen.load(DNA_SCREEN_FILE)
+# loads the emotion lexicon when the action server starts instead of on the first message
+load_lexicon()
+# objects created while loading the actions live as long as the server, moving them out of the garbage
+# collector's reach keeps full collections, which stall every running action, short
+gc.freeze()
 
 
 class ActionSaveConversation(Action):
@@ -17,52 +39,13 @@ class ActionSaveConversation(Action):
     def name(self) -> Text:
         return "action_save_conversation"
 
-    def run(self, dispatcher: CollectingDispatcher,
+    async def run(self, dispatcher: CollectingDispatcher,
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
-        #now = datetime.now()
-        #input_time = now.strftime("%H:%M:%S")
-        
-        conversation_id = str(tracker.sender_id)
-        conversation = tracker.events
-        #input_str_u = tracker.latest_message.get('text')
-         
-        count_u = 0
-        count_b = 0
-        # print(conversation)
-        import os
-        if not os.path.isfile('chats.csv'):
-            with open('chats.csv','w') as file:
-                file.write("input_time|conversation_id|count|intent|user_input| entity_name|entity_value|action|bot_reply|\n")
-        chat_data=''
-        for i in conversation:
-            now = datetime.now()
-            input_time = now.astimezone(timezone(timedelta(hours=-4))).strftime('%Y-%m-%d %H:%M:%S.%f')
-            if i['event'] == 'user':
-               str_count_u = 'U'+str(count_u)
-               chat_data+= input_time+'|' + conversation_id + '|' + str_count_u+'|' +i['parse_data']['intent']['name']+'|' + i['text'] +'|' + '\n'
-               count_u = count_u+ 1
-               print('user: {}'.format(i['text']))
-               if len(i['parse_data']['entities']) > 0:
-                    chat_data += i['parse_data']['entities'][0]['entity']+'|'+i['parse_data']['entities'][0]['value']+'|'
-                    print('extra data:', i['parse_data']['entities'][0]['entity'], '=',
-                          i['parse_data']['entities'][0]['value'])
-               else:
-                    chat_data+=""
-            elif i['event'] == 'bot':
-                str_count_b = 'B'+str(count_b)
-                print('Bot: {}'.format(i['text']))
-                try:
-                    chat_data+=input_time+'|' + conversation_id + '|' + str_count_b+'|' +'|'+'|' + '|' +'|' + i['metadata']['utter_action']+'|'+ i['text'] + '\n'
-                    count_b = count_b+ 1
-                except KeyError:
-                    pass
-        else:
-            with open('chats.csv','a') as file:
-                file.write(chat_data)
+        # only the events since the last call for this conversation are formatted, the file is written in the background
+        await run_blocking(conversation_log.log, str(tracker.sender_id), tracker.events)
 
         dispatcher.utter_message(text="")
-        
 
         return []
 
@@ -83,13 +66,40 @@ class ActionEmotion(Action):
     def name(self) -> Text:
         return "action_emotion"
 
-    def run(self, dispatcher: CollectingDispatcher,
+    async def run(self, dispatcher: CollectingDispatcher,
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
-        text = str(tracker.latest_message["text"])
-        emotion = NRCLex(text)
-        dispatcher.utter_message(text="The affect frequencies are: {}".format(emotion.affect_frequencies))
-        dispatcher.utter_message(text="Top emotions detected are: {}".format(emotion.top_emotions))
+        # the lexicon is loaded once per process and repeated messages are scored from a cache
+        scores = await run_blocking(score_message, str(tracker.latest_message["text"]))
+        dispatcher.utter_message(text="The affect frequencies are: {}".format(dict(scores.affect_frequencies)))
+        dispatcher.utter_message(text="Top emotions detected are: {}".format(list(scores.top_emotions)))
+
+        return []
+
+
+class ActionRetrievalFallback(Action):
+
+    def name(self) -> Text:
+        return "action_retrieval_fallback"
+
+    async def run(self, dispatcher: CollectingDispatcher,
+            tracker: Tracker,
+            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+
+        # the nlu model wasn't confident, so the message is compared with every known question and paraphrase.
+        # Only the response of an intent is given, never the text of a question, so every answer keeps its source
+        text = str(tracker.latest_message.get("text") or "")
+        if dna_screen is not None and dna_screen.match(text):
+            dispatcher.utter_message(response="utter_Do not answer")
+            return []
+
+        matches = []
+        if retrieval_index is not None:
+            matches = await run_blocking(retrieval_index.search, text, 1)
+        if matches and matches[0].score >= RETRIEVAL_THRESHOLD:
+            dispatcher.utter_message(response="utter_{}".format(matches[0].intent))
+        else:
+            dispatcher.utter_message(response="utter_out_of_scope")
 
         return []
@@ -0,0 +1,303 @@
+"""Append-only conversation log: turns for new tracker events are queued and written to the sinks by a background thread"""
+
+import atexit
+import bisect
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Text, Tuple, Union
+
+from .conversation_sinks import ConversationSink, CsvSink, Turn
+
+logger = logging.getLogger(__name__)
+
+# how much of every conversation is already logged, shared by all sinks
+OFFSETS_FILE = "chats.offsets.sqlite"
+# where earlier versions kept the offsets, imported when the database is created
+LEGACY_OFFSETS_FILE = "chats.offsets.json"
+
+# turns are written once this many are queued, or FLUSH_INTERVAL seconds after the first of them
+FLUSH_ROWS = 256
+FLUSH_INTERVAL = 1.0
+# conversations without a new event for this many seconds are dropped from memory, and read back from the
+# offsets database if they continue. Far longer than FLUSH_INTERVAL, so their last batch has been saved by then
+SENDER_IDLE_SECONDS = 600
+# turns a failing sink keeps for the next attempt, beyond this the oldest of them are dropped
+MAX_UNWRITTEN_ROWS = 100_000
+
+
+class SenderState:
+    """How much of a conversation has been logged"""
+
+    def __init__(self, offset: int = 0, last_timestamp: Optional[float] = None, count_u: int = 0, count_b: int = 0):
+        # number of tracker events already logged, and the timestamp of the last of them
+        self.offset = offset
+        self.last_timestamp = last_timestamp
+        # numbers of the next user message and bot reply, logged as U<n> and B<n>
+        self.count_u = count_u
+        self.count_b = count_b
+        # monotonic time of the last call of ConversationLog.log for the conversation, not saved
+        self.last_seen = time.monotonic()
+
+    def to_list(self):
+        return [self.offset, self.last_timestamp, self.count_u, self.count_b]
+
+
+class OffsetStore:
+    """Saves the SenderState of every conversation in a SQLite table. Each batch of the writer thread updates
+    only the conversations it logged, in one transaction, and states are read one conversation at a time"""
+
+    SCHEMA = """CREATE TABLE IF NOT EXISTS offsets (
+        conversation_id TEXT PRIMARY KEY,
+        event_offset INTEGER NOT NULL,
+        last_timestamp REAL,
+        count_u INTEGER NOT NULL,
+        count_b INTEGER NOT NULL
+    )"""
+
+    def __init__(self, path: Text = OFFSETS_FILE, legacy_path: Optional[Text] = LEGACY_OFFSETS_FILE):
+        created = not os.path.exists(path)
+        # used by the action threads and the writer thread, one at a time
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute(self.SCHEMA)
+        if created and legacy_path and os.path.exists(legacy_path):
+            with open(legacy_path, "r") as f:
+                self.save(json.load(f))
+
+    def get(self, conversation_id: Text) -> Optional[SenderState]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT event_offset, last_timestamp, count_u, count_b FROM offsets WHERE conversation_id = ?",
+                (conversation_id,),
+            ).fetchone()
+        return SenderState(*row) if row is not None else None
+
+    def save(self, offsets: Dict[Text, list]):
+        """Saves the states of the given conversations, as lists from SenderState.to_list"""
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO offsets VALUES (?, ?, ?, ?, ?)",
+                [(conversation_id, *state) for conversation_id, state in offsets.items()],
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def get_turns(conversation_id: Text, events: List[Dict[Text, Any]], state: SenderState):
+    """Converts user messages and bot replies to turns, advancing the message counters of state
+    Args:
+       conversation_id: sender id of the conversation
+       events: tracker events that have not been logged yet
+       state: logging state of the conversation
+    Returns:
+       turns: list of Turn in order of the events
+    """
+    turns = []
+    now = time.time()
+    for event in events:
+        if event.get("event") == "user":
+            parse_data = event.get("parse_data") or {}
+            entities = parse_data.get("entities") or []
+            turns.append(
+                Turn(
+                    conversation_id,
+                    f"U{state.count_u}",
+                    event.get("timestamp") or now,
+                    intent=(parse_data.get("intent") or {}).get("name"),
+                    user_input=event.get("text"),
+                    entity_name=entities[0]["entity"] if entities else None,
+                    entity_value=str(entities[0]["value"]) if entities else None,
+                )
+            )
+            state.count_u += 1
+        elif event.get("event") == "bot":
+            utter_action = (event.get("metadata") or {}).get("utter_action")
+            # replies that don't come from a response in the domain are not logged
+            if utter_action is None:
+                continue
+            turns.append(
+                Turn(
+                    conversation_id,
+                    f"B{state.count_b}",
+                    event.get("timestamp") or now,
+                    action=utter_action,
+                    bot_reply=event.get("text"),
+                )
+            )
+            state.count_b += 1
+    return turns
+
+
+def find_new_events(events: List[Dict[Text, Any]], state: SenderState):
+    """Returns the position of the first event that was not logged yet.
+    Usually that is the saved offset, but if the event list was restarted or the server lost its state
+    the position is found again from the timestamp of the last logged event."""
+    offset = state.offset
+    if offset == 0 or (
+        offset <= len(events) and events[offset - 1].get("timestamp") == state.last_timestamp
+    ):
+        return offset
+    if state.last_timestamp is None:
+        return 0
+    # events of a tracker are ordered by time
+    timestamps = [event.get("timestamp") or 0 for event in events]
+    return bisect.bisect_right(timestamps, state.last_timestamp)
+
+
+class ConversationLog:
+    """Appends the new events of every conversation to the log file without blocking the action server.
+
+    The action only converts the events it has not seen before and queues the turns, a daemon thread
+    writes them to every sink in batches. Offsets are also saved to a database, so a restarted server continues
+    where it stopped instead of logging whole conversations again. Only conversations active in the last
+    sender_idle_seconds are kept in memory, older ones are read back from the database when they continue.
+    """
+
+    def __init__(
+        self,
+        sinks: Optional[List[ConversationSink]] = None,
+        offsets_path: Text = OFFSETS_FILE,
+        flush_rows: int = FLUSH_ROWS,
+        flush_interval: float = FLUSH_INTERVAL,
+        sender_idle_seconds: float = SENDER_IDLE_SECONDS,
+    ):
+        self.sinks = sinks if sinks is not None else [CsvSink()]
+        self.offsets = OffsetStore(offsets_path)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.sender_idle_seconds = sender_idle_seconds
+
+        # state of the recently active conversations as seen by log(), least recently active first
+        self.senders: "OrderedDict[Text, SenderState]" = OrderedDict()
+        # turns each sink failed to write, and offsets waiting until every sink has written the turns before them
+        self.unwritten: List[List[Turn]] = [[] for _ in self.sinks]
+        self.unsaved_offsets: Dict[Text, list] = {}
+        # log() may be called from several worker threads, two calls for one conversation must not log its events twice
+        self.lock = threading.Lock()
+
+        # holds (turns, conversation_id, state) tuples, Events set once everything before them is written, and None to stop
+        self.queue: "queue.Queue[Union[Tuple[List[Turn], Text, list], threading.Event, None]]" = queue.Queue()
+        self.thread = threading.Thread(target=self.write_loop, name="conversation-log", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def log(self, conversation_id: Text, events: List[Dict[Text, Any]]):
+        """Queues turns for the events of a conversation that were not logged by an earlier call
+        Args:
+           conversation_id: sender id of the conversation
+           events: every event of the tracker, only the ones after the saved offset are formatted
+        Returns:
+           count: number of turns queued
+        """
+        with self.lock:
+            state = self.get_state(conversation_id)
+            start = find_new_events(events, state)
+            if start >= len(events):
+                return 0
+            turns = get_turns(conversation_id, events[start:], state)
+            state.offset = len(events)
+            state.last_timestamp = events[-1].get("timestamp")
+            self.queue.put((turns, conversation_id, state.to_list()))
+        return len(turns)
+
+    def get_state(self, conversation_id: Text):
+        """Returns the state of a conversation from memory or the offsets database, and drops idle conversations"""
+        now = time.monotonic()
+        state = self.senders.pop(conversation_id, None)
+        if state is None:
+            # while a sink is failing the newest offsets are not saved yet, the database would log the events again
+            unsaved = self.unsaved_offsets.get(conversation_id)
+            state = SenderState(*unsaved) if unsaved is not None else self.offsets.get(conversation_id) or SenderState()
+        state.last_seen = now
+        self.senders[conversation_id] = state
+        # the conversation was just moved to the end, so the loop stops at it
+        while len(self.senders) > 1:
+            oldest = next(iter(self.senders.values()))
+            if now - oldest.last_seen < self.sender_idle_seconds:
+                break
+            self.senders.popitem(last=False)
+        return state
+
+    def write_loop(self):
+        pending: List[Turn] = []
+        offsets: Dict[Text, list] = {}
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+            if isinstance(item, tuple) and item:
+                turns, conversation_id, state = item
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                pending.extend(turns)
+                offsets[conversation_id] = state
+                if len(pending) < self.flush_rows and time.monotonic() < deadline:
+                    continue
+
+            if offsets:
+                self.write(pending, offsets)
+                pending, offsets, deadline = [], {}, None
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                if any(self.unwritten):
+                    self.write([], {})
+                for sink in self.sinks:
+                    sink.close()
+                self.offsets.close()
+                return
+
+    def write(self, turns: List[Turn], offsets: Dict[Text, list]):
+        for i, sink in enumerate(self.sinks):
+            batch = self.unwritten[i] + turns
+            try:
+                sink.write(batch)
+                self.unwritten[i] = []
+            except Exception:
+                # one failing sink should not stop the others or the writer thread, it gets the turns again with the next batch
+                logger.exception("Could not write %d turns to the conversation log %s", len(batch), type(sink).__name__)
+                if len(batch) > MAX_UNWRITTEN_ROWS:
+                    logger.error(
+                        "Dropping %d turns the conversation log %s could not write",
+                        len(batch) - MAX_UNWRITTEN_ROWS,
+                        type(sink).__name__,
+                    )
+                    batch = batch[-MAX_UNWRITTEN_ROWS:]
+                self.unwritten[i] = batch
+
+        # offsets are saved only once every sink has written the turns before them, so if the server stops while
+        # a sink is failing, the turns it missed are logged again after the restart, also to the other sinks
+        self.unsaved_offsets.update(offsets)
+        if any(self.unwritten):
+            return
+        try:
+            self.offsets.save(self.unsaved_offsets)
+            self.unsaved_offsets = {}
+        except sqlite3.Error:
+            logger.exception("Could not save the conversation log offsets of %d conversations", len(self.unsaved_offsets))
+
+    def flush(self, timeout: Optional[float] = None):
+        """Blocks until every turn queued so far is written, returns False if that took longer than timeout"""
+        written = threading.Event()
+        self.queue.put(written)
+        return written.wait(timeout)
+
+    def close(self):
+        """Writes the queued turns, closes the sinks and stops the writer thread"""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=5)
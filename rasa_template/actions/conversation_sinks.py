@@ -0,0 +1,222 @@
+"""Storage backends for the conversation log: a pipe separated csv like the original chats.csv, an indexed SQLite database,
+and an optional rolling Parquet export for analytics"""
+
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import List, NamedTuple, Optional, Text
+
+LOG_HEADER = "input_time|conversation_id|count|intent|user_input| entity_name|entity_value|action|bot_reply|\n"
+# times in the csv log are written in UTC-4
+LOG_TIMEZONE = timezone(timedelta(hours=-4))
+
+SINKS = ["csv", "sqlite", "parquet"]
+
+
+class Turn(NamedTuple):
+    """A user message or a bot reply, the fields that don't apply to it are None"""
+
+    conversation_id: Text
+    # U<n> for the n-th user message of the conversation, B<n> for the n-th bot reply
+    turn: Text
+    # unix time of the event
+    timestamp: float
+    intent: Optional[Text] = None
+    user_input: Optional[Text] = None
+    entity_name: Optional[Text] = None
+    entity_value: Optional[Text] = None
+    action: Optional[Text] = None
+    bot_reply: Optional[Text] = None
+
+
+def format_time(timestamp: float):
+    return datetime.fromtimestamp(timestamp, LOG_TIMEZONE).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+class ConversationSink(ABC):
+    """Receives batches of turns from the writer thread of ConversationLog, always from that same thread"""
+
+    @abstractmethod
+    def write(self, turns: List[Turn]):
+        """Writes a batch of turns. If it raises, the same turns are passed again in front of the next batch,
+        so a sink that can fail halfway through a batch should write it in one transaction"""
+
+    def close(self):
+        pass
+
+
+class CsvSink(ConversationSink):
+    """Appends turns to a pipe separated file in the layout of the original chats.csv.
+    Text is written as it is, so a | or a line break in a message shifts the columns of its row,
+    use the SQLite sink to analyze the log."""
+
+    def __init__(self, path: Text = "chats.csv"):
+        self.path = path
+
+    @staticmethod
+    def format_row(turn: Turn):
+        if turn.turn.startswith("U"):
+            row = f"{format_time(turn.timestamp)}|{turn.conversation_id}|{turn.turn}|{turn.intent or ''}|{turn.user_input or ''}|"
+            if turn.entity_name is not None:
+                row += f"{turn.entity_name}|{turn.entity_value}|"
+            return row + "\n"
+        return f"{format_time(turn.timestamp)}|{turn.conversation_id}|{turn.turn}|||||{turn.action or ''}|{turn.bot_reply or ''}\n"
+
+    def write(self, turns: List[Turn]):
+        new_file = not os.path.isfile(self.path)
+        with open(self.path, "a") as f:
+            if new_file:
+                f.write(LOG_HEADER)
+            f.write("".join(map(self.format_row, turns)))
+
+
+class SqliteSink(ConversationSink):
+    """Inserts turns into a table indexed by conversation and time. The database runs in WAL mode,
+    so analytics queries can read it while the action server writes, and every batch is one transaction."""
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS turns (
+            conversation_id TEXT NOT NULL,
+            turn TEXT NOT NULL,
+            timestamp REAL NOT NULL,
+            intent TEXT,
+            user_input TEXT,
+            entity_name TEXT,
+            entity_value TEXT,
+            action TEXT,
+            bot_reply TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS turns_by_conversation ON turns (conversation_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS turns_by_time ON turns (timestamp)",
+    ]
+
+    def __init__(self, path: Text = "chats.sqlite"):
+        self.path = path
+        self.connection: Optional[sqlite3.Connection] = None
+
+    def connect(self):
+        # opened on first write, sqlite connections may only be used by the thread that created them
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # with WAL a commit can't corrupt the database on a crash, it may only lose the last transactions
+        connection.execute("PRAGMA synchronous=NORMAL")
+        with connection:
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+        return connection
+
+    def write(self, turns: List[Turn]):
+        if self.connection is None:
+            self.connection = self.connect()
+        with self.connection:
+            self.connection.executemany("INSERT INTO turns VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", turns)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class ParquetSink(ConversationSink):
+    """Exports turns to Parquet files in a directory, starting a new file after roll_rows turns or roll_seconds after
+    the first turn of a file arrived. A file is written under a .inprogress name and renamed to .parquet once it is
+    complete, so readers only see whole files. Turns are kept in memory until a row group is full or the file is rolled,
+    this is an export for analytics next to the csv or SQLite sink, not the only copy of the log. Needs pyarrow."""
+
+    def __init__(
+        self,
+        directory: Text = "chats_parquet",
+        roll_rows: int = 1_000_000,
+        roll_seconds: float = 24 * 3600,
+        row_group_rows: int = 50_000,
+    ):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise RuntimeError("The parquet conversation log needs pyarrow, install it with pip install pyarrow") from e
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.schema = pyarrow.schema(
+            [("conversation_id", pyarrow.string()), ("turn", pyarrow.string()), ("timestamp", pyarrow.float64())]
+            + [(field, pyarrow.string()) for field in Turn._fields[3:]]
+        )
+
+        self.directory = directory
+        self.roll_rows = roll_rows
+        self.roll_seconds = roll_seconds
+        self.row_group_rows = row_group_rows
+        os.makedirs(directory, exist_ok=True)
+
+        self.buffer: List[Turn] = []
+        self.writer = None
+        self.part_path = ""
+        self.part_rows = 0
+        # when the first turn of the current file arrived, also while all its turns are still in the buffer
+        self.part_started = 0.0
+
+    def write(self, turns: List[Turn]):
+        # a due file is finished before the new turns are touched, and they are only added to the buffer once they are
+        # buffered or written, so if anything raises they can be passed again without being exported twice
+        if (self.writer is not None or self.buffer) and (
+            self.part_rows + len(self.buffer) >= self.roll_rows
+            or time.monotonic() - self.part_started >= self.roll_seconds
+        ):
+            self.roll()
+        if not turns:
+            return
+        if self.writer is None and not self.buffer:
+            self.part_started = time.monotonic()
+        buffer = self.buffer + turns
+        if len(buffer) >= self.row_group_rows:
+            self.write_row_group(buffer)
+        else:
+            self.buffer = buffer
+
+    def write_row_group(self, turns: List[Turn]):
+        if not turns:
+            return
+        if self.writer is None:
+            name = datetime.now(timezone.utc).strftime("turns-%Y%m%dT%H%M%S%f")
+            self.part_path = os.path.join(self.directory, name)
+            self.writer = self.pq.ParquetWriter(self.part_path + ".inprogress", self.schema)
+            self.part_rows = 0
+        # sorted row groups let readers skip them using the min and max statistics of the index columns
+        turns = sorted(turns, key=lambda turn: (turn.conversation_id, turn.timestamp))
+        columns = {field: [getattr(turn, field) for turn in turns] for field in Turn._fields}
+        self.writer.write_table(self.pa.Table.from_pydict(columns, schema=self.schema))
+        self.part_rows += len(turns)
+        self.buffer = []
+
+    def roll(self):
+        self.write_row_group(self.buffer)
+        if self.writer is not None:
+            self.writer.close()
+            os.replace(self.part_path + ".inprogress", self.part_path + ".parquet")
+            self.writer = None
+
+    def close(self):
+        self.roll()
+
+
+def make_sinks(names: Text, directory: Text = "."):
+    """Creates the sinks listed in names
+    Args:
+       names: comma separated names from SINKS, such as "csv" or "sqlite,parquet"
+       directory: directory of chats.csv, chats.sqlite and the chats_parquet directory
+    Returns:
+       sinks: list of ConversationSink
+    """
+    factories = {
+        "csv": lambda: CsvSink(os.path.join(directory, "chats.csv")),
+        "sqlite": lambda: SqliteSink(os.path.join(directory, "chats.sqlite")),
+        "parquet": lambda: ParquetSink(os.path.join(directory, "chats_parquet")),
+    }
+    sinks = []
+    for name in (name.strip().lower() for name in names.split(",")):
+        if name not in factories:
+            raise RuntimeError(f"Unknown conversation log sink {name}, expected some of {SINKS}")
+        sinks.append(factories[name]())
+    return sinks
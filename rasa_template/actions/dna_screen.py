@@ -0,0 +1,153 @@
+"""Screening of questions that should not be answered, the questions of DNA.csv, before they reach the NLU model.
+
+A message is blocked if its normalized text is one of the questions, or if it contains one of them as a whole sequence
+of words, found with a word level Aho-Corasick automaton in one pass over the message.
+configure_rasa compiles the screen and writes it to dna_screen.json in the Chatbot directory. The Alexa connector,
+the DnaScreenClassifier NLU component and action_retrieval_fallback load it.
+"""
+
+import hashlib
+import json
+import os
+import string
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Text, Tuple
+
+DNA_SCREEN_FILE = "dna_screen.json"
+DNA_SCREEN_VERSION = 1
+
+# translation table that deletes all ASCII punctuation
+punctuation_table = str.maketrans("", "", string.punctuation)
+
+
+def normalize_text(text: Text):
+    """Lowercases text, removes punctuation and collapses whitespace, the same normalization as faq_index.normalize_text"""
+    return " ".join(text.lower().translate(punctuation_table).split())
+
+
+def text_hash(normalized: Text):
+    # 64 bits keep the file small, a collision with a benign message is as unlikely as it gets
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def build_automaton(phrases: Iterable[List[Text]]):
+    """Compiles phrases into an Aho-Corasick automaton over words
+    Args:
+       phrases: every phrase as a list of words
+    Returns:
+       (goto, fail, out): transitions of every state by word, the state to continue from when no transition matches,
+          and the number of words of the longest phrase ending in every state, 0 if none does. State 0 is the start
+    """
+    goto: List[Dict[Text, int]] = [{}]
+    out: List[int] = [0]
+    for words in phrases:
+        state = 0
+        for word in words:
+            next_state = goto[state].get(word)
+            if next_state is None:
+                next_state = len(goto)
+                goto[state][word] = next_state
+                goto.append({})
+                out.append(0)
+            state = next_state
+        if words:
+            out[state] = max(out[state], len(words))
+
+    # breadth first, the fail state of a state is the state of the longest proper suffix of its words
+    fail = [0] * len(goto)
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for word, next_state in goto[state].items():
+            queue.append(next_state)
+            fallback = fail[state]
+            while fallback and word not in goto[fallback]:
+                fallback = fail[fallback]
+            fail[next_state] = goto[fallback].get(word, 0)
+            # a phrase ending in the suffix also ends here
+            out[next_state] = max(out[next_state], out[fail[next_state]])
+    return goto, fail, out
+
+
+def build_dna_screen(questions: Iterable[Text], response: Text, phrases: Iterable[Text] = ()):
+    """Compiles the screen of the questions that should not be answered
+    Args:
+       questions: questions that should not be answered, a message made of one of them is blocked
+       response: reply of the bot to a blocked message, the response of the "Do not answer" intent
+       phrases: further phrases that block every message containing them, besides the questions
+    Returns:
+       screen: dictionary that can be saved as json and loaded with DnaScreen
+    """
+    normalized = [normalize_text(question) for question in questions]
+    normalized += [normalize_text(phrase) for phrase in phrases]
+    normalized = sorted({text for text in normalized if text})
+    goto, fail, out = build_automaton(text.split() for text in normalized)
+    return {
+        "version": DNA_SCREEN_VERSION,
+        "response": response,
+        "hashes": sorted({text_hash(text) for text in normalized}),
+        "goto": goto,
+        "fail": fail,
+        "out": out,
+    }
+
+
+def iter_dna_screen_json(screen: dict):
+    """Streams the screen as json, for writing it with the other generated files of the chatbot"""
+    yield json.dumps(screen, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+class DnaScreen:
+    """Tells whether a message asks one of the questions that should not be answered, and counts blocked messages"""
+
+    def __init__(self, screen: dict):
+        self.response: Text = screen["response"]
+        self.hashes = frozenset(screen["hashes"])
+        self.goto: List[Dict[Text, int]] = screen["goto"]
+        self.fail: List[int] = screen["fail"]
+        self.out: List[int] = screen["out"]
+        self.checked = 0
+        self.blocked = 0
+        self.total_seconds = 0.0
+
+    @classmethod
+    def load(cls, path: Text = DNA_SCREEN_FILE):
+        """Returns the screen saved at path, or None if there is none or it was written by another version"""
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            screen = json.load(f)
+        if screen.get("version") != DNA_SCREEN_VERSION:
+            return None
+        return cls(screen)
+
+    def find_phrase(self, words: List[Text]) -> Optional[Tuple[int, int]]:
+        """Returns (start, end) of the first phrase found in words, None if there is none"""
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for position, word in enumerate(words):
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            if out[state]:
+                return position + 1 - out[state], position + 1
+        return None
+
+    def match(self, text: Text):
+        """True if text should not be answered"""
+        start = time.perf_counter()
+        normalized = normalize_text(text)
+        blocked = text_hash(normalized) in self.hashes or self.find_phrase(normalized.split()) is not None
+        self.checked += 1
+        self.blocked += blocked
+        self.total_seconds += time.perf_counter() - start
+        return blocked
+
+    def stats(self):
+        return {
+            "states": len(self.goto),
+            "checked": self.checked,
+            "blocked": self.blocked,
+            "mean_us": self.total_seconds / self.checked * 1e6 if self.checked else 0.0,
+        }
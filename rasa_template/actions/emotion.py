@@ -0,0 +1,167 @@
+"""Emotion scores from the NRC emotion lexicon, for live messages in action_emotion and in batches for conversation logs.
+
+The lexicon of nrclex is loaded once per process, and messages are tokenized with a regular expression instead of
+constructing an NRCLex object, which runs TextBlob's sentence and word tokenizers for every message.
+Scores follow NRCLex: the share of each emotion among all lexicon emotions of the words in a message.
+"""
+
+import argparse
+import re
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Text, Tuple
+
+import numpy as np
+
+# emotions in the order NRCLex lists them in affect_frequencies
+EMOTIONS = ["fear", "anger", "anticipation", "trust", "surprise", "positive", "negative", "sadness", "disgust", "joy"]
+# words of the lexicon are lowercase letters only. Like TextBlob's tokenizer, hyphenated words are kept whole,
+# and letters inside URLs, email addresses, paths and abbreviations such as a.m. are not words
+TOKEN_PATTERN = re.compile(r"(?<![\w./:@])[^\W\d_]+(?:-[^\W\d_]+)*(?![\w/:-]|\.\w)")
+# distinct messages whose scores are kept by score_message
+SCORE_CACHE_SIZE = 4096
+
+
+class EmotionScores(NamedTuple):
+    """Emotions of a message, as (emotion, value) pairs so that cached scores can't be changed by callers"""
+
+    # share of every emotion in EMOTIONS, all 0.0 if no word of the message is in the lexicon
+    affect_frequencies: Tuple[Tuple[Text, float], ...]
+    # emotions with the highest share, with their share
+    top_emotions: Tuple[Tuple[Text, float], ...]
+
+
+@lru_cache(maxsize=None)
+def load_lexicon():
+    """Loads the NRC lexicon once per process
+    Returns:
+       (word_ids, matrix): dictionary mapping every word of the lexicon to a row of matrix,
+          and a (words x EMOTIONS) array with 1 where the word is associated with the emotion
+    """
+    from nrclex import NRCLex
+
+    word_ids = {word: i for i, word in enumerate(NRCLex.lexicon)}
+    matrix = np.zeros((len(word_ids), len(EMOTIONS)), dtype=np.float64)
+    columns = {emotion: j for j, emotion in enumerate(EMOTIONS)}
+    for word, emotions in NRCLex.lexicon.items():
+        for emotion in emotions:
+            matrix[word_ids[word], columns[emotion]] = 1.0
+    return word_ids, matrix
+
+
+def tokenize(text: Text):
+    # TextBlob splits don't into do and n't, without this don would be found in the lexicon
+    return TOKEN_PATTERN.findall(text.lower().replace("n't", " n't").replace("n\u2019t", " n\u2019t"))
+
+
+def to_scores(raw_scores: np.ndarray):
+    """Turns emotion counts of one message into EmotionScores"""
+    total = raw_scores.sum()
+    frequencies = raw_scores / total if total else raw_scores
+    top = frequencies.max()
+    return EmotionScores(
+        tuple(zip(EMOTIONS, frequencies.tolist())),
+        tuple((emotion, value) for emotion, value in zip(EMOTIONS, frequencies.tolist()) if value == top),
+    )
+
+
+@lru_cache(maxsize=SCORE_CACHE_SIZE)
+def score_message(text: Text):
+    """Scores a single message, repeated messages such as greetings are answered from an LRU cache
+    Args:
+       text: message of the user
+    Returns:
+       scores: EmotionScores of the message
+    """
+    word_ids, matrix = load_lexicon()
+    ids = [word_ids[token] for token in tokenize(text) if token in word_ids]
+    return to_scores(matrix[ids].sum(axis=0))
+
+
+def raw_emotion_counts(texts: Iterable[Text]):
+    """Counts the lexicon emotions of every message with one lookup over all words
+    Args:
+       texts: messages to score
+    Returns:
+       counts: (messages x EMOTIONS) array, how many words of each message are associated with each emotion
+    """
+    word_ids, matrix = load_lexicon()
+    message_ids: List[int] = []
+    lexicon_ids: List[int] = []
+    count = 0
+    for i, text in enumerate(texts):
+        count += 1
+        for token in tokenize(text):
+            word_id = word_ids.get(token)
+            if word_id is not None:
+                message_ids.append(i)
+                lexicon_ids.append(word_id)
+
+    rows = np.asarray(message_ids, dtype=np.int64)
+    words = matrix[np.asarray(lexicon_ids, dtype=np.int64)]
+    counts = np.empty((count, len(EMOTIONS)))
+    for j in range(len(EMOTIONS)):
+        counts[:, j] = np.bincount(rows, weights=words[:, j], minlength=count)
+    return counts
+
+
+def score_messages(texts: Iterable[Text]):
+    """Scores many messages at once, such as a whole conversation log
+    Args:
+       texts: messages to score
+    Returns:
+       frequencies: (messages x EMOTIONS) array with the same values as the affect_frequencies of score_message
+    """
+    counts = raw_emotion_counts(texts)
+    totals = counts.sum(axis=1, keepdims=True)
+    return np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+
+
+def score_log(path: Text = "chats.csv"):
+    """Scores the user messages of a conversation log written by the csv or SQLite sink
+    Args:
+       path: chats.csv, or a .sqlite database of the SQLite sink
+    Returns:
+       scores: pandas DataFrame with conversation_id, turn, user_input, one column per emotion
+          and top_emotion, the first emotion with the highest share or an empty string
+    """
+    import pandas as pd
+
+    if path.endswith(".sqlite"):
+        import sqlite3
+
+        with sqlite3.connect(path) as connection:
+            log = pd.read_sql(
+                "SELECT conversation_id, turn, timestamp, user_input FROM turns WHERE turn LIKE 'U%' ORDER BY timestamp",
+                connection,
+            )
+    else:
+        # quoting=3 (csv.QUOTE_NONE): messages are written without quotes, a " is part of the text.
+        # A | in a message splits it over two columns, only the part before it is scored
+        log = pd.read_csv(
+            path, sep="|", index_col=False, dtype=str, keep_default_na=False, quoting=3, on_bad_lines="skip"
+        )
+        log = log.loc[log["count"].str.startswith("U"), ["input_time", "conversation_id", "count", "user_input"]]
+        log = log.rename(columns={"count": "turn"}).reset_index(drop=True)
+
+    frequencies = score_messages(log["user_input"].fillna("").tolist())
+    scores = pd.concat([log, pd.DataFrame(frequencies, columns=EMOTIONS)], axis=1)
+    top = np.asarray(EMOTIONS, dtype=object)[frequencies.argmax(axis=1)] if len(frequencies) else []
+    scores["top_emotion"] = np.where(frequencies.max(axis=1, initial=0) > 0, top, "")
+    return scores
+
+
+parser = argparse.ArgumentParser(description="Scores the emotions of the user messages of a conversation log")
+parser.add_argument("log", nargs="?", default="chats.csv", help="chats.csv or chats.sqlite")
+parser.add_argument("-o", "--output", default="emotions.csv", help="CSV file the scores are written to")
+
+
+def main():
+    args = parser.parse_args()
+    scores = score_log(args.log)
+    scores.to_csv(args.output, index=False)
+    print(f"Scored {len(scores)} messages, written to {args.output}")
+    print(scores["top_emotion"].replace("", "none").value_counts().to_string())
+
+
+if __name__ == "__main__":
+    main()
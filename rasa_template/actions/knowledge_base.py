@@ -0,0 +1,133 @@
+"""Read-only knowledge base of the answers, summaries and provenance of every intent, in one binary file that processes
+memory-map instead of parsing. The Alexa connector reads the responses of its FAQ index from it, and every process
+that opens the file reads the same pages of the page cache. Opening the file takes the same time whatever its size,
+because nothing is read before it is looked up.
+
+configure_rasa writes the file to knowledge_base.bin in the Chatbot directory. Layout, all integers little endian:
+   header: the magic bytes SCKB, then version, number of intents and number of fields per intent as uint32
+   offsets: (intents x fields + 1) uint64, where the utf-8 text of every field starts, relative to the text section
+   text: the fields of every intent one after the other, intents sorted by the utf-8 bytes of their name
+"""
+
+import mmap
+import os
+import struct
+from typing import Iterable, NamedTuple, Optional, Text
+
+KNOWLEDGE_BASE_FILE = "knowledge_base.bin"
+KNOWLEDGE_BASE_VERSION = 1
+MAGIC = b"SCKB"
+HEADER = struct.Struct("<4sIII")
+OFFSET = struct.Struct("<Q")
+
+
+def get_response_text(source: Text, date: Text, answer: Text):
+    """Returns the reply of the bot to an intent, as written to domain.yml and the knowledge base"""
+    return f"[Source: {source}; Date: {date}] {answer}"
+
+
+class Entry(NamedTuple):
+    intent: Text
+    answer: Text
+    # summary of a long answer, "" if the answer is short enough to be given as it is
+    summary: Text
+    # where the answer comes from and its month and year, "" if unknown
+    source: Text
+    date: Text
+
+    def response(self):
+        """The reply of the bot to the intent, the same text as its response in domain.yml"""
+        return get_response_text(self.source, self.date, self.answer)
+
+
+FIELDS = len(Entry._fields)
+
+
+def iter_knowledge_base_bytes(entries: Iterable[Entry]):
+    """Streams the knowledge base file, for writing it with the other generated files of the chatbot
+    Args:
+       entries: one Entry per intent, the first one is kept if an intent is repeated
+    """
+    by_intent = {}
+    for entry in entries:
+        by_intent.setdefault(entry.intent.encode("utf-8"), entry)
+    intents = sorted(by_intent)
+
+    fields = [field.encode("utf-8") for intent in intents for field in by_intent[intent]]
+    yield HEADER.pack(MAGIC, KNOWLEDGE_BASE_VERSION, len(intents), FIELDS)
+    offset = 0
+    offsets = [0]
+    for field in fields:
+        offset += len(field)
+        offsets.append(offset)
+    yield struct.pack(f"<{len(offsets)}Q", *offsets)
+    yield from fields
+
+
+class KnowledgeBase:
+    """Looks up entries by intent in a memory-mapped knowledge base file"""
+
+    def __init__(self, path: Text = KNOWLEDGE_BASE_FILE):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, fields = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != KNOWLEDGE_BASE_VERSION or fields != FIELDS:
+            self.map.close()
+            raise ValueError(f"{path} is not a knowledge base of version {KNOWLEDGE_BASE_VERSION}")
+        self.offsets_start = HEADER.size
+        self.text_start = HEADER.size + (self.count * FIELDS + 1) * OFFSET.size
+
+    @classmethod
+    def load(cls, path: Text = KNOWLEDGE_BASE_FILE):
+        """Returns the knowledge base saved at path, or None if there is none or it was written by another version"""
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except ValueError:
+            return None
+
+    def field_bytes(self, index: int):
+        """utf-8 bytes of the field with the given index, counting all fields of all intents in order"""
+        start, end = struct.unpack_from("<QQ", self.map, self.offsets_start + index * OFFSET.size)
+        return self.map[self.text_start + start:self.text_start + end]
+
+    def find(self, intent: Text) -> Optional[int]:
+        """Returns the position of intent in the sorted intents, None if it isn't in the knowledge base"""
+        key = intent.encode("utf-8")
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.field_bytes(middle * FIELDS) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self.field_bytes(low * FIELDS) == key:
+            return low
+        return None
+
+    def get(self, intent: Text) -> Optional[Entry]:
+        """Returns the Entry of intent, None if it isn't in the knowledge base"""
+        position = self.find(intent)
+        if position is None:
+            return None
+        return Entry(*(self.field_bytes(position * FIELDS + i).decode("utf-8") for i in range(FIELDS)))
+
+    def response(self, intent: Text) -> Optional[Text]:
+        """Returns the reply of the bot to intent as in domain.yml, None if it isn't in the knowledge base"""
+        entry = self.get(intent)
+        return entry.response() if entry is not None else None
+
+    def __contains__(self, intent: Text):
+        return self.find(intent) is not None
+
+    def __len__(self):
+        return self.count
+
+    def intents(self):
+        """Yields every intent in the knowledge base, in the order of their utf-8 bytes"""
+        for position in range(self.count):
+            yield self.field_bytes(position * FIELDS).decode("utf-8")
+
+    def close(self):
+        self.map.close()
@@ -0,0 +1,232 @@
+"""Sparse retrieval over the known questions and their paraphrases, used by action_retrieval_fallback to answer messages
+the NLU model isn't confident about with the intent of the most similar known question.
+
+Questions are TF-IDF vectors of hashed character n-grams, which tolerate typos and word order changes.
+configure_rasa builds the index and writes it to retrieval_index.npz in the Chatbot directory, stored by feature
+(for every n-gram, the questions containing it and their weights), so scoring a message against every question is one
+sparse matrix-vector product over the few n-grams of the message. Only numpy is needed at runtime.
+"""
+
+import io
+import os
+import string
+import zipfile
+import zlib
+from typing import Dict, Iterable, List, NamedTuple, Text, Tuple
+
+import numpy as np
+
+RETRIEVAL_INDEX_FILE = "retrieval_index.npz"
+RETRIEVAL_INDEX_VERSION = 1
+# n-grams are hashed into this many features, a power of two
+N_FEATURES = 1 << 20
+NGRAM_SIZES = (3, 4)
+# n-grams in more questions than this are only scored for the candidates of a message, see RetrievalIndex.candidate_scores
+COMMON_POSTINGS = 2048
+CANDIDATES = 256
+
+# translation table that deletes all ASCII punctuation
+punctuation_table = str.maketrans("", "", string.punctuation)
+
+
+class Match(NamedTuple):
+    intent: Text
+    # cosine similarity of the message and the closest question of the intent, between 0 and 1
+    score: float
+
+
+def text_features(text: Text):
+    """Hashes the character n-grams of a message after the normalization of faq_index.normalize_text
+    Returns:
+       features: numpy array with the feature of every n-gram, with repeats
+    """
+    normalized = " ".join(text.lower().translate(punctuation_table).split())
+    if not normalized:
+        return np.empty(0, dtype=np.int64)
+    # spaces mark the start and end of the text, like the word boundaries inside it
+    padded = f" {normalized} "
+    grams = [padded[i:i + n] for n in NGRAM_SIZES for i in range(len(padded) - n + 1)]
+    return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.int64, count=len(grams)) & (
+        N_FEATURES - 1
+    )
+
+
+def sublinear_counts(features: np.ndarray):
+    """Returns the distinct features and 1 + log of how often each appears"""
+    unique, counts = np.unique(features, return_counts=True)
+    return unique, 1.0 + np.log(counts)
+
+
+def build_retrieval_index(entries: Iterable[Tuple[Text, List[Text]]]):
+    """Builds the TF-IDF index of all questions
+    Args:
+       entries: (intent, texts) for every intent, texts are its question and paraphrases
+    Returns:
+       index: dictionary of numpy arrays that can be saved with iter_retrieval_index_npz and loaded with RetrievalIndex
+    """
+    intents: List[Text] = []
+    intent_ids: Dict[Text, int] = {}
+    seen = set()
+    doc_intents: List[int] = []
+    doc_features: List[np.ndarray] = []
+    doc_counts: List[np.ndarray] = []
+    for intent, texts in entries:
+        intent_id = intent_ids.setdefault(intent, len(intents))
+        if intent_id == len(intents):
+            intents.append(intent)
+        for text in texts:
+            features = text_features(text)
+            # texts that only differ in case or punctuation have the same vector
+            key = (intent_id, features.tobytes())
+            if not len(features) or key in seen:
+                continue
+            seen.add(key)
+            unique, counts = sublinear_counts(features)
+            doc_intents.append(intent_id)
+            doc_features.append(unique)
+            doc_counts.append(counts)
+
+    n_docs = len(doc_intents)
+    lengths = np.fromiter(map(len, doc_features), dtype=np.int64, count=n_docs)
+    docs = np.repeat(np.arange(n_docs, dtype=np.int64), lengths)
+    features = np.concatenate(doc_features) if n_docs else np.empty(0, dtype=np.int64)
+    tf = np.concatenate(doc_counts) if n_docs else np.empty(0)
+
+    # smooth idf as in scikit-learn, every feature of a question appears once per question
+    feature_ids, positions, df = np.unique(features, return_inverse=True, return_counts=True)
+    idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+    weights = tf * idf[positions]
+    norms = np.sqrt(np.bincount(docs, weights=weights * weights, minlength=n_docs))
+    weights /= norms[docs]
+
+    # postings sorted by feature, the index is the transposed (features x questions) matrix in CSR form
+    order = np.lexsort((docs, positions))
+    postings_ptr = np.zeros(len(feature_ids) + 1, dtype=np.int64)
+    np.cumsum(df, out=postings_ptr[1:])
+    return {
+        "version": np.array(RETRIEVAL_INDEX_VERSION, dtype=np.int64),
+        "n_features": np.array(N_FEATURES, dtype=np.int64),
+        "intents": np.array(intents, dtype=str),
+        "doc_intents": np.array(doc_intents, dtype=np.int32),
+        "feature_ids": feature_ids.astype(np.int32),
+        "idf": idf.astype(np.float32),
+        "postings_ptr": postings_ptr,
+        "postings_doc": docs[order].astype(np.int32),
+        # half precision is plenty for cosine similarities compared to a threshold, and halves the file
+        "postings_weight": weights[order].astype(np.float16),
+    }
+
+
+def iter_retrieval_index_npz(index: Dict[Text, np.ndarray]):
+    """Streams the index as an uncompressed npz file, for writing it with the other generated files of the chatbot.
+    Unlike numpy.savez the entries carry a fixed date, so the same index always gives the same bytes."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for name in sorted(index):
+            with archive.open(zipfile.ZipInfo(name + ".npy", date_time=(1980, 1, 1, 0, 0, 0)), "w") as f:
+                np.lib.format.write_array(f, np.asanyarray(index[name]), allow_pickle=False)
+    yield buffer.getvalue()
+
+
+class RetrievalIndex:
+    """Finds the intents whose questions are most similar to a message"""
+
+    def __init__(self, index: Dict[Text, np.ndarray]):
+        self.intents: List[Text] = index["intents"].tolist()
+        self.doc_intents = index["doc_intents"]
+        self.feature_ids = index["feature_ids"]
+        self.idf = index["idf"].astype(np.float64)
+        self.postings_ptr = index["postings_ptr"]
+        self.postings_doc = index["postings_doc"]
+        self.postings_weight = index["postings_weight"].astype(np.float32)
+        self.n_docs = len(self.doc_intents)
+        # weight of n-grams that no question contains, they make a message less similar to every question
+        self.unseen_idf = np.log(1.0 + self.n_docs) + 1.0
+
+    @classmethod
+    def load(cls, path: Text = RETRIEVAL_INDEX_FILE):
+        """Returns the index saved at path, or None if there is none or it was written by another version"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as saved:
+            if int(saved["version"]) != RETRIEVAL_INDEX_VERSION or int(saved["n_features"]) != N_FEATURES:
+                return None
+            return cls({name: saved[name] for name in saved.files})
+
+    def query_weights(self, text: Text):
+        """Returns the positions in feature_ids of the n-grams of a message that some question contains,
+        and their weights in the normalized TF-IDF vector of the message"""
+        features, tf = sublinear_counts(text_features(text))
+        if not self.n_docs or not len(features):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        positions = np.searchsorted(self.feature_ids, features)
+        positions[positions == len(self.feature_ids)] = 0
+        known = self.feature_ids[positions] == features
+        weights = tf * np.where(known, self.idf[positions], self.unseen_idf)
+        return positions[known], weights[known] / np.sqrt(weights @ weights)
+
+    def accumulate(self, positions: np.ndarray, weights: np.ndarray):
+        """Sparse matrix-vector product of the index with a message vector, the score of every question as a numpy array"""
+        starts, ends = self.postings_ptr[positions], self.postings_ptr[positions + 1]
+        # gathers the postings of the message's n-grams, each scaled by the weight of its n-gram in the message
+        docs = [np.empty(0, dtype=np.int32)]
+        products = [np.empty(0)]
+        for start, end, weight in zip(starts.tolist(), ends.tolist(), weights.tolist()):
+            docs.append(self.postings_doc[start:end])
+            products.append(self.postings_weight[start:end] * weight)
+        return np.bincount(np.concatenate(docs), weights=np.concatenate(products), minlength=self.n_docs)
+
+    def scores(self, text: Text):
+        """Cosine similarity of the message with every question, as a numpy array"""
+        return self.accumulate(*self.query_weights(text))
+
+    def candidate_scores(self, text: Text):
+        """Cosine similarity of the message with the questions that may be closest to it.
+        N-grams such as " how" are in most questions, going through their postings would take most of the time of a query
+        in a large index. Candidates are the questions sharing the most of the message's other n-grams, and only
+        for them the common n-grams are looked up in their sorted postings. Questions sharing nothing but common n-grams
+        with the message are left out, they are far from any threshold worth answering with.
+        Returns:
+           (docs, scores): numpy arrays with the candidate questions and their similarity to the message
+        """
+        positions, weights = self.query_weights(text)
+        lengths = self.postings_ptr[positions + 1] - self.postings_ptr[positions]
+        common = lengths > COMMON_POSTINGS
+        if common.all():
+            # no selective n-gram, every question is scored
+            scores = self.accumulate(positions, weights)
+            docs = np.flatnonzero(scores)
+            return docs, scores[docs]
+
+        scores = self.accumulate(positions[~common], weights[~common])
+        docs = np.flatnonzero(scores)
+        if len(docs) > CANDIDATES:
+            docs = np.argpartition(-scores, CANDIDATES - 1)[:CANDIDATES]
+            # searchsorted is fastest when the values it looks up are sorted as well
+            docs.sort()
+        doc_scores = scores[docs]
+        # same type as the postings, otherwise searchsorted converts every posting list it searches
+        docs = docs.astype(self.postings_doc.dtype)
+        for position, weight in zip(positions[common].tolist(), weights[common].tolist()):
+            start, end = self.postings_ptr[position], self.postings_ptr[position + 1]
+            postings = self.postings_doc[start:end]
+            found = np.minimum(np.searchsorted(postings, docs), len(postings) - 1)
+            hit = postings[found] == docs
+            doc_scores[hit] += weight * self.postings_weight[start + found[hit]]
+        return docs, doc_scores
+
+    def search(self, text: Text, k: int = 3) -> List[Match]:
+        """Returns up to k intents, best first, with the similarity of their closest question to text"""
+        docs, scores = self.candidate_scores(text)
+        order = np.argsort(-scores, kind="stable")
+        matches: List[Match] = []
+        found = set()
+        for doc, score in zip(docs[order].tolist(), scores[order].tolist()):
+            if len(matches) == k:
+                break
+            intent_id = int(self.doc_intents[doc])
+            if intent_id not in found:
+                found.add(intent_id)
+                # rounding of the half precision weights can take an exact match slightly over 1
+                matches.append(Match(self.intents[intent_id], min(score, 1.0)))
+        return matches
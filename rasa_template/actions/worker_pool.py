@@ -0,0 +1,26 @@
+"""Bounded thread pool for the blocking parts of custom actions, so one slow action doesn't stall the event loop
+of the action server and with it every other conversation"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+# threads shared by all actions, set ACTION_WORKERS to change it
+ACTION_WORKERS = int(os.environ.get("ACTION_WORKERS", "4"))
+
+executor = ThreadPoolExecutor(max_workers=ACTION_WORKERS, thread_name_prefix="action-worker")
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any, **kwargs: Any):
+    """Runs func in the worker pool and waits for it without blocking the event loop
+    Args:
+       func: blocking function, such as file access or scoring a message
+       args: positional arguments of func
+       kwargs: keyword arguments of func
+    Returns:
+       result: return value of func, exceptions raised by func are raised here
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
@@ -1,5 +1,6 @@
 import logging
 import json
+import time
 from sanic import Blueprint, response
 from sanic.request import Request
 from typing import Text, Optional, List, Dict, Any
@@ -8,8 +9,67 @@ from rasa.core.channels.channel import UserMessage, OutputChannel
 from rasa.core.channels.channel import InputChannel
 from rasa.core.channels.channel import CollectingOutputChannel
 
+from actions.dna_screen import DNA_SCREEN_FILE, DnaScreen
+from actions.knowledge_base import KNOWLEDGE_BASE_FILE
+from faq_index import FAQ_INDEX_FILE, FaqIndex, LatencyCounter, normalize_text
+from response_cache import TTLCache
+
+try:
+    # orjson encodes and decodes several times faster than the json module, it is used if it is installed
+    import orjson
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    loads = orjson.loads
+except ImportError:
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    loads = json.loads
+
 logger = logging.getLogger(__name__)
 
+LAUNCH_MESSAGE = "Hello! Welcome to this Rasa-powered Alexa skill. You can start by saying 'hi'."
+STOP_MESSAGE = "Talk to you later"
+FALLBACK_MESSAGE = "I'm sorry I did not understand what you said"
+
+
+def get_envelope(message: Text, session: Text) -> Dict[Text, Any]:
+    """Wraps a reply in the response json of the Alexa Skills Kit
+    Args:
+       message: text spoken to the user, also repeated as the reprompt
+       session: "true" to end the session, "false" to keep it open
+    Returns:
+       envelope: response dictionary
+    """
+    # For more information, refer to the Alexa Skills Kit Request and Response JSON Reference:
+    # https://developer.amazon.com/en-US/docs/alexa/custom-skills/request-and-response-json-reference.html
+    return {
+        "version": "1.0",
+        "sessionAttributes": {"status": "test"},
+        "response": {
+            "outputSpeech": {
+                "type": "PlainText",
+                "text": message,
+                "playBehavior": "REPLACE_ENQUEUED",
+            },
+            "reprompt": {
+                "outputSpeech": {
+                    "type": "PlainText",
+                    "text": message,
+                    "playBehavior": "REPLACE_ENQUEUED",
+                }
+            },
+            "shouldEndSession": session,
+        },
+    }
+
+
+def json_response(body: bytes):
+    return response.raw(body, content_type="application/json")
+
 
 class AlexaConnector(InputChannel):
     """A custom http input channel for Alexa.
@@ -22,6 +82,92 @@ class AlexaConnector(InputChannel):
     def name(cls):
         return "alexa_assistant"
 
+    @classmethod
+    def from_credentials(cls, credentials: Optional[Dict[Text, Any]]) -> InputChannel:
+        # optional settings under alexa_connector.AlexaConnector in credentials.yml:
+        #   faq_fast_path: false turns the FAQ index off, faq_index: path of the index file,
+        #   knowledge_base: path of the knowledge base the index reads its responses from
+        #   dna_screening: false sends questions that should not be answered to Rasa, dna_screen: path of the screen
+        #   response_cache_size and response_cache_ttl (seconds) bound the reply cache, 0 turns it off
+        credentials = credentials or {}
+        fast_path = credentials.get("faq_fast_path", True)
+        screening = credentials.get("dna_screening", True)
+        return cls(
+            faq_index_path=credentials.get("faq_index", FAQ_INDEX_FILE) if fast_path else None,
+            knowledge_base_path=credentials.get("knowledge_base", KNOWLEDGE_BASE_FILE),
+            dna_screen_path=credentials.get("dna_screen", DNA_SCREEN_FILE) if screening else None,
+            response_cache_size=int(credentials.get("response_cache_size", 1024)),
+            response_cache_ttl=float(credentials.get("response_cache_ttl", 300)),
+        )
+
+    def __init__(
+        self,
+        faq_index_path: Optional[Text] = FAQ_INDEX_FILE,
+        response_cache_size: int = 1024,
+        response_cache_ttl: float = 300,
+        dna_screen_path: Optional[Text] = DNA_SCREEN_FILE,
+        knowledge_base_path: Text = KNOWLEDGE_BASE_FILE,
+    ) -> None:
+        # questions that should not be answered are refused here, before the FAQ index, the cache and Rasa
+        self.dna_screen = DnaScreen.load(dna_screen_path) if dna_screen_path else None
+        self.blocked_body = dumps(get_envelope(self.dna_screen.response, "false")) if self.dna_screen else b""
+        # known questions and paraphrases are answered from this index without running them through Rasa,
+        # their responses are read from the memory-mapped knowledge base
+        self.faq_index = FaqIndex.load(faq_index_path, knowledge_base_path) if faq_index_path else None
+        if self.faq_index is not None:
+            logger.info(f"Answering {len(self.faq_index.questions)} known questions from {faq_index_path}")
+        # serialized replies by normalized text. Only replies that don't depend on the conversation are cached:
+        # answers from the index and Rasa replies that are the response of an intent in the index
+        self.response_cache = TTLCache(response_cache_size, response_cache_ttl)
+        # time from receiving a question to having its answer, for answers from the index and from Rasa
+        self.fast_path_latency = LatencyCounter()
+        self.rasa_latency = LatencyCounter()
+
+    def stats(self) -> Dict[Text, Any]:
+        return {
+            "dna_screen": self.dna_screen.stats() if self.dna_screen is not None else None,
+            "faq_index": self.faq_index.stats() if self.faq_index is not None else None,
+            "response_cache": self.response_cache.stats(),
+            "fast_path": self.fast_path_latency.to_dict(),
+            "rasa": self.rasa_latency.to_dict(),
+        }
+
+    async def get_reply(self, text: Text, on_new_message) -> bytes:
+        """Returns the serialized response to the text of the user, from the DNA screen, the cache, the FAQ index or Rasa"""
+        if self.dna_screen is not None and self.dna_screen.match(text):
+            return self.blocked_body
+
+        key = normalize_text(text)
+        body = self.response_cache.get(key)
+        if body is not None:
+            return body
+
+        start = time.perf_counter()
+        # a known question is answered from the index, anything else goes to Rasa.
+        # Answers from the index and from the cache are not added to the conversation tracker
+        hit = self.faq_index.lookup(text) if self.faq_index is not None else None
+        if hit is not None:
+            _, message = hit
+            cacheable = True
+            self.fast_path_latency.add(time.perf_counter() - start)
+        else:
+            # initialize output channel
+            out = CollectingOutputChannel()
+
+            # send the user message to Rasa & wait for the
+            # response to be sent back
+            await on_new_message(UserMessage(text, out))
+            # extract the text from Rasa's response
+            responses = [m["text"] for m in out.messages]
+            message = responses[0]
+            cacheable = self.faq_index is not None and self.faq_index.is_rule_response(message)
+            self.rasa_latency.add(time.perf_counter() - start)
+
+        body = dumps(get_envelope(message, "false"))
+        if cacheable:
+            self.response_cache.put(key, body)
+        return body
+
     # Sanic blueprint for handling input. The on_new_message
     # function pass the received message to Rasa Core
     # after you have parsed it
@@ -34,67 +180,41 @@ class AlexaConnector(InputChannel):
         async def health(request):
             return response.json({"status": "ok"})
 
+        # messages blocked by the DNA screen, hit rate of the FAQ index and latencies of both paths
+        @alexa_webhook.route("/stats", methods=["GET"])
+        async def stats(request):
+            return response.json(self.stats())
+
+        # replies that never change are serialized once
+        launch_body = dumps(get_envelope(LAUNCH_MESSAGE, "false"))
+        stop_body = dumps(get_envelope(STOP_MESSAGE, "true"))
+        fallback_body = dumps(get_envelope(FALLBACK_MESSAGE, "false"))
+
         # required route: defines
         @alexa_webhook.route("/webhook", methods=["POST"])
         async def receive(request):
             # get the json request sent by Alexa
-            payload = request.json
+            payload = loads(request.body)
             # check to see if the user is trying to launch the skill
             intenttype = payload["request"]["type"]
 
             # if the user is starting the skill, let them know it worked & what to do next
             if intenttype == "LaunchRequest":
-                message = "Hello! Welcome to this Rasa-powered Alexa skill. You can start by saying 'hi'."
-                session = "false"
-            else:
-                # get the Alexa-detected intent
-                intent = payload["request"]["intent"]["name"]
-
-                # makes sure the user isn't trying to end the skill
-                if intent == "AMAZON.StopIntent":
-                    session = "true"
-                    message = "Talk to you later"
-                elif intent == "AMAZON.FallbackIntent":
-                    session = "false"
-                    message = "I'm sorry I did not understand what you said"
-                else:
-                    # get the user-provided text from the slot named "text"
-                    text = payload["request"]["intent"]["slots"]["text"]["value"]
-
-                    # initialize output channel
-                    out = CollectingOutputChannel()
-
-                    # send the user message to Rasa & wait for the
-                    # response to be sent back
-                    await on_new_message(UserMessage(text, out))
-                    # extract the text from Rasa's response
-                    responses = [m["text"] for m in out.messages]
-                    message = responses[0]
-                    session = "false"
+                return json_response(launch_body)
+
+            # get the Alexa-detected intent
+            intent = payload["request"]["intent"]["name"]
+
+            # makes sure the user isn't trying to end the skill
+            if intent == "AMAZON.StopIntent":
+                return json_response(stop_body)
+            if intent == "AMAZON.FallbackIntent":
+                return json_response(fallback_body)
+
+            # get the user-provided text from the slot named "text"
+            text = payload["request"]["intent"]["slots"]["text"]["value"]
             # Send the response generated by Rasa back to Alexa to
-            # pass on to the user. For more information, refer to the
-            # Alexa Skills Kit Request and Response JSON Reference:
-            # https://developer.amazon.com/en-US/docs/alexa/custom-skills/request-and-response-json-reference.html
-            r = {
-                "version": "1.0",
-                "sessionAttributes": {"status": "test"},
-                "response": {
-                    "outputSpeech": {
-                        "type": "PlainText",
-                        "text": message,
-                        "playBehavior": "REPLACE_ENQUEUED",
-                    },
-                    "reprompt": {
-                        "outputSpeech": {
-                            "type": "PlainText",
-                            "text": message,
-                            "playBehavior": "REPLACE_ENQUEUED",
-                        }
-                    },
-                    "shouldEndSession": session,
-                },
-            }
-
-            return response.json(r)
+            # pass on to the user
+            return json_response(await self.get_reply(text, on_new_message))
 
         return alexa_webhook
@@ -0,0 +1,54 @@
+"""NLU component that sets the "Do not answer" intent for messages blocked by the DNA screen of actions/dna_screen.py,
+whatever the intent classifier predicted. It comes last in the pipeline of config.yml, so a blocked message is answered
+by the "Do not answer" rule even when the classifier is unsure or wrong about it."""
+
+import logging
+from typing import Any, Dict, List, Text
+
+from rasa.engine.graph import ExecutionContext, GraphComponent
+from rasa.engine.recipes.default_recipe import DefaultV1Recipe
+from rasa.engine.storage.resource import Resource
+from rasa.engine.storage.storage import ModelStorage
+from rasa.shared.nlu.constants import INTENT, INTENT_NAME_KEY, PREDICTED_CONFIDENCE_KEY, TEXT
+from rasa.shared.nlu.training_data.message import Message
+from rasa.shared.nlu.training_data.training_data import TrainingData
+
+from actions.dna_screen import DNA_SCREEN_FILE, DnaScreen
+
+logger = logging.getLogger(__name__)
+
+
+@DefaultV1Recipe.register([DefaultV1Recipe.ComponentType.INTENT_CLASSIFIER], is_trainable=False)
+class DnaScreenClassifier(GraphComponent):
+    @staticmethod
+    def get_default_config() -> Dict[Text, Any]:
+        # index: screen written by configure_rasa, relative to the Chatbot directory. intent: intent of blocked messages
+        return {"index": DNA_SCREEN_FILE, "intent": "Do not answer"}
+
+    @classmethod
+    def create(
+        cls,
+        config: Dict[Text, Any],
+        model_storage: ModelStorage,
+        resource: Resource,
+        execution_context: ExecutionContext,
+    ) -> "DnaScreenClassifier":
+        return cls(config)
+
+    def __init__(self, config: Dict[Text, Any]) -> None:
+        self.intent = config["intent"]
+        self.screen = DnaScreen.load(config["index"])
+        if self.screen is None:
+            logger.warning(f"No DNA screen at {config['index']}, messages are left to the intent classifier")
+
+    def process_training_data(self, training_data: TrainingData) -> TrainingData:
+        return training_data
+
+    def process(self, messages: List[Message]) -> List[Message]:
+        if self.screen is None:
+            return messages
+        for message in messages:
+            text = message.get(TEXT)
+            if text and self.screen.match(text):
+                message.set(INTENT, {INTENT_NAME_KEY: self.intent, PREDICTED_CONFIDENCE_KEY: 1.0}, add_to_output=True)
+        return messages
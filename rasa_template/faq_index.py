@@ -0,0 +1,150 @@
+"""In-memory index of the FAQ questions and their paraphrases, letting the Alexa connector answer
+exact and trivially different repeats of known questions without running them through Rasa.
+
+configure_rasa writes the index to faq_index.json in the Chatbot directory, the connector loads it on startup.
+The index maps questions to intents, their responses are read from the memory-mapped knowledge base
+(actions/knowledge_base.py), so the connector does not keep another copy of every answer.
+"""
+
+import hashlib
+import json
+import os
+import string
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Text, Tuple
+
+from actions.knowledge_base import KNOWLEDGE_BASE_FILE, KnowledgeBase
+
+FAQ_INDEX_FILE = "faq_index.json"
+FAQ_INDEX_VERSION = 2
+
+# translation table that deletes all ASCII punctuation
+punctuation_table = str.maketrans("", "", string.punctuation)
+
+
+def normalize_text(text: Text):
+    """Lowercases text, removes punctuation and collapses whitespace, the same normalization as dedup.normalize_text"""
+    return " ".join(text.lower().translate(punctuation_table).split())
+
+
+def response_hash(response: Text):
+    """Short hash of a response, ignoring the line break rasa may add to responses written as yaml blocks"""
+    return hashlib.blake2b(response.strip().encode("utf-8"), digest_size=8).hexdigest()
+
+
+def build_faq_index(entries: Iterable[Tuple[Text, Text, List[Text]]], excluded: Iterable[Text] = ()):
+    """Maps the normalized text of every question and paraphrase to its intent. Only a hash of every response is kept,
+    to recognize it among the replies of Rasa, the text is read from the knowledge base
+    Args:
+       entries: (intent, response, texts) for every intent that can be answered without conversation state
+       excluded: texts that must always go through Rasa, such as questions that should not be answered
+    Returns:
+       index: dictionary that can be saved as json and loaded with FaqIndex
+    """
+    intents: List[Text] = []
+    response_hashes: List[Text] = []
+    questions: Dict[Text, int] = {}
+    ambiguous = {normalize_text(text) for text in excluded}
+    for intent, response, texts in entries:
+        response_id = len(intents)
+        intents.append(intent)
+        response_hashes.append(response_hash(response))
+        for text in texts:
+            key = normalize_text(text)
+            if not key or key in ambiguous:
+                continue
+            if questions.setdefault(key, response_id) != response_id:
+                # the same text belongs to two intents, let the nlu model decide
+                ambiguous.add(key)
+                del questions[key]
+    return {"version": FAQ_INDEX_VERSION, "intents": intents, "response_hashes": response_hashes, "questions": questions}
+
+
+def iter_faq_index_json(index: dict):
+    """Streams the index as json, for writing it with the other generated files of the chatbot"""
+    yield json.dumps(index, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+class LatencyCounter:
+    """Counts calls and keeps the latencies of the most recent ones for percentiles"""
+
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        self.recent.append(seconds)
+
+    def percentile(self, q: float):
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total_seconds / self.count * 1e3 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1e3,
+            "p99_ms": self.percentile(99) * 1e3,
+        }
+
+
+class FaqIndex:
+    """Looks up responses by normalized text and counts hits and misses"""
+
+    def __init__(self, index: dict, knowledge_base: KnowledgeBase):
+        self.intents = index["intents"]
+        self.questions = index["questions"]
+        self.rule_responses = set(index["response_hashes"])
+        self.knowledge_base = knowledge_base
+        self.hits = 0
+        self.misses = 0
+        self.lookup_latency = LatencyCounter()
+
+    @classmethod
+    def load(cls, path: Text = FAQ_INDEX_FILE, knowledge_base_path: Text = KNOWLEDGE_BASE_FILE):
+        """Returns the index saved at path with the responses of the knowledge base at knowledge_base_path,
+        or None if either is missing or was written by another version"""
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") != FAQ_INDEX_VERSION:
+            return None
+        knowledge_base = KnowledgeBase.load(knowledge_base_path)
+        if knowledge_base is None:
+            return None
+        return cls(index, knowledge_base)
+
+    def lookup(self, text: Text) -> Optional[Tuple[Text, Text]]:
+        """Returns (intent, response) for a known question or paraphrase, None otherwise"""
+        start = time.perf_counter()
+        response_id = self.questions.get(normalize_text(text))
+        response = None
+        if response_id is not None:
+            response = self.knowledge_base.response(self.intents[response_id])
+        self.lookup_latency.add(time.perf_counter() - start)
+        if response is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.intents[response_id], response
+
+    def is_rule_response(self, text: Text):
+        """True if text is the response of an intent in the index, Rasa gives it for that intent whatever was said before"""
+        return response_hash(text) in self.rule_responses
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "questions": len(self.questions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "lookup": self.lookup_latency.to_dict(),
+        }
@@ -0,0 +1,46 @@
+"""Round trips of the yaml emitter through PyYAML, the parser rasa reads its files with"""
+
+import os
+import sys
+
+import pytest
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "code"))
+
+from yaml_emitter import literal_block, scalar  # noqa: E402
+
+
+def load_response(block):
+    document = "responses:\n  utter_faq:\n  - text: " + block + "\n    metadata: {}\n"
+    return yaml.safe_load(document)["responses"]["utter_faq"][0]["text"]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "a\n\t\nb",
+        "a\n  \nb",
+        "a\n\n\nb",
+        "a\n  indented\nb",
+        " leading space",
+        "\tleading tab",
+        "\n  first line indented",
+        "\n\n",
+        "quotes \" and ' and # and: colons",
+        "trailing newlines\n\n",
+    ],
+)
+def test_literal_block_round_trip(text):
+    block = literal_block(text, "      ")
+    expected = text if block.startswith('"') else text.rstrip("\n") + "\n"
+    assert load_response(block) == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["vote_mail", "utter_vote mail", "yes", "No", "~", "12", "1.5", "1e3", "0x1f", "0o17", "0b101", "0755",
+     ".inf", "-.Inf", ".NaN", "1:30", "2024-01-01", "what's new (2024)"],
+)
+def test_scalar_round_trip(text):
+    assert yaml.safe_load("key: " + scalar(text) + "\n")["key"] == text